@@ -21,8 +21,9 @@ import sys
 def parse_arguments(argv):
     """Parses the command line arguments and checks that they meet the
     requirements to perform the operations of the program. Returns two arrays of
-    points (tuples) in the form (bitrate, psnr), and a boolean stating whether
-    to use piecewiese or cubic interpolation.
+    points (tuples) in the form (bitrate, psnr), a boolean stating whether
+    to use piecewiese or cubic interpolation, and a boolean stating whether
+    to use the convex hulls of the points.
 
     Keyword arguments:
     argv -- Command line arguments.
@@ -34,6 +35,11 @@ def parse_arguments(argv):
             default=False, required=False, help='use the old cubic polynomial '
             'interpolation function to calculate the BD-rate, instead of the '
             'piecewise cubic interpolation function.', dest='use_old_bdrate')
+    argument_parser.add_argument('--hull', action='store_true',
+            default=False, required=False, help='calculate the BD-rate over '
+            'the convex hulls of the points, which may then be any number of '
+            'operating points (e.g. several presets per QP).',
+            dest='use_hull')
     argument_parser.add_argument('-b', '--base', nargs='+', type=float,
             required=True, help='set of rate-distortion values of the baseline '
             'encoder.', metavar='bitrate psnr', dest='base')
@@ -60,13 +66,19 @@ def parse_arguments(argv):
     test = zip(arguments.test[0::2], arguments.test[1::2])
     use_old_bdrate = arguments.use_old_bdrate
 
-    return base, test, use_old_bdrate
+    return base, test, use_old_bdrate, arguments.use_hull
 
 def main(argv):
-    base, test, use_old_bdrate = parse_arguments(argv[1:])
+    base, test, use_old_bdrate, use_hull = parse_arguments(argv[1:])
     base = sorted(set(base))
     test = sorted(set(test))
 
+    if use_hull:
+        base, test = hmtools.bd.hull_curves([base, test])
+        if min(len(base), len(test)) < (4 if use_old_bdrate else 2):
+            sys.exit('error: the convex hulls have too few points to calculate '
+                    'the BD-rate.')
+
     if use_old_bdrate:
         bdrate = hmtools.bd.bdrate_old(base, test)
     else:
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import argparse
+import os.path
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hmtools.parser
+import synthetic
+
+def parse_arguments(argv):
+    """Parses the command line arguments and returns a Namespace object whose
+    attributes are the arguments.
+
+    Keyword arguments:
+    argv -- Command line arguments.
+    """
+    argument_parser = argparse.ArgumentParser(description='Measures the number '
+            'of lines per second processed by the summary parser, before and '
+            'after the single-pass line dispatcher, on a synthetic log.')
+
+    argument_parser.add_argument('-n', '--lines', type=int, default=1000000,
+            required=False, help='number of frames (POC lines) of the '
+            'synthetic log.', dest='lines')
+    argument_parser.add_argument('-r', '--repeat', type=int, default=3,
+            required=False, help='number of repetitions (the best one is '
+            'reported).', dest='repeat')
+    argument_parser.add_argument('-p', '--perf', action='store_true',
+            default=False, required=False, help='parse perf values too.',
+            dest='use_perf')
+
+    return argument_parser.parse_args(argv)
+
+def legacy_parse_lines(lines, use_perf):
+    """Parser of the summary before the line dispatcher was introduced: the
+    loop of the original parse_file, copied verbatim except that it reads a
+    list of lines instead of a file (and uses raw strings for the REs). It
+    compiles the REs on each call and tries them in cascade on every line.
+
+    Keyword arguments:
+    lines -- Iterable of lines of the file.
+    use_perf -- Boolean parameter to parse perf values too.
+    """
+    # This constant RE represents any number without thousands separator.
+    NUMBER = r'(?:[-+]?\d*[,.]\d+|[-+]?\d+)'
+
+    results = dict()
+
+    re_rd = re.compile(r'^\s*{}\s*([aipb])\s+({})\s+({})\s+({})\s+({})\s+({})$'
+            .replace('{}', NUMBER))
+    re_time = re.compile(r'^ Total Time:\s*({}) sec.$'
+            .replace('{}', NUMBER))
+    if use_perf:
+        re_perf_frequency = re.compile(r'.*#\s*({})\s*.?Hz.*$'
+                .replace('{}', NUMBER))
+        re_perf_time = re.compile(r'^\s*({})\s*seconds time elapsed'
+                .replace('{}', NUMBER))
+
+    for line in lines:
+        match = re_rd.search(line)
+        if match:
+            slice_type = match.group(1)
+            if 'rd' not in results:
+                results['rd'] = dict()
+            results['rd'][slice_type] = dict()
+            try:
+                results['rd'][slice_type]['bitrate'] = float(match.group(2))
+                results['rd'][slice_type]['y_psnr'] = float(match.group(3))
+                results['rd'][slice_type]['u_psnr'] = float(match.group(4))
+                results['rd'][slice_type]['v_psnr'] = float(match.group(5))
+                results['rd'][slice_type]['yuv_psnr'] = float(match.group(6))
+            except:
+                results['rd'].pop(slice_type, None)
+                if not results['rd']:
+                    results.pop('rd', None)
+            continue
+        match = re_time.search(line)
+        if match:
+            try:
+                results['time'] = float(match.group(1))
+            except:
+                pass
+            continue
+        if use_perf:
+            match = re_perf_frequency.search(line)
+            if match:
+                if 'perf' not in results:
+                    results['perf'] = dict()
+                try:
+                    results['perf']['frequency'] = float(match.group(1).replace(',', '.'))
+                except:
+                    if not results['perf']:
+                        results.pop('perf', None)
+                continue
+            match = re_perf_time.search(line)
+            if match:
+                if 'perf' not in results:
+                    results['perf'] = dict()
+                try:
+                    results['perf']['time'] = float(match.group(1).replace(',', '.'))
+                except:
+                    if not results['perf']:
+                        results.pop('perf', None)
+                continue
+
+    return results
+
+def measure(function, lines, use_perf, repeat):
+    """Returns the best time, in seconds, of several calls to a parser.
+
+    Keyword arguments:
+    function -- Parser to call.
+    lines -- List of lines to parse.
+    use_perf -- Boolean parameter to parse perf values too.
+    repeat -- Number of calls.
+    """
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(lines, use_perf)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+def main(argv):
+    arguments = parse_arguments(argv[1:])
+
+    lines = synthetic.hm_log(arguments.lines, perf=arguments.use_perf)
+
+    before = measure(legacy_parse_lines, lines, arguments.use_perf,
+            arguments.repeat)
+    after = measure(hmtools.parser._parse_lines, lines, arguments.use_perf,
+            arguments.repeat)
+
+    print('{:<10}  {:>14}'.format('Parser', 'Lines/s'))
+    print('{:<10}  {:>14.0f}'.format('Before', len(lines) / before))
+    print('{:<10}  {:>14.0f}'.format('After', len(lines) / after))
+    print('{:<10}  {:>14.2f}'.format('Speed-up', before / after))
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,301 @@
+#!/usr/bin/python
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os.path
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+
+import hmtools.parser
+import hmtools.results
+import synthetic
+
+# Version of the format of the JSON results.
+FORMAT_VERSION = 1
+
+def parse_arguments(argv):
+    """Parses the command line arguments and returns a Namespace object whose
+    attributes are the arguments.
+
+    Keyword arguments:
+    argv -- Command line arguments.
+    """
+    argument_parser = argparse.ArgumentParser(description='Measures the time, '
+            'throughput and peak memory of each stage of parser.py '
+            '(discovery, parsing, BD-rate and timing calculation, and table '
+            'output) on synthetic logs of configurable size, and optionally '
+            'writes the measurements as JSON to compare them across commits.')
+
+    argument_parser.add_argument('-f', '--frames', type=int, default=64,
+            required=False, help='number of frames per log.', dest='frames')
+    argument_parser.add_argument('-n', '--sequences', type=int, default=20,
+            required=False, help='number of sequences.', dest='sequences')
+    argument_parser.add_argument('-q', '--qps', type=int, nargs='+',
+            default=list(synthetic.QPS), required=False, help='quantization '
+            'parameters.', dest='qps')
+    argument_parser.add_argument('--runs', type=int, default=1,
+            required=False, help='number of repeated runs of each encoding.',
+            dest='runs')
+    argument_parser.add_argument('-j', '--jobs', type=int, default=1,
+            required=False, help='number of logs parsed in parallel (0 for one '
+            'job per CPU).', dest='jobs')
+    argument_parser.add_argument('--threads', action='store_true',
+            default=False, required=False, help='parse in threads instead of '
+            'processes.', dest='use_threads')
+    argument_parser.add_argument('-p', '--perf', action='store_true',
+            default=False, required=False, help='parse perf values too.',
+            dest='use_perf')
+    argument_parser.add_argument('-r', '--repeat', type=int, default=3,
+            required=False, help='number of repetitions (the best one is '
+            'reported).', dest='repeat')
+    argument_parser.add_argument('-d', '--directory', type=str, default=None,
+            required=False, help='directory in which the logs are generated '
+            '(and kept). By default, a temporary directory is used.',
+            dest='directory')
+    argument_parser.add_argument('--json', type=str, default=None,
+            required=False, help='path of the file where the results are '
+            'written as JSON (- for the standard output).', dest='json_path')
+    argument_parser.add_argument('--compare', type=str, default=None,
+            required=False, help='path of the JSON results of a previous run, '
+            'whose times are compared with the current ones.',
+            dest='compare_path')
+
+    return argument_parser.parse_args(argv)
+
+def load_cli():
+    """Returns the parser.py script loaded as a module."""
+    spec = importlib.util.spec_from_file_location('hm_parser_cli',
+            os.path.join(ROOT, 'parser.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+def reset_peak_rss():
+    """Resets the peak resident set size of the process, where the kernel
+    allows it (Linux), so that the peak of each stage can be measured.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+def peak_rss():
+    """Returns the peak resident set size of the process since the last call
+    to reset_peak_rss, in KiB (or since the process started, where it can not
+    be reset).
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    # ru_maxrss is reported in bytes on macOS, and in KiB elsewhere.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def measure(function, repeat):
+    """Calls a function several times and returns a tuple with the best time,
+    in seconds, the peak resident set size, in KiB, and the value returned by
+    the last call.
+
+    Keyword arguments:
+    function -- Function to call, without arguments.
+    repeat -- Number of calls.
+    """
+    best = float('inf')
+    rss = 0
+
+    for _ in range(repeat):
+        reset_peak_rss()
+        start = time.perf_counter()
+        value = function()
+        best = min(best, time.perf_counter() - start)
+        rss = max(rss, peak_rss())
+
+    return best, rss, value
+
+def commit():
+    """Returns the hash of the commit checked out in the repository, or None if
+    it can not be determined.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_stages(arguments, directory, cli):
+    """Runs the stages of parser.py on the logs of a directory and returns a
+    dictionary with the measurements of each stage.
+
+    Keyword arguments:
+    arguments -- Namespace object whose attributes are the arguments.
+    directory -- Directory with the base and test subdirectories.
+    cli -- parser.py loaded as a module (see load_cli).
+    """
+    pattern = synthetic.PATTERN if arguments.runs == 1 \
+              else '*/' + synthetic.PATTERN
+    directories = [(os.path.join(directory, 'base'), pattern),
+                   (os.path.join(directory, 'test'), pattern)]
+
+    def discovery():
+        return [file for path, pattern in directories
+                for file, _, _ in hmtools.parser.discover(path, pattern)]
+
+    def parse():
+        all_results = [hmtools.results.Results() for _ in directories]
+        for index, sequence, sequence_id, file_results \
+                in hmtools.parser.iter_dirs(directories, arguments.use_perf,
+                arguments.jobs, arguments.use_threads):
+            all_results[index].append(sequence, sequence_id, file_results)
+        return all_results
+
+    stages = dict()
+
+    seconds, rss, files = measure(discovery, arguments.repeat)
+    stages['discovery'] = {'seconds': seconds, 'peak_rss_kib': rss,
+                           'items': len(files), 'unit': 'files'}
+
+    size = sum(os.path.getsize(file) for file in files)
+    seconds, rss, (base_results, test_results) = measure(parse,
+            arguments.repeat)
+    stages['parse'] = {'seconds': seconds, 'peak_rss_kib': rss,
+                       'items': len(files), 'unit': 'files', 'bytes': size}
+
+    sequences = cli.sort_sequences(set(base_results.sequences)
+                                   & set(test_results.sequences))
+    names = [sequence for category_sequences in sequences.values()
+             for sequence in category_sequences]
+
+    seconds, rss, (results, average) = measure(lambda:
+            cli.calculate_results(sequences, base_results, test_results,
+            False, arguments.use_perf), arguments.repeat)
+    stages['bdrate'] = {'seconds': seconds, 'peak_rss_kib': rss,
+                        'items': len(names), 'unit': 'sequences'}
+
+    def output():
+        with contextlib.redirect_stdout(io.StringIO()) as table:
+            cli.print_results(sequences, results, average, 4)
+        return table.getvalue()
+
+    seconds, rss, table = measure(output, arguments.repeat)
+    stages['table'] = {'seconds': seconds, 'peak_rss_kib': rss,
+                       'items': len(names), 'unit': 'rows',
+                       'bytes': len(table)}
+
+    for stage in stages.values():
+        stage['throughput'] = stage['items'] / stage['seconds'] \
+                              if stage['seconds'] > 0 else float('inf')
+
+    return stages
+
+def print_stages(stages, baseline=None):
+    """Prints the measurements of each stage in table format.
+
+    Keyword arguments:
+    stages -- Dictionary with the measurements of each stage.
+    baseline -- Optional dictionary with the measurements of a previous run,
+            whose times are compared with the current ones.
+    """
+    header = '{:<10}  {:>10}  {:>20}  {:>8}  {:>10}'.format('Stage',
+            'Time (ms)', 'Throughput', 'MB/s', 'RSS (MiB)')
+    if baseline is not None:
+        header += '  {:>8}'.format('Speed-Up')
+    print(header)
+    print('{:=<{width}}'.format('', width=len(header)))
+
+    for name, stage in stages.items():
+        line = '{:<10}  {:>10.2f}  {:>10.0f} {:<9}  {:>8}  {:>10.1f}'.format(
+                name, stage['seconds'] * 1000, stage['throughput'],
+                stage['unit'], '{:.1f}'.format(stage['bytes'] / 1e6
+                / stage['seconds']) if 'bytes' in stage else '-',
+                stage['peak_rss_kib'] / 1024)
+        if baseline is not None:
+            if name in baseline:
+                line += '  {:>8.2f}'.format(baseline[name]['seconds']
+                                            / stage['seconds'])
+            else:
+                line += '  {:>8}'.format('-')
+        print(line)
+
+def main(argv):
+    arguments = parse_arguments(argv[1:])
+
+    cli = load_cli()
+
+    with contextlib.ExitStack() as stack:
+        directory = arguments.directory
+        if directory is None:
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+
+        for name, rate_factor, time_factor, seed in (('base', 1.0, 1.0, 0),
+                ('test', 0.97, 0.8, 1)):
+            synthetic.write_directory(os.path.join(directory, name),
+                    arguments.sequences, arguments.qps, arguments.frames,
+                    arguments.runs, True, rate_factor, time_factor, seed)
+
+        stages = run_stages(arguments, directory, cli)
+
+    parameters = {'frames': arguments.frames, 'sequences': arguments.sequences,
+                  'qps': arguments.qps, 'runs': arguments.runs,
+                  'jobs': arguments.jobs, 'threads': arguments.use_threads,
+                  'perf': arguments.use_perf, 'repeat': arguments.repeat}
+
+    baseline = None
+    if arguments.compare_path is not None:
+        with open(arguments.compare_path) as compare_file:
+            previous = json.load(compare_file)
+        if previous['parameters'] != parameters:
+            print('warning: the results being compared were measured with '
+                    'different parameters', file=sys.stderr)
+        baseline = previous['stages']
+
+    report = {'format': FORMAT_VERSION, 'commit': commit(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'parameters': parameters,
+              'stages': stages}
+
+    if arguments.json_path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_stages(stages, baseline)
+        if arguments.json_path is not None:
+            with open(arguments.json_path, 'w') as json_file:
+                json.dump(report, json_file, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import argparse
+import os.path
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BD_ARGUMENTS = ['-b', '1000', '30', '2000', '33', '4000', '36', '8000', '39',
+                '-t', '900', '30', '1900', '33.1', '3900', '36', '7000', '38.5']
+
+def parse_arguments(argv):
+    """Parses the command line arguments and returns a Namespace object whose
+    attributes are the arguments.
+
+    Keyword arguments:
+    argv -- Command line arguments.
+    """
+    argument_parser = argparse.ArgumentParser(description='Measures the import '
+            'time of hmtools.bd with -X importtime and the wall time of a call '
+            'to bd.py, and fails if the import exceeds a budget or imports '
+            'SciPy.')
+
+    argument_parser.add_argument('-b', '--budget', type=float, default=250,
+            required=False, help='maximum cumulative import time of hmtools.bd, '
+            'in milliseconds (default: 250).', dest='budget')
+    argument_parser.add_argument('-r', '--repeat', type=int, default=5,
+            required=False, help='number of repetitions (the best one is '
+            'reported).', dest='repeat')
+    argument_parser.add_argument('-m', '--module', type=str,
+            default='hmtools.bd', required=False, help='module to import '
+            '(default: hmtools.bd).', dest='module')
+
+    return argument_parser.parse_args(argv)
+
+def import_times(module):
+    """Imports a module in a new interpreter with -X importtime, and returns a
+    dictionary with the cumulative import time, in milliseconds, of every
+    module imported.
+
+    Keyword arguments:
+    module -- Name of the module.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+            'import ' + module], cwd=ROOT, stderr=subprocess.PIPE,
+            universal_newlines=True, check=True)
+
+    times = dict()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            times[fields[2].strip()] = int(fields[1]) / 1000
+        except ValueError:
+            pass
+
+    return times
+
+def main(argv):
+    arguments = parse_arguments(argv[1:])
+
+    best_import = float('inf')
+    for _ in range(arguments.repeat):
+        times = import_times(arguments.module)
+        best_import = min(best_import, times[arguments.module])
+
+    heavy_modules = sorted(module for module in times
+                           if module == 'scipy' or module.startswith('scipy.'))
+
+    best_call = float('inf')
+    for _ in range(arguments.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, 'bd.py')]
+                + BD_ARGUMENTS, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        best_call = min(best_call, time.perf_counter() - start)
+
+    print('{:<24}  {:>10.1f} ms'.format('import ' + arguments.module,
+            best_import))
+    print('{:<24}  {:>10.1f} ms'.format('bd.py call', best_call * 1000))
+    print('{:<24}  {:>10.1f} ms'.format('budget', arguments.budget))
+
+    failed = False
+    if heavy_modules:
+        print('error: {} imports {}'.format(arguments.module,
+                ', '.join(heavy_modules)), file=sys.stderr)
+        failed = True
+    if best_import > arguments.budget:
+        print('error: import time exceeds the budget', file=sys.stderr)
+        failed = True
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
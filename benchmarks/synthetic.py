@@ -0,0 +1,224 @@
+#!/usr/bin/python
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import argparse
+import os
+import os.path
+import random
+import sys
+
+# Names of the sequences of the common test conditions, used before falling
+# back to generated names.
+SEQUENCES = ['Traffic', 'PeopleOnStreet', 'Nebuta', 'SteamLocomotive',
+             'Kimono', 'ParkScene', 'Cactus', 'BasketballDrive', 'BQTerrace',
+             'BasketballDrill', 'BQMall', 'PartyScene', 'RaceHorsesC',
+             'BasketballPass', 'BQSquare', 'BlowingBubbles', 'RaceHorses',
+             'FourPeople', 'Johnny', 'KristenAndSara']
+
+QPS = (22, 27, 32, 37)
+
+# Pattern of the filenames written by write_directory, as expected by
+# parser.py.
+PATTERN = 'RA_QP/p_/n.out'
+
+POC = 'POC {:4d} TId: {:1d} ( {}-SLICE, nQP {:d} QP {:d} ) {:10d} bits ' \
+      '[Y {:.4f} dB    U {:.4f} dB    V {:.4f} dB] [ET {:5d} ] ' \
+      '[L0 {:d} ] [L1 {:d} ]\n'
+SLICE_HEADER = '\tTotal Frames |   Bitrate     Y-PSNR    U-PSNR    V-PSNR    ' \
+               'YUV-PSNR \n'
+SLICE_ROW = '\t{:8d}    {} {:12.4f}   {:7.4f}   {:7.4f}   {:7.4f}   {:7.4f}\n'
+EMPTY_SLICE_ROW = '\t{:8d}    {}          nan       nan       nan       nan' \
+                  '       nan\n'
+
+def sequence_names(count):
+    """Returns a list with the names of a number of sequences.
+
+    Keyword arguments:
+    count -- Number of sequences.
+    """
+    return SEQUENCES[:count] + ['Sequence{:03d}'.format(index)
+                                for index in range(len(SEQUENCES), count)]
+
+def _slice_rows(name, character, frames, bitrate, psnr):
+    """Returns the lines of a summary table of the log.
+
+    Keyword arguments:
+    name -- Title of the table.
+    character -- Slice type of the row.
+    frames -- Number of frames of the slice type.
+    bitrate -- Bitrate of the row.
+    psnr -- Luma PSNR of the row.
+    """
+    if frames:
+        row = SLICE_ROW.format(frames, character, bitrate, psnr, psnr + 2,
+                psnr + 3, psnr + 0.5)
+    else:
+        row = EMPTY_SLICE_ROW.format(frames, character)
+
+    return ['\n', '\n', '{:-<64}\n'.format(name), SLICE_HEADER, row]
+
+def hm_log(frames, qp=32, sequence='RaceHorses', perf=True, rate_factor=1.0,
+        time_factor=1.0, random_state=None):
+    """Returns a list with the lines of a synthetic HM log: the encoder header,
+    one line per POC, the summary tables, the total time and, optionally, the
+    output of 'perf stat'. Bitrates decrease and PSNRs increase with the QP as
+    in a real random access encoding.
+
+    Keyword arguments:
+    frames -- Number of frames (POC lines).
+    qp -- Quantization parameter.
+    sequence -- Name of the sequence.
+    perf -- Boolean parameter to append the output of 'perf stat'.
+    rate_factor -- Factor applied to the bitrates (e.g. to simulate a tested
+            encoder that saves bitrate).
+    time_factor -- Factor applied to the encoding times.
+    random_state -- Optional random.Random object, to make the log
+            reproducible.
+    """
+    if random_state is None:
+        random_state = random.Random(0)
+
+    # The complexity of each sequence is the same in all its logs, so that
+    # its rate-distortion curve is monotonic.
+    complexity = 1 + random.Random(sequence).random()
+    bits = int(200000 * complexity * 2 ** ((22 - qp) / 6) * rate_factor
+               * (1 + 0.02 * random_state.random()))
+    psnr = 50 - 0.4 * qp - complexity + 0.1 * random_state.random()
+
+    lines = ['\n', 'HM software: Encoder Version [16.20] (including RExt)'
+             '[Linux][GCC 7.3.0][64 bit] \n', '\n',
+             'Input          File                    : {}.yuv\n'.format(
+             sequence)]
+
+    for poc in range(frames):
+        lines.append(POC.format(poc, poc % 4, 'I' if poc % 32 == 0 else 'B', qp,
+                qp + poc % 4, int(bits * (0.5 + random_state.random())),
+                psnr + random_state.random() - 0.5, psnr + 2, psnr + 3,
+                random_state.randrange(10), max(0, poc - 1), poc + 1))
+
+    intra_frames = (frames + 31) // 32
+    bitrate = bits * 30 / 8000
+    lines += _slice_rows('SUMMARY ', 'a', frames, bitrate, psnr)
+    lines += _slice_rows('I Slices', 'i', intra_frames, bitrate * 3, psnr + 1)
+    lines += _slice_rows('P Slices', 'p', 0, 0, 0)
+    lines += _slice_rows('B Slices', 'b', frames - intra_frames, bitrate * 0.9,
+            psnr - 0.1)
+
+    seconds = frames * 0.3 * complexity * time_factor \
+              * (1 + 0.05 * random_state.random())
+    lines += ['RVM: 0.000\n', 'Bytes written to file: {} ({:.3f} kbps)\n'
+              .format(bits * frames // 8, bitrate), '\n',
+              ' Total Time: {:12.3f} sec.\n'.format(seconds)]
+
+    if perf:
+        cycles = int(seconds * 3.5e9)
+        instructions = int(cycles * (2 + random_state.random()))
+        lines += ['\n', ' Performance counter stats for '
+                  '\'./TAppEncoderStatic -c cfg\':\n', '\n',
+                  '{:18.6f}      task-clock (msec)         #    0.999 CPUs '
+                  'utilized          \n'.format(seconds * 1000),
+                  '{:>18,}      cycles                    #    3.500 GHz   '
+                  '                 \n'.format(cycles),
+                  '{:>18,}      instructions              #    {:.2f}  insn '
+                  'per cycle         \n'.format(instructions,
+                  instructions / cycles), '\n',
+                  '{:18.9f} seconds time elapsed\n'.format(seconds * 1.001),
+                  '\n']
+
+    return lines
+
+def write_directory(path, sequences=8, qps=QPS, frames=64, runs=1, perf=True,
+        rate_factor=1.0, time_factor=1.0, seed=0):
+    """Writes the synthetic logs of an encoding of several sequences at
+    several QPs into a directory, named after PATTERN, and returns the list
+    of their paths.
+
+    Keyword arguments:
+    path -- Path of the directory, which is created if needed.
+    sequences -- Number of sequences.
+    qps -- List of quantization parameters.
+    frames -- Number of frames of each log.
+    runs -- Number of repeated runs of each encoding, written in numbered
+            subdirectories when greater than one.
+    perf -- Boolean parameter to append the output of 'perf stat'.
+    rate_factor -- Factor applied to the bitrates.
+    time_factor -- Factor applied to the encoding times.
+    seed -- Seed of the random number generator.
+    """
+    random_state = random.Random(seed)
+    files = list()
+
+    for run in range(runs):
+        directory = path if runs == 1 else os.path.join(path,
+                'run{}'.format(run))
+        os.makedirs(directory, exist_ok=True)
+        for sequence in sequence_names(sequences):
+            for qp in qps:
+                file = os.path.join(directory, 'RA_QP{}_{}.out'.format(qp,
+                        sequence))
+                with open(file, 'w') as log:
+                    log.writelines(hm_log(frames, qp, sequence, perf,
+                            rate_factor, time_factor, random_state))
+                files.append(file)
+
+    return files
+
+def parse_arguments(argv):
+    """Parses the command line arguments and returns a Namespace object whose
+    attributes are the arguments.
+
+    Keyword arguments:
+    argv -- Command line arguments.
+    """
+    argument_parser = argparse.ArgumentParser(description='Writes the '
+            'synthetic HM logs of a baseline and a tested encoding, to be '
+            'compared with parser.py -bp {0} -tp {0} (or */{0} with several '
+            'runs).'.format(PATTERN))
+
+    argument_parser.add_argument('path', type=str, help='output directory, '
+            'in which the base and test subdirectories are written.')
+    argument_parser.add_argument('-f', '--frames', type=int, default=64,
+            required=False, help='number of frames per log.', dest='frames')
+    argument_parser.add_argument('-n', '--sequences', type=int, default=8,
+            required=False, help='number of sequences.', dest='sequences')
+    argument_parser.add_argument('-q', '--qps', type=int, nargs='+',
+            default=list(QPS), required=False, help='quantization '
+            'parameters.', dest='qps')
+    argument_parser.add_argument('-r', '--runs', type=int, default=1,
+            required=False, help='number of repeated runs of each encoding.',
+            dest='runs')
+    argument_parser.add_argument('--no-perf', action='store_false',
+            default=True, required=False, help='do not append the output of '
+            'perf stat.', dest='perf')
+    argument_parser.add_argument('--seed', type=int, default=0,
+            required=False, help='seed of the random number generator.',
+            dest='seed')
+
+    return argument_parser.parse_args(argv)
+
+def main(argv):
+    arguments = parse_arguments(argv[1:])
+
+    for name, rate_factor, time_factor, seed in (('base', 1.0, 1.0,
+            arguments.seed), ('test', 0.97, 0.8, arguments.seed + 1)):
+        files = write_directory(os.path.join(arguments.path, name),
+                arguments.sequences, arguments.qps, arguments.frames,
+                arguments.runs, arguments.perf, rate_factor, time_factor, seed)
+        print('{}: {} files'.format(os.path.join(arguments.path, name),
+                len(files)))
+
+if __name__ == "__main__":
+    main(sys.argv)
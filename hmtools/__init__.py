@@ -1 +1 @@
-__all__ = ['bd', 'parser']
+__all__ = ['archive', 'bd', 'cache', 'compression', 'export', 'parser', 'profile', 'results', 'server', 'stats', 'watch']
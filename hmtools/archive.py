@@ -0,0 +1,112 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os.path
+import tarfile
+import zipfile
+
+# Zip archives opened by read_zip in this process, by path, with the size and
+# modification time they had. Keeping them open avoids reading their central
+# directory again for each member.
+_zip_files = dict()
+
+def is_archive(path):
+    """Returns whether a path is a tar (optionally compressed) or zip archive.
+
+    Keyword arguments:
+    path -- Path to check.
+    """
+    if not os.path.isfile(path):
+        return False
+
+    try:
+        return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+    except OSError:
+        return False
+
+def is_zip(path):
+    """Returns whether an archive is a zip archive (otherwise, it is a tar
+    archive).
+
+    Keyword arguments:
+    path -- Path of the archive.
+    """
+    return zipfile.is_zipfile(path)
+
+def member_path(path, name):
+    """Returns the path used to refer to a member of an archive (e.g. in the
+    parse cache), which is that of the archive followed by the member name.
+
+    Keyword arguments:
+    path -- Path of the archive.
+    name -- Name of the member.
+    """
+    return os.path.join(path, name)
+
+def iter_tar(path):
+    """Reads a tar archive sequentially, in a single pass, and yields a tuple
+    (name, file) per regular file it contains, where file is a binary file
+    object with its content that is only valid until the next member is
+    yielded. Members that are not read are skipped without decompressing them
+    more than needed by the compression of the archive.
+
+    Keyword arguments:
+    path -- Path of the archive.
+    """
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member)
+
+def zip_names(path):
+    """Returns the names of the regular files of a zip archive, in the order of
+    its index.
+
+    Keyword arguments:
+    path -- Path of the archive.
+    """
+    with zipfile.ZipFile(path) as archive:
+        return [member.filename for member in archive.infolist()
+                if not member.is_dir()]
+
+def read_zip(path, name, keep_open=True):
+    """Returns the content of a member of a zip archive. The archive is kept
+    open for the following calls of the same process, until it changes.
+
+    Keyword arguments:
+    path -- Path of the archive.
+    name -- Name of the member.
+    keep_open -- Boolean parameter to keep the archive open. Processes that
+            start worker processes which read the archive afterwards must not
+            keep it open, since they would share the position of the file.
+    """
+    if not keep_open:
+        with zipfile.ZipFile(path) as archive:
+            return archive.read(name)
+
+    stat = os.stat(path)
+    version = (stat.st_size, stat.st_mtime_ns)
+
+    archive = None
+    if path in _zip_files:
+        archive_version, archive = _zip_files[path]
+        if archive_version != version:
+            archive.close()
+            archive = None
+    if archive is None:
+        archive = zipfile.ZipFile(path)
+        _zip_files[path] = (version, archive)
+
+    return archive.read(name)
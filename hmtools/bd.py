@@ -13,12 +13,11 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import hmtools.profile
 import math
 import numpy
-import scipy.integrate
-import scipy.interpolate
 
-def bdrate(base, test):
+def bdrate(base, test, use_scipy=False):
     """Calculates the BD-rate using the piecewise cubic interpolation function.
 
     Keyword arguments:
@@ -26,7 +25,36 @@ def bdrate(base, test):
             in increasing bitrate order.
     test -- Array of tuples of the test points in the form (bitrate psnr), in
             increasing bitrate order.
+    use_scipy -- Boolean parameter to use the interpolation functions of SciPy
+            instead of the built-in NumPy implementation (which is faster, and
+            does not need to import SciPy).
     """
+    if use_scipy:
+        return _bdrate_scipy(base, test)
+
+    base = numpy.asarray(base, dtype=float)
+    test = numpy.asarray(test, dtype=float)
+
+    if numpy.any(numpy.diff(base[:, 1]) <= 0) \
+            or numpy.any(numpy.diff(test[:, 1]) <= 0):
+        raise ValueError('psnr values must be strictly increasing')
+
+    return float(bdrate_batch(base[None], test[None])[0])
+
+def _bdrate_scipy(base, test):
+    """Calculates the BD-rate using the piecewise cubic interpolation function
+    of SciPy.
+
+    Keyword arguments:
+    base -- Array of tuples of the baseline points in the form (bitrate psnr),
+            in increasing bitrate order.
+    test -- Array of tuples of the test points in the form (bitrate psnr), in
+            increasing bitrate order.
+    """
+    # SciPy takes several hundred milliseconds to import, so it is only
+    # imported when it is needed.
+    import scipy.interpolate
+
     base_rate = [point[0] for point in base]
     base_psnr = [point[1] for point in base]
     test_rate = [point[0] for point in test]
@@ -38,15 +66,18 @@ def bdrate(base, test):
     min_psnr = max(min(base_psnr), min(test_psnr))
     max_psnr = min(max(base_psnr), max(test_psnr))
 
-    base_polynomial = scipy.interpolate.PchipInterpolator(base_psnr,
-            base_log_rate)
-    test_polynomial = scipy.interpolate.PchipInterpolator(test_psnr,
-            test_log_rate)
+    hmtools.profile.count('curve pairs evaluated')
 
-    base_integral_value = scipy.integrate.quad(base_polynomial, min_psnr,
-            max_psnr)[0];
-    test_integral_value = scipy.integrate.quad(test_polynomial, min_psnr,
-            max_psnr)[0];
+    with hmtools.profile.stage('pchip (scipy)'):
+        base_polynomial = scipy.interpolate.PchipInterpolator(base_psnr,
+                base_log_rate)
+        test_polynomial = scipy.interpolate.PchipInterpolator(test_psnr,
+                test_log_rate)
+
+        # The interpolants are piecewise cubic polynomials, so they are
+        # integrated exactly instead of numerically.
+        base_integral_value = base_polynomial.integrate(min_psnr, max_psnr)
+        test_integral_value = test_polynomial.integrate(min_psnr, max_psnr)
 
     average = (test_integral_value - base_integral_value) \
               / (max_psnr - min_psnr)
@@ -86,3 +117,371 @@ def bdrate_old(base, test):
               / (max_psnr - min_psnr)
 
     return (math.exp(average) - 1) * 100;
+
+def _pchip_edge_slopes(h0, h1, m0, m1):
+    """Returns the derivatives at the end points of piecewise cubic Hermite
+    interpolants, using a shape-preserving one-sided three-point estimate.
+
+    Keyword arguments:
+    h0 -- Widths of the intervals next to the end points.
+    h1 -- Widths of the following intervals.
+    m0 -- Slopes of the intervals next to the end points.
+    m1 -- Slopes of the following intervals.
+    """
+    slopes = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+
+    mask = numpy.sign(slopes) != numpy.sign(m0)
+    mask2 = (numpy.sign(m0) != numpy.sign(m1)) \
+            & (numpy.abs(slopes) > 3 * numpy.abs(m0))
+
+    slopes = numpy.where(~mask & mask2, 3 * m0, slopes)
+
+    return numpy.where(mask, 0.0, slopes)
+
+def _pchip_slopes(x, y):
+    """Returns the derivatives at each point of the piecewise cubic Hermite
+    interpolants of several curves (the same ones PchipInterpolator uses).
+
+    Keyword arguments:
+    x -- Array of shape (n_curves, n_points) with strictly increasing values.
+    y -- Array of shape (n_curves, n_points).
+    """
+    h = numpy.diff(x, axis=1)
+    m = numpy.diff(y, axis=1) / h
+
+    if x.shape[1] == 2:
+        return numpy.concatenate((m, m), axis=1)
+
+    h0 = h[:, :-1]
+    h1 = h[:, 1:]
+    m0 = m[:, :-1]
+    m1 = m[:, 1:]
+
+    condition = (numpy.sign(m0) != numpy.sign(m1)) | (m0 == 0) | (m1 == 0)
+
+    w1 = 2 * h1 + h0
+    w2 = h1 + 2 * h0
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        inner = numpy.where(condition, 0.0,
+                1.0 / ((w1 / m0 + w2 / m1) / (w1 + w2)))
+
+    first = _pchip_edge_slopes(h[:, 0], h[:, 1], m[:, 0], m[:, 1])
+    last = _pchip_edge_slopes(h[:, -1], h[:, -2], m[:, -1], m[:, -2])
+
+    return numpy.concatenate((first[:, None], inner, last[:, None]), axis=1)
+
+def _pchip_integral(x, y, bounds):
+    """Returns the integrals of the piecewise cubic Hermite interpolants of
+    several curves from their first point to the given bounds, which are
+    calculated analytically. Bounds out of the range of a curve are
+    extrapolated with its first or last polynomial.
+
+    Keyword arguments:
+    x -- Array of shape (n_curves, n_points) with strictly increasing values.
+    y -- Array of shape (n_curves, n_points).
+    bounds -- Array of shape (n_curves,).
+    """
+    slopes = _pchip_slopes(x, y)
+
+    h = numpy.diff(x, axis=1)
+    m = numpy.diff(y, axis=1) / h
+
+    # Coefficients of each interval, as a polynomial of the distance s to its
+    # first point: y_k + d_k * s + c2 * s^2 + c3 * s^3.
+    c2 = (3 * m - 2 * slopes[:, :-1] - slopes[:, 1:]) / h
+    c3 = (slopes[:, :-1] + slopes[:, 1:] - 2 * m) / (h * h)
+    c1 = slopes[:, :-1]
+    c0 = y[:, :-1]
+
+    def antiderivative(s, c0, c1, c2, c3):
+        return s * (c0 + s * (c1 / 2 + s * (c2 / 3 + s * c3 / 4)))
+
+    cumulative = numpy.cumsum(antiderivative(h, c0, c1, c2, c3), axis=1)
+    cumulative = numpy.concatenate((numpy.zeros((x.shape[0], 1)), cumulative),
+            axis=1)
+
+    rows = numpy.arange(x.shape[0])
+    k = numpy.sum(x[:, 1:-1] <= bounds[:, None], axis=1)
+
+    return cumulative[rows, k] + antiderivative(bounds - x[rows, k],
+            c0[rows, k], c1[rows, k], c2[rows, k], c3[rows, k])
+
+def _prepare_batch(base, test):
+    """Converts stacked baseline and test curves to arrays and returns their
+    log-rates, psnrs, and the psnr range in which they overlap.
+
+    Keyword arguments:
+    base -- Array of shape (n_curves, n_points, 2) of the baseline points.
+    test -- Array of shape (n_curves, n_points, 2) of the test points.
+    """
+    base = numpy.asarray(base, dtype=float)
+    test = numpy.asarray(test, dtype=float)
+
+    if base.ndim != 3 or test.ndim != 3 or base.shape[2] != 2 \
+            or test.shape[2] != 2 or base.shape[0] != test.shape[0]:
+        raise ValueError('curves must be arrays of shape (n_curves, n_points, '
+                '2) with the same number of curves')
+
+    base_log_rate = numpy.log(base[:, :, 0])
+    test_log_rate = numpy.log(test[:, :, 0])
+    base_psnr = base[:, :, 1]
+    test_psnr = test[:, :, 1]
+
+    min_psnr = numpy.maximum(base_psnr.min(axis=1), test_psnr.min(axis=1))
+    max_psnr = numpy.minimum(base_psnr.max(axis=1), test_psnr.max(axis=1))
+
+    return base_log_rate, base_psnr, test_log_rate, test_psnr, min_psnr, \
+           max_psnr
+
+def bdrate_batch(base, test):
+    """Calculates the BD-rates of several pairs of curves at once using the
+    piecewise cubic interpolation function, which is integrated analytically.
+    Returns an array with one BD-rate per pair of curves, which is NaN for those
+    curves whose psnr is not strictly increasing.
+
+    Keyword arguments:
+    base -- Array of shape (n_curves, n_points, 2) of the baseline points in the
+            form (bitrate, psnr), in increasing bitrate order.
+    test -- Array of shape (n_curves, n_points, 2) of the test points in the
+            form (bitrate, psnr), in increasing bitrate order.
+    """
+    base_log_rate, base_psnr, test_log_rate, test_psnr, min_psnr, max_psnr \
+            = _prepare_batch(base, test)
+
+    valid = numpy.all(numpy.diff(base_psnr, axis=1) > 0, axis=1) \
+            & numpy.all(numpy.diff(test_psnr, axis=1) > 0, axis=1)
+
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        base_integral_value = _pchip_integral(base_psnr, base_log_rate, max_psnr) \
+                              - _pchip_integral(base_psnr, base_log_rate, min_psnr)
+        test_integral_value = _pchip_integral(test_psnr, test_log_rate, max_psnr) \
+                              - _pchip_integral(test_psnr, test_log_rate, min_psnr)
+
+        average = (test_integral_value - base_integral_value) \
+                  / (max_psnr - min_psnr)
+
+        return numpy.where(valid, (numpy.exp(average) - 1) * 100, numpy.nan)
+
+def _polyfit_batch(x, y, degree):
+    """Returns the coefficients (highest power first) of the least squares
+    polynomial fits of several curves, as numpy.polyfit does for one.
+
+    Keyword arguments:
+    x -- Array of shape (n_curves, n_points).
+    y -- Array of shape (n_curves, n_points).
+    degree -- Degree of the polynomials.
+    """
+    vandermonde = x[:, :, None] ** numpy.arange(degree, -1, -1)
+    scale = numpy.sqrt(numpy.sum(vandermonde * vandermonde, axis=1))
+
+    coefficients = numpy.linalg.pinv(vandermonde / scale[:, None, :]) \
+                   @ y[:, :, None]
+
+    return coefficients[:, :, 0] / scale
+
+def _polyint_value(coefficients, bounds):
+    """Returns the values of the integrals (with no constant term) of several
+    polynomials at the given bounds.
+
+    Keyword arguments:
+    coefficients -- Array of shape (n_curves, degree + 1), highest power first.
+    bounds -- Array of shape (n_curves,).
+    """
+    degree = coefficients.shape[1] - 1
+    integral = coefficients / numpy.arange(degree + 1, 0, -1)
+
+    value = numpy.zeros_like(bounds)
+    for index in range(degree + 1):
+        value = value * bounds + integral[:, index]
+
+    return value * bounds
+
+def _polyfit_integral(x, y, min_x, max_x):
+    """Returns the integrals between two bounds of the cubic least squares fits
+    of several curves. The fits are done on normalized values of x (zero mean
+    and unit variance per curve), which keeps them well conditioned.
+
+    Keyword arguments:
+    x -- Array of shape (n_curves, n_points).
+    y -- Array of shape (n_curves, n_points).
+    min_x -- Array of shape (n_curves,) with the lower bounds.
+    max_x -- Array of shape (n_curves,) with the upper bounds.
+    """
+    center = x.mean(axis=1)
+    spread = x.std(axis=1)
+
+    polynomial = _polyfit_batch((x - center[:, None]) / spread[:, None], y, 3)
+
+    return spread * (_polyint_value(polynomial, (max_x - center) / spread)
+                     - _polyint_value(polynomial, (min_x - center) / spread))
+
+def bdrate_old_batch(base, test):
+    """Calculates the BD-rates of several pairs of curves at once using the
+    cubic polynomial interpolation function. Returns an array with one BD-rate
+    per pair of curves.
+
+    Keyword arguments:
+    base -- Array of shape (n_curves, n_points, 2) of the baseline points in the
+            form (bitrate, psnr).
+    test -- Array of shape (n_curves, n_points, 2) of the test points in the
+            form (bitrate, psnr).
+    """
+    base_log_rate, base_psnr, test_log_rate, test_psnr, min_psnr, max_psnr \
+            = _prepare_batch(base, test)
+
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        base_integral_value = _polyfit_integral(base_psnr, base_log_rate,
+                min_psnr, max_psnr)
+        test_integral_value = _polyfit_integral(test_psnr, test_log_rate,
+                min_psnr, max_psnr)
+
+        average = (test_integral_value - base_integral_value) \
+                  / (max_psnr - min_psnr)
+
+        return (numpy.exp(average) - 1) * 100
+
+def bdrate_curves(base_curves, test_curves, use_old_bdrate=False):
+    """Calculates the BD-rates of several pairs of curves, which may have
+    different numbers of points. Curves are grouped by size, so that each group
+    is evaluated at once. Returns a list with one BD-rate per pair of curves.
+
+    Keyword arguments:
+    base_curves -- List of arrays of tuples of the baseline points in the form
+            (bitrate, psnr), in increasing bitrate order.
+    test_curves -- List of arrays of tuples of the test points in the form
+            (bitrate, psnr), in increasing bitrate order.
+    use_old_bdrate -- Boolean parameter to use the cubic polynomial
+            interpolation function instead of the piecewise cubic one.
+    """
+    groups = dict()
+    for index, (base, test) in enumerate(zip(base_curves, test_curves)):
+        groups.setdefault((len(base), len(test)), list()).append(index)
+
+    bdrates = [float('nan')] * len(base_curves)
+
+    hmtools.profile.count('curve pairs evaluated', len(bdrates))
+    hmtools.profile.count('curve batches', len(groups))
+
+    with hmtools.profile.stage('bdrate'):
+        for indices in groups.values():
+            base = [base_curves[index] for index in indices]
+            test = [test_curves[index] for index in indices]
+            if use_old_bdrate:
+                values = bdrate_old_batch(base, test)
+            else:
+                values = bdrate_batch(base, test)
+            for index, value in zip(indices, values):
+                bdrates[index] = float(value)
+
+    return bdrates
+
+def pareto_front(groups, x, y):
+    """Returns a boolean array that marks the points on the Pareto front of
+    their group: those for which no other point of the group has a lower or
+    equal x and a higher or equal y (duplicated points are marked once). The
+    points of all the groups are processed at once, in O(n log n).
+
+    Keyword arguments:
+    groups -- Array with the group (e.g. the sequence) of each point.
+    x -- Array with the value of each point to minimize (e.g. the bitrate).
+    y -- Array with the value of each point to maximize (e.g. the psnr).
+    """
+    groups = numpy.asarray(groups)
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+
+    front = numpy.zeros(len(x), dtype=bool)
+    if len(x) == 0:
+        return front
+
+    # Within each group, sorted by increasing x and decreasing y, a point is on
+    # the front if its y is higher than that of all the previous points. The
+    # dense ranks of y are offset per group so that a single cumulative
+    # maximum restarts at each group.
+    order = numpy.lexsort((-y, x, groups))
+    _, ranks = numpy.unique(y[order], return_inverse=True)
+    _, group_ranks = numpy.unique(groups[order], return_inverse=True)
+    keys = group_ranks.astype(numpy.int64) * (int(ranks.max()) + 2) + ranks + 1
+
+    front[order[0]] = True
+    front[order[1:]] = keys[1:] > numpy.maximum.accumulate(keys)[:-1]
+
+    return front
+
+def convex_hull(groups, x, y):
+    """Returns a boolean array that marks the vertices of the upper-left convex
+    hull of the points of each group, that is, the points of the Pareto front
+    (see pareto_front) that are strictly above the segments that join the
+    others. The points of all the groups are sorted at once, and the hull of
+    each group is then built with a monotone chain, in O(n log n).
+
+    Keyword arguments:
+    groups -- Array with the group (e.g. the sequence) of each point.
+    x -- Array with the value of each point to minimize (e.g. the logarithm
+            of the bitrate).
+    y -- Array with the value of each point to maximize (e.g. the psnr).
+    """
+    groups = numpy.asarray(groups)
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+
+    front = numpy.flatnonzero(pareto_front(groups, x, y))
+    vertices = front[numpy.lexsort((x[front], groups[front]))]
+
+    # The points of the front of a group have increasing x and y, so the last
+    # vertex of the stack is removed while it is not above the segment that
+    # joins the previous vertex and the new point. Vertices of other groups
+    # are never removed, which lets a single stack hold the hulls of all the
+    # groups.
+    stack = list()
+    for point in zip(vertices.tolist(), groups[vertices].tolist(),
+                     x[vertices].tolist(), y[vertices].tolist()):
+        _, group, point_x, point_y = point
+        while len(stack) >= 2 and stack[-2][1] == group \
+                and stack[-1][1] == group:
+            _, _, left_x, left_y = stack[-2]
+            _, _, middle_x, middle_y = stack[-1]
+            if (middle_y - left_y) * (point_x - left_x) \
+                    > (point_y - left_y) * (middle_x - left_x):
+                break
+            stack.pop()
+        stack.append(point)
+
+    hull = numpy.zeros(len(x), dtype=bool)
+    hull[[point[0] for point in stack]] = True
+
+    return hull
+
+def hull_curves(curves):
+    """Returns the convex hulls of several rate-distortion curves (see
+    convex_hull), in the plane of the logarithm of the bitrate and the psnr
+    in which the BD-rate is calculated. The hulls keep the operating points
+    that are efficient, so that curves built from any number of points (e.g.
+    several presets per QP) become strictly increasing in bitrate and psnr.
+    The points of all the curves are processed at once.
+
+    Keyword arguments:
+    curves -- List of arrays of tuples of points in the form (bitrate, psnr),
+            in increasing bitrate order.
+    """
+    sizes = [len(curve) for curve in curves]
+    if sum(sizes) == 0:
+        return [numpy.empty((0, 2)) for _ in curves]
+
+    points = numpy.concatenate([numpy.asarray(curve, dtype=float).reshape(-1, 2)
+                                for curve in curves])
+    groups = numpy.repeat(numpy.arange(len(curves)), sizes)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        log_rate = numpy.log(points[:, 0])
+    valid = numpy.flatnonzero(numpy.isfinite(log_rate)
+                              & numpy.isfinite(points[:, 1]))
+
+    hull = valid[convex_hull(groups[valid], log_rate[valid],
+            points[valid, 1])]
+    hull = hull[numpy.lexsort((points[hull, 0], groups[hull]))]
+
+    counts = numpy.bincount(groups[hull], minlength=len(curves))
+
+    return numpy.split(points[hull], numpy.cumsum(counts)[:-1])
@@ -0,0 +1,161 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+import os.path
+import sqlite3
+
+def default_path():
+    """Returns the default path of the cache database, which is placed in the
+    user cache directory ($XDG_CACHE_HOME or ~/.cache).
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') \
+                 or os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(cache_home, 'hmtools', 'parse.sqlite')
+
+def _entry_exists(path):
+    """Returns whether the file of an entry exists, which is either the file
+    itself or, for archive members, the archive that contains it.
+
+    Keyword arguments:
+    path -- Path of the entry.
+    """
+    while not os.path.lexists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return False
+        path = parent
+
+    return os.path.isfile(path)
+
+class ParseCache:
+    """Persistent cache of parsed result files stored in a SQLite database.
+
+    Entries are identified by the path of the file and whether perf values were
+    parsed, and they are only valid while the size and modification time of the
+    file, and the version of the parser, are the same as when they were stored.
+    Stale entries are evicted as soon as they are looked up.
+    """
+
+    def __init__(self, path=None, refresh=False):
+        """Opens (and creates, if needed) the cache database.
+
+        Keyword arguments:
+        path -- Path of the database file. If it is None, the default path is
+                used.
+        refresh -- Boolean parameter to ignore the stored entries, so that every
+                file is parsed again and its entry rewritten.
+        """
+        if path is None:
+            path = default_path()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.refresh = refresh
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT NOT NULL, '
+                'use_perf INTEGER NOT NULL, '
+                'size INTEGER NOT NULL, '
+                'mtime_ns INTEGER NOT NULL, '
+                'version TEXT NOT NULL, '
+                'results TEXT NOT NULL, '
+                'PRIMARY KEY (path, use_perf))')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, filename, stat, use_perf, version):
+        """Returns the stored results of a file, or None if there is no valid
+        entry for it.
+
+        Keyword arguments:
+        filename -- Path of the file.
+        stat -- Result of os.stat() on the file.
+        use_perf -- Boolean parameter stating whether perf values are parsed.
+        version -- Version of the parser.
+        """
+        key = (os.path.abspath(filename), int(bool(use_perf)))
+
+        row = self.connection.execute('SELECT size, mtime_ns, version, results '
+                'FROM files WHERE path = ? AND use_perf = ?', key).fetchone()
+        if row is None:
+            return None
+
+        if self.refresh or row[:3] != (stat.st_size, stat.st_mtime_ns,
+                str(version)):
+            self.connection.execute('DELETE FROM files WHERE path = ? AND '
+                    'use_perf = ?', key)
+            return None
+
+        return json.loads(row[3])
+
+    def put(self, filename, stat, use_perf, version, results):
+        """Stores the results of a file. Changes are written to disk on
+        commit().
+
+        Keyword arguments:
+        filename -- Path of the file.
+        stat -- Result of os.stat() on the file before it was parsed.
+        use_perf -- Boolean parameter stating whether perf values are parsed.
+        version -- Version of the parser.
+        results -- Dictionary returned by the parser.
+        """
+        self.connection.execute('INSERT OR REPLACE INTO files VALUES '
+                '(?, ?, ?, ?, ?, ?)', (os.path.abspath(filename),
+                int(bool(use_perf)), stat.st_size, stat.st_mtime_ns,
+                str(version), json.dumps(results)))
+
+    def prune(self, directories=None):
+        """Removes the entries of files that no longer exist. Entries of archive
+        members (see hmtools.archive.member_path) are kept while their archive
+        exists, since they are validated against it.
+
+        Keyword arguments:
+        directories -- Optional list of paths of directories (or archives)
+                whose entries are checked. By default, every entry is checked.
+        """
+        paths = [row[0] for row in self.connection.execute('SELECT DISTINCT '
+                'path FROM files')]
+        if directories is not None:
+            prefixes = tuple(os.path.join(os.path.abspath(directory), '')
+                             for directory in directories)
+            paths = [path for path in paths if path.startswith(prefixes)]
+        missing = [(path,) for path in paths if not _entry_exists(path)]
+
+        self.connection.executemany('DELETE FROM files WHERE path = ?', missing)
+        self.connection.commit()
+
+    def clear(self):
+        """Removes every entry of the cache."""
+        self.connection.execute('DELETE FROM files')
+        self.connection.commit()
+
+    def commit(self):
+        """Writes the pending changes to disk."""
+        self.connection.commit()
+
+    def close(self):
+        """Writes the pending changes to disk and closes the database."""
+        self.connection.commit()
+        self.connection.close()
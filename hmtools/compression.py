@@ -0,0 +1,164 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import io
+import os.path
+
+# Magic bytes at the start of the files of each supported compression format.
+MAGIC_BYTES = (('gzip', b'\x1f\x8b'), ('xz', b'\xfd7zXZ\x00'),
+        ('bzip2', b'BZh'), ('zstd', b'\x28\xb5\x2f\xfd'))
+
+# Suffixes of the filenames of each supported compression format, which are
+# removed to obtain the name of the log they contain.
+SUFFIXES = ('.gz', '.xz', '.bz2', '.zst')
+
+def logical_name(filename):
+    """Returns the name of a file without its compression suffix, if any.
+
+    Keyword arguments:
+    filename -- Name of the file.
+    """
+    root, extension = os.path.splitext(filename)
+
+    return root if extension in SUFFIXES else filename
+
+def _detect_header(header):
+    """Returns the name of the compression format whose magic bytes start a
+    header, or None if there is none.
+
+    Keyword arguments:
+    header -- First bytes of the file.
+    """
+    for compression, magic in MAGIC_BYTES:
+        if header.startswith(magic):
+            return compression
+
+    return None
+
+def detect(file):
+    """Returns the name of the compression format of a binary file (see
+    MAGIC_BYTES) by looking at its first bytes, or None if it is not
+    compressed. The position of the file is not changed.
+
+    Keyword arguments:
+    file -- Binary file object, which must support peek().
+    """
+    return _detect_header(file.peek(max(len(magic)
+                                        for _, magic in MAGIC_BYTES)))
+
+def _zstandard():
+    """Returns the zstandard module, which is optional."""
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('the zstandard package is required to read zstd '
+                'compressed files') from None
+
+    return zstandard
+
+def _zstd_reader(filename):
+    """Returns a binary file object that decompresses a zstd file.
+
+    Keyword arguments:
+    filename -- Path of the file.
+    """
+    return io.BufferedReader(_zstandard().ZstdDecompressor()
+            .stream_reader(open(filename, 'rb'), closefd=True))
+
+def decompress(data):
+    """Returns the decompressed content of a file read in memory (e.g. a member
+    of an archive), or the data itself if it is not compressed.
+
+    Keyword arguments:
+    data -- Bytes of the file.
+    """
+    compression = _detect_header(data)
+
+    if compression is None:
+        return data
+    elif compression == 'gzip':
+        import gzip
+        return gzip.decompress(data)
+    elif compression == 'xz':
+        import lzma
+        return lzma.decompress(data)
+    elif compression == 'bzip2':
+        import bz2
+        return bz2.decompress(data)
+    else:
+        return _zstandard().ZstdDecompressor().decompressobj().decompress(data)
+
+def decompress_head(data, size):
+    """Returns up to a number of bytes from the start of the decompressed
+    content of a file read in memory, decompressing only as much of it as
+    needed (e.g. to sniff its format), or the start of the data itself if it
+    is not compressed.
+
+    Keyword arguments:
+    data -- Bytes of the file.
+    size -- Maximum number of bytes returned.
+    """
+    compression = _detect_header(data)
+
+    if compression is None:
+        return data[:size]
+    elif compression == 'gzip':
+        import zlib
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, size)
+    elif compression == 'xz':
+        import lzma
+        return lzma.LZMADecompressor().decompress(data, size)
+    elif compression == 'bzip2':
+        import bz2
+        return bz2.BZ2Decompressor().decompress(data, size)
+    else:
+        with _zstandard().ZstdDecompressor().stream_reader(data) as reader:
+            return reader.read(size)
+
+def open_log(filename):
+    """Opens a result file for reading in binary mode, decompressing it on the
+    fly if it is compressed, and returns a tuple (file, compression) with the
+    file object and the name of its compression format (or None). Compressed
+    streams are only read forwards (they can not be read from the end without
+    decompressing them completely).
+
+    Keyword arguments:
+    filename -- Path of the file.
+    """
+    file = open(filename, 'rb')
+
+    try:
+        compression = detect(file)
+    except:
+        file.close()
+        raise
+
+    if compression is None:
+        return file, compression
+
+    # The decompressors open the file again, so that closing them closes it.
+    file.close()
+
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(filename, 'rb'), compression
+    elif compression == 'xz':
+        import lzma
+        return lzma.open(filename, 'rb'), compression
+    elif compression == 'bzip2':
+        import bz2
+        return bz2.open(filename, 'rb'), compression
+    else:
+        return _zstd_reader(filename), compression
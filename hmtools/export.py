@@ -0,0 +1,194 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import csv
+import json
+import numpy
+import sys
+
+# Formats in which tables of columns can be written. Parquet requires the
+# optional pyarrow package.
+EXPORT_FORMATS = ('csv', 'jsonl', 'npz', 'parquet')
+
+# Formats written as text, which may be written to the standard output.
+TEXT_FORMATS = ('csv', 'jsonl')
+
+# Number of rows converted and written at once by the text writers, so that
+# the rows are written in large blocks without building the whole output in
+# memory.
+CHUNK_ROWS = 65536
+
+# Size of the buffer of the files opened by write_columns, in bytes.
+BUFFER_SIZE = 1 << 20
+
+def concatenate(tables):
+    """Returns a table with the rows of several tables, whose columns are the
+    union of theirs in order of appearance. Columns missing from a table are
+    filled with NaN.
+
+    Keyword arguments:
+    tables -- List of dictionaries of columns (arrays of the same length).
+    """
+    names = list()
+    for table in tables:
+        names.extend(name for name in table if name not in names)
+
+    columns = dict()
+    for name in names:
+        parts = list()
+        for table in tables:
+            if name in table:
+                parts.append(numpy.asarray(table[name]))
+            else:
+                parts.append(numpy.full(len(next(iter(table.values()), ())),
+                                        numpy.nan))
+        columns[name] = numpy.concatenate(parts)
+
+    return columns
+
+def _rows(columns, start, end):
+    """Returns a list with the rows of a slice of a table, as tuples of Python
+    values in which NaN is replaced by None.
+
+    Keyword arguments:
+    columns -- Dictionary of columns (arrays of the same length).
+    start -- Index of the first row.
+    end -- Index after the last row.
+    """
+    values = list()
+    for column in columns.values():
+        column = numpy.asarray(column[start:end])
+        if column.dtype.kind == 'f':
+            missing = numpy.isnan(column)
+            if missing.any():
+                column = column.astype(object)
+                column[missing] = None
+        values.append(column.tolist())
+
+    return list(zip(*values))
+
+def _length(columns):
+    """Returns the number of rows of a table."""
+    return len(next(iter(columns.values()), ()))
+
+def write_csv(columns, file, header=True):
+    """Writes a table as CSV, with missing values (NaN) as empty fields.
+
+    Keyword arguments:
+    columns -- Dictionary of columns (arrays of the same length).
+    file -- Text file object.
+    header -- Boolean parameter to write a first row with the column names.
+    """
+    writer = csv.writer(file, lineterminator='\n')
+    if header:
+        writer.writerow(columns.keys())
+
+    length = _length(columns)
+    for start in range(0, length, CHUNK_ROWS):
+        writer.writerows(_rows(columns, start, min(start + CHUNK_ROWS, length)))
+
+def write_jsonl(columns, file):
+    """Writes a table as JSON lines, with an object per row whose keys are the
+    column names, and missing values (NaN) as null.
+
+    Keyword arguments:
+    columns -- Dictionary of columns (arrays of the same length).
+    file -- Text file object.
+    """
+    encode = json.JSONEncoder(allow_nan=False).encode
+    names = list(columns.keys())
+
+    length = _length(columns)
+    for start in range(0, length, CHUNK_ROWS):
+        rows = _rows(columns, start, min(start + CHUNK_ROWS, length))
+        file.write(''.join([encode(dict(zip(names, row))) + '\n'
+                            for row in rows]))
+
+def write_npz(columns, file):
+    """Writes a table as a NumPy .npz archive with an array per column. Text
+    columns are stored as Unicode arrays, so that they can be loaded without
+    allowing pickles.
+
+    Keyword arguments:
+    columns -- Dictionary of columns (arrays of the same length).
+    file -- Path of the archive, or binary file object.
+    """
+    arrays = dict()
+    for name, column in columns.items():
+        column = numpy.asarray(column)
+        if column.dtype.kind == 'O':
+            column = column.astype(str)
+        arrays[name] = column
+
+    numpy.savez(file, **arrays)
+
+def _pyarrow():
+    """Returns the pyarrow and pyarrow.parquet modules, which are optional."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('the pyarrow package is required to write Parquet '
+                'files') from None
+
+    return pyarrow, pyarrow.parquet
+
+def write_parquet(columns, file):
+    """Writes a table as a Parquet file, with missing values (NaN) as NaN.
+    Requires the pyarrow package.
+
+    Keyword arguments:
+    columns -- Dictionary of columns (arrays of the same length).
+    file -- Path of the file, or binary file object.
+    """
+    pyarrow, parquet = _pyarrow()
+
+    parquet.write_table(pyarrow.table({name: numpy.asarray(column)
+            for name, column in columns.items()}), file)
+
+def write_columns(columns, export_format, path=None):
+    """Writes a table in one of EXPORT_FORMATS.
+
+    Keyword arguments:
+    columns -- Dictionary of columns (arrays of the same length).
+    export_format -- Name of the format.
+    path -- Path of the output file, or None (or '-') for the standard output,
+            which is only supported by TEXT_FORMATS.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError('unknown export format: {}'.format(export_format))
+
+    if path is None or path == '-':
+        if export_format not in TEXT_FORMATS:
+            raise ValueError('the {} format requires an output file'.format(
+                    export_format))
+        file = sys.stdout
+    elif export_format in TEXT_FORMATS:
+        file = open(path, 'w', newline='', buffering=BUFFER_SIZE)
+    else:
+        file = open(path, 'wb', buffering=BUFFER_SIZE)
+
+    try:
+        if export_format == 'csv':
+            write_csv(columns, file)
+        elif export_format == 'jsonl':
+            write_jsonl(columns, file)
+        elif export_format == 'npz':
+            write_npz(columns, file)
+        else:
+            write_parquet(columns, file)
+    finally:
+        if file is not sys.stdout:
+            file.close()
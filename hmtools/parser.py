@@ -13,124 +13,1491 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import functools
+import hmtools.archive
+import hmtools.compression
+import hmtools.profile
+import io
+import numpy
 import os
 import os.path
+import posixpath
 import re
 
-def parse_file(filename, use_perf):
+# Version of the parsing logic. It must be increased whenever the values
+# returned by parse_file change, so that cached results are discarded. The
+# version of the results of each file also includes the name of its format
+# (see format_version).
+PARSER_VERSION = 2
+
+# The summary of HM (and VTM) starts with a line beginning with this marker,
+# and it is followed only by the encoding time and, if present, the output of
+# perf.
+SUMMARY_MARKER = b'SUMMARY'
+
+# Format of the result files that do not match the signature of any format
+# (see sniff_bytes).
+DEFAULT_FORMAT = 'hm'
+
+# Number of bytes at the start of a file in which the signatures of the formats
+# are looked for.
+SNIFF_SIZE = 8 * 1024
+
+# Size of the first block read from the end of a file when looking for the
+# summary (it doubles on each step), and maximum distance from the end of the
+# file at which it is looked for before falling back to a full scan.
+TAIL_BLOCK_SIZE = 64 * 1024
+TAIL_MAX_SIZE = 16 * 1024 * 1024
+
+# Number of bytes read at once when looking for the summary in a compressed
+# file.
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+# This constant RE represents any number without thousands separator.
+NUMBER = r'(?:[-+]?\d*[,.]\d+|[-+]?\d+)'
+
+# Characters a line may start with (after any whitespace) to be a row of the
+# summary.
+NUMBER_FIRST_CHARACTERS = frozenset('+-,.0123456789')
+
+RE_RD = re.compile(r'^\s*{}\s*([aipb])\s+({})\s+({})\s+({})\s+({})\s+({})$'
+        .replace('{}', NUMBER))
+RE_TIME = re.compile(r'^ Total Time:\s*({}) sec.$'
+        .replace('{}', NUMBER))
+
+# The summary rows of VTM may have extra columns after the YUV-PSNR (e.g. the
+# MSE-based PSNR or the MS-SSIM, depending on its options), and its total time
+# reports the user (CPU) time, which is used as in HM, and the elapsed time.
+RE_VTM_RD = re.compile(r'^\s*{}\s*([aipb])\s+({})\s+({})\s+({})\s+({})\s+({})'
+        r'(?:\s.*)?$'.replace('{}', NUMBER))
+RE_VTM_TIME = re.compile(r'^ Total Time:\s*({}) sec\.'
+        r'(?:\s*\[user\]\s*{} sec\.\s*\[elapsed\])?\s*$'.replace('{}', NUMBER))
+
+# Columns of the summary CSV written by x265 with --csv, and the slice types of
+# the columns of each slice type.
+X265_COLUMNS = {'time': 'Elapsed Time', 'bitrate': 'Bitrate',
+        'y_psnr': 'Y PSNR', 'u_psnr': 'U PSNR', 'v_psnr': 'V PSNR',
+        'yuv_psnr': 'Global PSNR'}
+X265_SLICE_COLUMNS = {'count': '{} count', 'bitrate': '{} kbps',
+        'y_psnr': '{}-PSNR Y', 'u_psnr': '{}-PSNR U', 'v_psnr': '{}-PSNR V'}
+X265_SLICE_TYPES = {'I': 'i', 'P': 'p', 'B': 'b'}
+RE_PERF_FREQUENCY = re.compile(r'.*#\s*({})\s*.?Hz.*$'
+        .replace('{}', NUMBER))
+RE_PERF_TIME = re.compile(r'^\s*({})\s*(?:\+-\s*({})\s*)?seconds time elapsed'
+        r'(?:.*\(\s*\+-\s*({})\s*%\s*\))?'.replace('{}', NUMBER))
+
+# Counter lines of perf stat, e.g.:
+#     40,123,456,789      cycles        #    3.250 GHz        ( +-  0.05% )
+#      12345.678901 msec task-clock     #    0.999 CPUs utilized
+#      12345.678901      task-clock (msec)
+#     <not counted>      branch-misses                        (0.00%)
+RE_PERF_COUNTER = re.compile(r'^\s*(\d[\d.,]*|<not counted>|<not supported>)\s+'
+        r'(?:(msec|usec|nsec|sec|Joules|MiB|GiB|W)\s+)?'
+        r'([A-Za-z_][\w.:/=,@-]*)(?:\s+\(([a-z]+)\))?'
+        r'(?:\s+#([^(]*))?(?:\(\s*\+-\s*([\d.,]+)\s*%\s*\))?'
+        r'\s*(?:\(([\d.,]+)\s*%\))?\s*$')
+# Counter lines of perf stat -x (CSV), whose fields are the value, unit and
+# event, followed by the variance when there are several runs, the running
+# time and percentage, and the metric value and unit, e.g.:
+# 40123456789,,cycles,0.05%,12345678901,100.00,3.25,GHz
+RE_PERF_CSV = re.compile(r'^(\d[\d.]*|<not counted>|<not supported>)'
+        r'([^\w\s.<>%+-])([^\s]*?)\2([A-Za-z_][^\s]*?)(?:\2(.*))?$')
+RE_PERF_RUNS = re.compile(r'\((\d+) runs\):\s*$')
+RE_PERF_METRIC = re.compile(r'^\s*(\d[\d.,]*)\s*(.*?)\s*$')
+RE_FREQUENCY_UNIT = re.compile(r'^.?Hz$')
+
+# Lines printed by HM for each encoded picture, e.g.:
+# POC    8 TId: 1 ( B-SLICE, nQP 33 QP 33 )      40656 bits [Y 37.1 dB    U ...
+# ... 41.2 dB    V 42.3 dB] [ET     3 ] [L0 0 16 ] [L1 16 0 ]
+RE_FRAME = re.compile(r'^POC\s+(\d+)\s+(?:LId:\s*\d+\s+)?TId:\s*(\d+)\s+'
+        r'\(\s*([A-Z])-SLICE,\s*(?:nQP\s+-?\d+\s+)?QP\s+(-?\d+)\s*\)\s+'
+        r'(\d+)\s+bits\s+\[Y\s+({})\s+dB\s+U\s+({})\s+dB\s+V\s+({})\s+dB\]'
+        r'(?:[^\n]*?\[ET\s+({})\s*\])?'.replace('{}', NUMBER), re.MULTILINE)
+
+# Fields of the per-picture arrays, in the same order as the groups of RE_FRAME.
+FRAME_DTYPE = numpy.dtype([('poc', 'i4'), ('tid', 'i4'), ('slice_type', 'U1'),
+        ('qp', 'i4'), ('bits', 'i8'), ('y_psnr', 'f8'), ('u_psnr', 'f8'),
+        ('v_psnr', 'f8'), ('time', 'f8')])
+
+# Number of characters read at once by the per-picture parser.
+FRAME_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Wildcards and tags of filename patterns, which are replaced when compiling
+# them. A recursive wildcard followed by a separator (and not by a tag) absorbs
+# the separator.
+RE_PATTERN_TOKEN = re.compile(r'\*\*/(?![np])|\*\*|\*|/n|/p')
+
+# Characters that end the literal prefix and suffix of a pattern.
+PATTERN_SPECIAL_CHARACTERS = frozenset('.^$*+?{}[]()|\\/')
+
+# Results of the entries of iter_dirs that correspond to archives.
+ARCHIVE = object()
+
+# Number of files sent at once to each process when their number is not known
+# in advance.
+PROCESS_CHUNK_SIZE = 8
+
+# Number of files per worker that iter_groups parses ahead of the group being
+# yielded.
+GROUP_WINDOW_SIZE = 32
+
+def _read_summary(file, marker=SUMMARY_MARKER):
+    """Searches backwards from the end of a binary file for the last line that
+    starts the summary of the encoding, and returns a text stream with the lines
+    from there to the end of the file. Returns None if the summary is not found
+    close enough to the end of the file.
+
+    Keyword arguments:
+    file -- Binary file object, which must be seekable.
+    marker -- Bytes at the start of the line that starts the summary.
+    """
+    end = file.seek(0, os.SEEK_END)
+    position = end
+    block_size = TAIL_BLOCK_SIZE
+    tail = b''
+
+    while position > 0 and end - position < TAIL_MAX_SIZE:
+        size = min(block_size, position)
+        position -= size
+        file.seek(position)
+        tail = file.read(size) + tail
+        block_size *= 2
+        hmtools.profile.count('bytes read', size)
+
+        # Only the new block (and the boundary with the previous one) needs to
+        # be searched.
+        index = tail.rfind(b'\n' + marker, 0, size + len(marker) + 1)
+        if index >= 0:
+            return io.TextIOWrapper(io.BytesIO(tail[index + 1:]))
+        if position == 0 and tail.startswith(marker):
+            return io.TextIOWrapper(io.BytesIO(tail))
+
+    return None
+
+def _scan_summary(file, marker=SUMMARY_MARKER):
+    """Reads a binary stream forwards looking for the last line that starts the
+    summary of the encoding, and returns a text stream with the lines from there
+    to the end of the stream. Only the data after the last summary found so far
+    is kept in memory. Returns None if the summary is not found close enough to
+    the end of the stream (as _read_summary, for streams that can not be read
+    from the end, such as compressed files).
+
+    Keyword arguments:
+    file -- Binary file object.
+    marker -- Bytes at the start of the line that starts the summary.
+    """
+    line_marker = b'\n' + marker
+    tail = None
+    tail_size = 0
+
+    # The start of the stream is handled as if it followed a line break.
+    previous = b'\n'
+
+    while True:
+        block = file.read(STREAM_BLOCK_SIZE)
+        if not block:
+            break
+        hmtools.profile.count('bytes read', len(block))
+
+        # The end of the previous block is searched too, in case the marker
+        # spans both blocks.
+        data = previous + block
+        index = data.rfind(line_marker)
+        if index >= 0:
+            tail = [data[index + 1:]]
+            tail_size = len(tail[0])
+        elif tail is not None:
+            tail.append(block)
+            tail_size += len(block)
+            if tail_size > TAIL_MAX_SIZE:
+                tail = None
+        previous = data[-len(marker):]
+
+    if tail is None:
+        return None
+
+    return io.TextIOWrapper(io.BytesIO(b''.join(tail)))
+
+def parse_file(filename, use_perf, tail_first=True, log_format=None):
     """Parses a result file and returns a dictionary with the values of the
-    summary (encoding time, and bitrate and psnr per slice type).
+    summary (encoding time, and bitrate and psnr per slice type). Files
+    compressed with gzip, xz, bzip2 or zstd are decompressed on the fly (see
+    hmtools.compression).
 
     Keyword arguments:
     filename -- Path of the file to parse.
     use_perf -- Boolean parameter to use perf timing values instead of the ones
             reported in the result files.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            file, and only scan the whole file if it is not found there. The
+            cost of parsing is then independent of the length of the log (for
+            compressed files, which must be decompressed anyway, only the lines
+            of the summary are parsed).
+    log_format -- Name of the format of the file (see FORMATS). By default, it
+            is sniffed from the start of the file (see sniff_format).
     """
-    # This constant RE represents any number without thousands separator.
-    NUMBER = '(?:[-+]?\d*[,.]\d+|[-+]?\d+)'
+    if log_format is None:
+        log_format = sniff_format(filename)
+    log_format = FORMATS[log_format]
 
-    results = dict()
+    with hmtools.profile.parsing(filename):
+        file, compression = hmtools.compression.open_log(filename)
 
-    re_rd = re.compile('^\s*{}\s*([aipb])\s+({})\s+({})\s+({})\s+({})\s+({})$'
-            .replace('{}', NUMBER))
-    re_time = re.compile('^ Total Time:\s*({}) sec.$'
-            .replace('{}', NUMBER))
-    if use_perf:
-        re_perf_frequency = re.compile('.*#\s*({})\s*.?Hz.*$'
-                .replace('{}', NUMBER))
-        re_perf_time = re.compile('^\s*({})\s*seconds time elapsed'
-                .replace('{}', NUMBER))
-
-    file = open(filename, 'r')
-
-    for line in file:
-        match = re_rd.search(line)
-        if match:
-            slice_type = match.group(1)
-            if 'rd' not in results:
-                results['rd'] = dict()
-            results['rd'][slice_type] = dict()
-            try:
-                results['rd'][slice_type]['bitrate'] = float(match.group(2))
-                results['rd'][slice_type]['y_psnr'] = float(match.group(3))
-                results['rd'][slice_type]['u_psnr'] = float(match.group(4))
-                results['rd'][slice_type]['v_psnr'] = float(match.group(5))
-                results['rd'][slice_type]['yuv_psnr'] = float(match.group(6))
-            except:
-                results['rd'].pop(slice_type, None)
-                if not results['rd']:
-                    results.pop('rd', None)
-            continue
-        match = re_time.search(line)
-        if match:
+        try:
+            lines = None
+            with hmtools.profile.stage('read'):
+                if tail_first and log_format.marker is not None:
+                    if compression is None:
+                        lines = _read_summary(file, log_format.marker)
+                    else:
+                        lines = _scan_summary(file, log_format.marker)
+            if lines is None:
+                hmtools.profile.count('full scans')
+                if compression is None:
+                    file.seek(0)
+                else:
+                    file.close()
+                    file, _ = hmtools.compression.open_log(filename)
+                lines = io.TextIOWrapper(file)
+
+            # Full scans read the file while its lines are matched, so their
+            # reading time is part of the match stage.
+            with hmtools.profile.stage('match'):
+                results = log_format.parse_lines(hmtools.profile.counted(
+                        'lines scanned', lines), use_perf)
+            if hmtools.profile.active is not None and lines.buffer is file:
+                hmtools.profile.count('bytes read', file.tell())
+
+            return results
+        finally:
+            file.close()
+
+def parse_bytes(data, use_perf, tail_first=True, log_format=None):
+    """Parses the content of a result file read in memory (e.g. a member of an
+    archive) and returns a dictionary with the values of the summary (see
+    parse_file). Compressed content is decompressed first.
+
+    Keyword arguments:
+    data -- Bytes of the file.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            file, and only scan the whole file if it is not found there.
+    log_format -- Name of the format of the file (see FORMATS). By default, it
+            is sniffed from the start of the content (see sniff_bytes).
+    """
+    with hmtools.profile.stage('read'):
+        file = io.BytesIO(hmtools.compression.decompress(data))
+        if log_format is None:
+            log_format = sniff_bytes(file.read(SNIFF_SIZE))
+        log_format = FORMATS[log_format]
+
+        lines = None
+        if tail_first and log_format.marker is not None:
+            lines = _read_summary(file, log_format.marker)
+    if lines is None:
+        hmtools.profile.count('full scans')
+        hmtools.profile.count('bytes read', len(file.getbuffer()))
+        file.seek(0)
+        lines = io.TextIOWrapper(file)
+
+    with hmtools.profile.stage('match'):
+        return log_format.parse_lines(hmtools.profile.counted('lines scanned',
+                lines), use_perf)
+
+def _parse_zip_member(name, path, use_perf, tail_first, log_format=None):
+    """Parses a member of a zip archive (see parse_bytes).
+
+    Keyword arguments:
+    name -- Name of the member.
+    path -- Path of the archive.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            file, and only scan the whole file if it is not found there.
+    log_format -- Name of the format of the member (see FORMATS).
+    """
+    with hmtools.profile.parsing(hmtools.archive.member_path(path, name)):
+        return parse_bytes(hmtools.archive.read_zip(path, name), use_perf,
+                tail_first, log_format)
+
+def _perf_number(text):
+    """Converts a number printed by perf, which may have thousands separators
+    and a decimal comma depending on the locale, to a float.
+
+    Keyword arguments:
+    text -- Text of the number.
+    """
+    if ',' in text and '.' in text:
+        # The last separator is the decimal one.
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        groups = text.split(',')
+        if len(groups) > 2 or len(groups[1]) == 3:
+            text = text.replace(',', '')
+        else:
+            text = text.replace(',', '.')
+    elif text.count('.') > 1:
+        text = text.replace('.', '')
+
+    return float(text)
+
+def _parse_perf_counter(line, perf):
+    """Parses a counter line of perf stat, in its default or CSV format, and
+    stores a record with its value, unit, variance (in percentage, when perf
+    was run several times), percentage of running time (when counters were
+    multiplexed) and metric in the 'counters' dictionary of the perf results.
+    Counters that were not counted or are not supported are ignored. Returns
+    whether the line is a counter line.
+
+    Keyword arguments:
+    line -- Line of the file.
+    perf -- Dictionary of perf results, which is modified in place.
+    """
+    match = RE_PERF_COUNTER.match(line)
+    if match:
+        value, unit, event, old_unit, metric, variance, running \
+                = match.groups()
+        unit = unit or old_unit or ''
+        match = RE_PERF_METRIC.match(metric) if metric else None
+        metric = [group for group in match.groups() if group] if match else []
+    else:
+        match = RE_PERF_CSV.match(line)
+        if not match:
+            return False
+        value, separator, unit, event, rest = match.groups()
+        fields = rest.split(separator) if rest else []
+        variance = fields.pop(0)[:-1] if fields and fields[0].endswith('%') \
+                   else None
+        running = fields[1] if len(fields) > 1 else None
+        metric = [field for field in fields[2:4] if field]
+        if len(metric) == 2 and RE_FREQUENCY_UNIT.match(metric[1]):
             try:
-                results['time'] = float(match.group(1))
-            except:
+                perf['frequency'] = _perf_number(metric[0])
+            except ValueError:
                 pass
-            continue
-        if use_perf:
-            match = re_perf_frequency.search(line)
+
+    if value.startswith('<'):
+        return True
+
+    try:
+        record = {'value': _perf_number(value), 'unit': unit}
+        if variance:
+            record['variance'] = _perf_number(variance)
+        if running:
+            record['running'] = _perf_number(running)
+    except ValueError:
+        return True
+
+    try:
+        if metric:
+            record['metric_value'] = _perf_number(metric[0])
+            if len(metric) > 1:
+                record['metric_unit'] = metric[1].strip()
+    except ValueError:
+        record.pop('metric_value', None)
+
+    if 'counters' not in perf:
+        perf['counters'] = dict()
+    perf['counters'][event] = record
+
+    return True
+
+def _parse_lines(lines, use_perf, rd_expression=RE_RD,
+        time_expression=RE_TIME):
+    """Parses the lines of a result file of HM and returns a dictionary with
+    the values of the summary (encoding time, and bitrate and psnr per slice
+    type). With use_perf, the output of perf stat is parsed too: frequency,
+    elapsed time and its variance, number of runs, and every counter (see
+    _parse_perf_counter).
+
+    Keyword arguments:
+    lines -- Iterable of lines of the file.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    rd_expression -- RE of the summary rows, whose groups are the slice type,
+            bitrate, and Y, U, V and YUV psnr.
+    time_expression -- RE of the line of the encoding time, whose first group
+            is the time.
+    """
+    results = dict()
+
+    # Most lines of a log (e.g. those of each POC) do not match any RE, so each
+    # RE is only tried on the lines that pass a cheap check on their content.
+    for line in lines:
+        first_character = line.lstrip()[:1]
+        if first_character in NUMBER_FIRST_CHARACTERS:
+            match = rd_expression.match(line)
             if match:
-                if 'perf' not in results:
-                    results['perf'] = dict()
+                slice_type = match.group(1)
+                if 'rd' not in results:
+                    results['rd'] = dict()
+                results['rd'][slice_type] = dict()
                 try:
-                    results['perf']['frequency'] = float(match.group(1).replace(',', '.'))
+                    results['rd'][slice_type]['bitrate'] = float(match.group(2))
+                    results['rd'][slice_type]['y_psnr'] = float(match.group(3))
+                    results['rd'][slice_type]['u_psnr'] = float(match.group(4))
+                    results['rd'][slice_type]['v_psnr'] = float(match.group(5))
+                    results['rd'][slice_type]['yuv_psnr'] = float(match.group(6))
                 except:
-                    if not results['perf']:
-                        results.pop('perf', None)
+                    results['rd'].pop(slice_type, None)
+                    if not results['rd']:
+                        results.pop('rd', None)
                 continue
-            match = re_perf_time.search(line)
+        elif line.startswith(' Total Time:'):
+            match = time_expression.match(line)
             if match:
-                if 'perf' not in results:
-                    results['perf'] = dict()
                 try:
-                    results['perf']['time'] = float(match.group(1).replace(',', '.'))
+                    results['time'] = float(match.group(1))
                 except:
-                    if not results['perf']:
-                        results.pop('perf', None)
+                    pass
+                continue
+        if use_perf:
+            if first_character.isdigit() or first_character == '<':
+                perf = results.get('perf', dict())
+                if _parse_perf_counter(line, perf) and perf:
+                    results['perf'] = perf
+            elif 'Performance counter stats' in line:
+                match = RE_PERF_RUNS.search(line)
+                if match:
+                    if 'perf' not in results:
+                        results['perf'] = dict()
+                    results['perf']['runs'] = int(match.group(1))
                 continue
+            if 'Hz' in line:
+                match = RE_PERF_FREQUENCY.match(line)
+                if match:
+                    if 'perf' not in results:
+                        results['perf'] = dict()
+                    try:
+                        results['perf']['frequency'] = float(match.group(1).replace(',', '.'))
+                    except:
+                        if not results['perf']:
+                            results.pop('perf', None)
+                    continue
+            if 'seconds time elapsed' in line:
+                match = RE_PERF_TIME.match(line)
+                if match:
+                    if 'perf' not in results:
+                        results['perf'] = dict()
+                    try:
+                        results['perf']['time'] = float(match.group(1).replace(',', '.'))
+                        results['perf'].pop('time_variance', None)
+                        if match.group(3) is not None:
+                            results['perf']['time_variance'] = float(match.group(3).replace(',', '.'))
+                        elif match.group(2) is not None:
+                            results['perf']['time_variance'] = 100 * float(match.group(2).replace(',', '.')) / results['perf']['time']
+                    except:
+                        if not results['perf']:
+                            results.pop('perf', None)
+                    continue
+
+    return results
+
+def _parse_vtm_lines(lines, use_perf):
+    """Parses the lines of a result file of VTM, whose summary is that of HM
+    with optional extra columns (see _parse_lines).
+
+    Keyword arguments:
+    lines -- Iterable of lines of the file.
+    use_perf -- Boolean parameter to parse the output of perf stat too.
+    """
+    return _parse_lines(lines, use_perf, RE_VTM_RD, RE_VTM_TIME)
+
+def _parse_x265_csv(lines, use_perf):
+    """Parses the summary CSV written by x265 with --csv (at the default log
+    level) and returns a dictionary with the values of its last row, since
+    x265 appends a row per encoding to an existing file: the elapsed time, and
+    the bitrate and psnr of all the slices and of each slice type. The YUV psnr
+    of each slice type is weighted 6:1:1, as x265 does for the global psnr of
+    all the slices. perf values are not available.
 
-    file.close()
+    Keyword arguments:
+    lines -- Iterable of lines of the file.
+    use_perf -- Ignored, since the file only contains the output of x265.
+    """
+    header = None
+    row = None
+    for fields in csv.reader(lines, skipinitialspace=True):
+        # Rows may end with a separator.
+        while fields and not fields[-1].strip():
+            fields.pop()
+        if not fields:
+            continue
+        if fields[0] == 'Command':
+            header = [field.strip() for field in fields]
+        elif header is not None:
+            row = fields
+
+    results = dict()
+    if row is None:
+        return results
+
+    # The command line is not quoted, so any commas in it add fields at the
+    # start of the row.
+    offset = len(row) - len(header)
+    columns = {name: index + offset for index, name in enumerate(header)
+               if index > 0}
+
+    def value(column):
+        try:
+            return float(row[columns[column]])
+        except (KeyError, IndexError, ValueError):
+            return None
+
+    time = value(X265_COLUMNS['time'])
+    if time is not None:
+        results['time'] = time
+
+    rd = dict()
+    values = {field: value(column) for field, column in X265_COLUMNS.items()
+              if field != 'time'}
+    if None not in values.values():
+        rd['a'] = values
+
+    for prefix, slice_type in X265_SLICE_TYPES.items():
+        values = {field: value(column.format(prefix))
+                  for field, column in X265_SLICE_COLUMNS.items()}
+        if None in values.values() or not values.pop('count'):
+            continue
+        values['yuv_psnr'] = (6 * values['y_psnr'] + values['u_psnr']
+                              + values['v_psnr']) / 8
+        rd[slice_type] = values
+
+    if rd:
+        results['rd'] = rd
 
     return results
 
-def parse_dir(path, pattern, use_perf):
-    """Parses the result files contained in a directory and returns a dictionary
-    with the values of the summary (encoding time, and bitrate and psnr per
-    slice type).
+class LogFormat:
+    """Format of result files, with the function that parses them and how it
+    is recognized and the summary is found."""
+
+    __slots__ = ('name', 'parse_lines', 'signature', 'marker')
+
+    def __init__(self, name, parse_lines, signature=None, marker=None):
+        """Creates a format (see register_format)."""
+        self.name = name
+        self.parse_lines = parse_lines
+        self.signature = signature
+        self.marker = marker
+
+# Formats of result files, by name, in the order in which their signatures are
+# checked (see register_format).
+FORMATS = dict()
+
+def register_format(name, parse_lines, signature=None, marker=None):
+    """Registers a format of result files, so that files whose first bytes
+    match its signature are parsed with its function. Formats registered later
+    replace earlier ones with the same name.
+
+    Keyword arguments:
+    name -- Name of the format, which is part of the version of the cached
+            results (see format_version).
+    parse_lines -- Function that receives an iterable of lines of a file (from
+            the summary, or all of them) and the use_perf parameter of
+            parse_file, and returns the dictionary of results of the file
+            (with the keys 'rd', 'time' and 'perf', see parse_file). It must
+            be picklable (e.g. a module-level function) to parse files in
+            processes.
+    signature -- Compiled RE of bytes searched in the first SNIFF_SIZE bytes of
+            a file to recognize the format, or None if it is only used when
+            given explicitly (or as DEFAULT_FORMAT).
+    marker -- Bytes at the start of the line that starts the summary, which is
+            looked for at the end of the file (see parse_file), or None to
+            always parse every line.
+    """
+    FORMATS[name] = LogFormat(name, parse_lines, signature, marker)
+
+def format_version(log_format):
+    """Returns the version of the results of a format, under which they are
+    stored in caches.
+
+    Keyword arguments:
+    log_format -- Name of the format.
+    """
+    return '{}/{}'.format(PARSER_VERSION, log_format)
+
+def sniff_bytes(head):
+    """Returns the name of the first registered format whose signature is found
+    in the first bytes of a file, or DEFAULT_FORMAT if none of them is.
+
+    Keyword arguments:
+    head -- First bytes of the (decompressed) file.
+    """
+    for log_format in FORMATS.values():
+        if log_format.signature is not None \
+                and log_format.signature.search(head, 0, SNIFF_SIZE):
+            return log_format.name
+
+    return DEFAULT_FORMAT
+
+def sniff_format(filename):
+    """Returns the name of the format of a result file, recognized by the
+    signature found in its first bytes (see sniff_bytes). The files of a
+    directory are assumed to share their format, so it is only sniffed from
+    one of them.
+
+    Keyword arguments:
+    filename -- Path of the file, which may be compressed.
+    """
+    with hmtools.profile.stage('sniff'):
+        file, _ = hmtools.compression.open_log(filename)
+        with file:
+            head = file.read(SNIFF_SIZE)
+    hmtools.profile.count('formats sniffed')
+
+    return sniff_bytes(head)
+
+register_format('hm', _parse_lines, re.compile(rb'HM software: Encoder'),
+        SUMMARY_MARKER)
+register_format('vtm', _parse_vtm_lines,
+        re.compile(rb'VTM Encoder Version|VVCSoftware'), SUMMARY_MARKER)
+register_format('x265', _parse_x265_csv, re.compile(rb'^Command, ?Date/Time,'))
+
+def _frame_array(matches):
+    """Returns a per-picture array built from the groups of RE_FRAME found in a
+    block of text, converting each column at once.
+
+    Keyword arguments:
+    matches -- List of tuples returned by RE_FRAME.findall().
+    """
+    columns = list(zip(*matches))
+    frames = numpy.empty(len(matches), dtype=FRAME_DTYPE)
+
+    for name, column in zip(FRAME_DTYPE.names, columns):
+        dtype = FRAME_DTYPE[name]
+        if name == 'slice_type':
+            frames[name] = column
+        elif name == 'time':
+            frames[name] = numpy.fromiter((float(value) if value else numpy.nan
+                    for value in column), dtype, len(column))
+        else:
+            convert = int if dtype.kind == 'i' else float
+            frames[name] = numpy.fromiter(map(convert, column), dtype,
+                    len(column))
+
+    return frames
+
+def iter_frames(filename):
+    """Parses the lines that a result file contains for each encoded picture,
+    and yields them in blocks as arrays of type FRAME_DTYPE (POC, temporal id,
+    slice type, QP, bits, Y/U/V PSNR and encoding time, which is NaN when it is
+    not reported). Only one block of the file is kept in memory at a time.
+
+    Keyword arguments:
+    filename -- Path of the file to parse (it may be compressed, see
+            parse_file).
+    """
+    file, _ = hmtools.compression.open_log(filename)
+
+    with io.TextIOWrapper(file) as file:
+        remainder = ''
+        while True:
+            block = file.read(FRAME_BLOCK_SIZE)
+            if not block:
+                break
+
+            # The last line of the block may be incomplete, so it is parsed
+            # together with the next block. If the block contains no line
+            # break, it is all carried forward.
+            text = remainder + block
+            end = text.rfind('\n', len(remainder)) + 1
+            text, remainder = text[:end], text[end:]
+
+            matches = RE_FRAME.findall(text)
+            if matches:
+                yield _frame_array(matches)
+
+        matches = RE_FRAME.findall(remainder)
+        if matches:
+            yield _frame_array(matches)
+
+def parse_frames(filename):
+    """Parses the lines that a result file contains for each encoded picture,
+    and returns them as an array of type FRAME_DTYPE (see iter_frames).
+
+    Keyword arguments:
+    filename -- Path of the file to parse.
+    """
+    frames = numpy.empty(1024, dtype=FRAME_DTYPE)
+    count = 0
+
+    for block in iter_frames(filename):
+        if count + len(block) > len(frames):
+            frames.resize(max(2 * len(frames), count + len(block)),
+                    refcheck=False)
+        frames[count:count + len(block)] = block
+        count += len(block)
+
+    frames.resize(count, refcheck=False)
+
+    return frames
+
+def summarize_frames(frames, frame_rate, field='tid'):
+    """Groups the pictures returned by parse_frames by the value of one of
+    their fields (e.g. the temporal id), and returns a structured array with
+    one row per group with the value of the field, the number of pictures, the
+    bitrate (in kbps, as HM reports it), the average Y/U/V PSNR and the total
+    encoding time.
+
+    Keyword arguments:
+    frames -- Array of type FRAME_DTYPE.
+    frame_rate -- Frame rate of the sequence.
+    field -- Name of the field used to group the pictures.
+    """
+    values, groups, counts = numpy.unique(frames[field], return_inverse=True,
+            return_counts=True)
+
+    summary = numpy.empty(len(values), dtype=[(field, FRAME_DTYPE[field]),
+            ('frames', 'i8'), ('bitrate', 'f8'), ('y_psnr', 'f8'),
+            ('u_psnr', 'f8'), ('v_psnr', 'f8'), ('time', 'f8')])
+
+    summary[field] = values
+    summary['frames'] = counts
+    summary['bitrate'] = numpy.bincount(groups, frames['bits']) * frame_rate \
+                         / counts / 1000
+    for name in ('y_psnr', 'u_psnr', 'v_psnr'):
+        summary[name] = numpy.bincount(groups, frames[name]) / counts
+    summary['time'] = numpy.bincount(groups, frames['time'])
+
+    return summary
+
+def _map_files(function, files, workers, use_threads):
+    """Applies a function to a list of files, possibly in parallel, and yields
+    the return values in the same order as the files.
+
+    Keyword arguments:
+    function -- Function to apply. It must be picklable when using processes.
+    files -- List of paths of the files. It may be any iterable, in which case
+            the files are parsed while it is being consumed.
+    workers -- Number of concurrent workers (0 means one per CPU).
+    use_threads -- Boolean parameter to use threads instead of processes.
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
+    if workers == 1 or (hasattr(files, '__len__') and len(files) <= 1):
+        yield from map(function, files)
+        return
+
+    # Worker processes record their own profile of each call, which is merged
+    # into that of this process (threads record it directly).
+    profile = hmtools.profile.active
+    if profile is not None and not use_threads:
+        function = functools.partial(hmtools.profile.collect, function)
+
+    if use_threads:
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+
+    with executor:
+        if hasattr(files, '__len__'):
+            chunksize = max(1, len(files) // (4 * workers))
+        else:
+            chunksize = 1 if use_threads else PROCESS_CHUNK_SIZE
+        if profile is None or use_threads:
+            yield from executor.map(function, files, chunksize=chunksize)
+            return
+        for value, data in executor.map(function, files, chunksize=chunksize):
+            profile.merge(data)
+            yield value
+
+def _pattern_depth(pattern):
+    """Returns the number of levels of subdirectories that the files matched by
+    a pattern may be in: 0 if it only contains a filename, the number of path
+    separators otherwise, or None if it contains the recursive wildcard **.
+
+    Keyword arguments:
+    pattern -- Pattern of the filename used to determine the sequence name and
+            the identifier.
+    """
+    if '**' in pattern:
+        return None
+
+    return pattern.replace('/n', '').replace('/p', '').count('/')
+
+def _compile_pattern(pattern):
+    """Returns the RE that matches the filenames of a pattern, with the groups
+    'sequence' and 'sequence_id' in place of the /n and /p tags. Patterns with
+    path separators are matched against paths relative to the directory, in
+    which case the wildcard * and the /n tag do not match a separator, and **
+    matches any number of subdirectories.
+
+    Keyword arguments:
+    pattern -- Pattern of the filename used to determine the sequence name and
+            the identifier.
+    """
+    SUBDIRECTORIES = '(?:[^/]+/)*'
+
+    if _pattern_depth(pattern) == 0:
+        replacements = {'*': '.*', '/n': '(?P<sequence>.+)'}
+    else:
+        replacements = {'**/': SUBDIRECTORIES, '**': SUBDIRECTORIES,
+                '*': '[^/]*', '/n': '(?P<sequence>[^/]+)'}
+    replacements['/p'] = '(?P<sequence_id>\\d+)'
+
+    return re.compile(RE_PATTERN_TOKEN.sub(
+            lambda match: replacements.get(match.group(0), match.group(0)),
+            pattern))
+
+def _pattern_affixes(pattern):
+    """Returns the literal prefix and suffix of a pattern, i.e. the text that
+    any matching filename must contain before the first and after the last
+    special character or tag (or empty strings if they can not be determined).
+
+    Keyword arguments:
+    pattern -- Pattern of the filename used to determine the sequence name and
+            the identifier.
+    """
+    if '|' in pattern or '(?' in pattern:
+        return '', ''
+
+    body = pattern[1:] if pattern.startswith('^') else pattern
+    if body.endswith('$') and not body.endswith('\\$'):
+        body = body[:-1]
+
+    end = 0
+    while end < len(body) and body[end] not in PATTERN_SPECIAL_CHARACTERS:
+        end += 1
+    prefix = body[:end]
+    # A quantifier may make the last character optional.
+    if end < len(body) and body[end] in '*?{':
+        prefix = prefix[:-1]
+
+    start = len(body)
+    while start > 0 and body[start - 1] not in PATTERN_SPECIAL_CHARACTERS:
+        start -= 1
+    suffix = body[start:]
+    # The first character may be part of an escape sequence.
+    if start > 0 and body[start - 1] == '\\':
+        suffix = suffix[1:]
+
+    return prefix, suffix
+
+def _filename_matcher(pattern):
+    """Returns a function that receives the path of a result file relative to
+    its directory (with / as separator) and returns its (sequence, sequence_id)
+    tuple, or None if it does not match a pattern. Compressed files are matched
+    by their name without the compression suffix, and only the last component
+    of the path is matched if the pattern has no path separators. The RE is
+    only tried on the names that contain the literal prefix and suffix of the
+    pattern.
+
+    Keyword arguments:
+    pattern -- Pattern of the filename used to determine the sequence name and
+            the identifier.
+    """
+    re_filename = _compile_pattern(pattern)
+    use_paths = _pattern_depth(pattern) != 0
+    prefix, suffix = _pattern_affixes(pattern)
+
+    def match_filename(filename):
+        if not use_paths:
+            filename = filename.rsplit('/', 1)[-1]
+        filename = hmtools.compression.logical_name(filename)
+
+        if prefix not in filename or suffix not in filename:
+            return None
+
+        match = re_filename.search(filename)
+        if not match:
+            return None
+
+        return match.group('sequence'), match.group('sequence_id')
+
+    return match_filename
+
+def _scan_dir(path, relative_path, depth, match_filename):
+    """Yields a tuple (file, sequence, sequence_id) per result file of a
+    directory and, up to some depth, of its subdirectories (see discover).
+
+    Keyword arguments:
+    path -- Path of the directory.
+    relative_path -- Path of the directory relative to the one being
+            discovered, ending with a separator (or empty).
+    depth -- Number of levels of subdirectories to descend, or None.
+    match_filename -- Function returned by _filename_matcher.
+    """
+    subdirectories = list()
+
+    hmtools.profile.count('directories listed')
+    with os.scandir(path) as entries:
+        for entry in entries:
+            # The type of the entries is usually known from the listing, so
+            # these checks do not need a call to stat.
+            if entry.is_file():
+                key = match_filename(relative_path + entry.name)
+                if key is not None:
+                    yield entry.path, key[0], key[1]
+            elif depth != 0 and entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry)
+
+    for entry in subdirectories:
+        yield from _scan_dir(entry.path, relative_path + entry.name + '/',
+                None if depth is None else depth - 1, match_filename)
+
+def discover(path, pattern):
+    """Finds the result files of a directory whose name matches a pattern, and
+    yields a tuple (file, sequence, sequence_id) per file as soon as it is
+    found. The pattern may contain path separators to match files in
+    subdirectories (e.g. '/n/RA_QP/p.out'), and the recursive wildcard ** to
+    match any number of them (e.g. '**/RA_QP/p_/n.out').
 
     Keyword arguments:
     path -- Path of the directory.
+    pattern -- Pattern of the filename used to determine the sequence name and
+            the identifier.
+    """
+    files = _scan_dir(path, '', _pattern_depth(pattern),
+            _filename_matcher(pattern))
+
+    return hmtools.profile.counted('files discovered',
+            hmtools.profile.timed('discovery', files))
+
+def _iter_archive(path, pattern, use_perf, workers, use_threads, cache,
+        tail_first):
+    """Parses the result files contained in a tar or zip archive and yields a
+    tuple (file, sequence, sequence_id, results) per member, where file is the
+    path that refers to the member (see hmtools.archive.member_path), in the
+    order of the archive. Tar archives are read in a single sequential pass,
+    and the members of zip archives may be decompressed and parsed
+    concurrently. The format of the members is sniffed from the first one.
+    Cached results are valid while the archive is not modified.
+
+    Keyword arguments:
+    path -- Path of the archive.
     pattern -- Pattern of the filename used to determine the sequence name and
             the identifier.
     use_perf -- Boolean parameter to use perf timing values instead of the ones
             reported in the result files.
+    workers -- Number of zip members parsed concurrently (see iter_dirs).
+    use_threads -- Boolean parameter to parse the members in a pool of threads
+            instead of a pool of processes.
+    cache -- Optional hmtools.cache.ParseCache object.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            members before scanning them completely (see parse_file).
     """
-    SEQUENCE = '(?P<sequence>.+)'
-    SEQUENCE_ID = '(?P<sequence_id>\d+)'
+    match_filename = _filename_matcher(pattern)
+    stat = os.stat(path) if cache is not None else None
+    log_format = None
 
-    results = dict()
+    def cached(name):
+        if cache is None:
+            return None
+        file_result = cache.get(hmtools.archive.member_path(path, name), stat,
+                use_perf, format_version(log_format))
+        if file_result is not None:
+            hmtools.profile.count('cache hits')
+        return file_result
 
-    re_filename = re.compile(pattern.replace('*', '.*')
-            .replace('/n', SEQUENCE)
-            .replace('/p', SEQUENCE_ID))
+    def store(name, file_result):
+        if cache is not None:
+            cache.put(hmtools.archive.member_path(path, name), stat, use_perf,
+                    format_version(log_format), file_result)
 
-    for filename in os.listdir(path):
-        file = os.path.join(path, filename)
+    if hmtools.archive.is_zip(path):
+        names = list()
+        keys = list()
+        for name in hmtools.archive.zip_names(path):
+            key = match_filename(posixpath.normpath(name))
+            if key is not None:
+                names.append(name)
+                keys.append(key)
 
-        if not os.path.isfile(file):
-            continue
+        if names:
+            with hmtools.profile.stage('sniff'):
+                log_format = sniff_bytes(hmtools.compression.decompress_head(
+                        hmtools.archive.read_zip(path, names[0],
+                        keep_open=False), SNIFF_SIZE))
+            hmtools.profile.count('formats sniffed')
 
-        match = re_filename.search(filename)
-        if not match:
-            continue
+        cached_results = [cached(name) for name in names]
+        parsed_results = _map_files(functools.partial(_parse_zip_member,
+                path=path, use_perf=use_perf, tail_first=tail_first,
+                log_format=log_format),
+                [name for name, cached_result in zip(names, cached_results)
+                 if cached_result is None], workers, use_threads)
+
+        for name, (sequence, sequence_id), file_result \
+                in zip(names, keys, cached_results):
+            if file_result is None:
+                file_result = next(parsed_results)
+                store(name, file_result)
+
+            yield hmtools.archive.member_path(path, name), sequence, \
+                  sequence_id, file_result
+    else:
+        for name, file in hmtools.archive.iter_tar(path):
+            key = match_filename(posixpath.normpath(name))
+            if key is None:
+                continue
+
+            # The archive is read sequentially, so the format is sniffed from
+            # the first member that matches the pattern. Only the start of the
+            # member is decompressed, and its data is kept to be parsed.
+            data = None
+            if log_format is None:
+                data = file.read()
+                with hmtools.profile.stage('sniff'):
+                    log_format = sniff_bytes(
+                            hmtools.compression.decompress_head(data,
+                            SNIFF_SIZE))
+                hmtools.profile.count('formats sniffed')
+
+            file_result = cached(name)
+            if file_result is None:
+                with hmtools.profile.parsing(hmtools.archive.member_path(path,
+                        name)):
+                    file_result = parse_bytes(file.read() if data is None
+                            else data, use_perf, tail_first, log_format)
+                store(name, file_result)
+
+            yield hmtools.archive.member_path(path, name), key[0], key[1], \
+                  file_result
+
+def _parse_file_format(file, use_perf, tail_first):
+    """Parses a result file of a known format (see parse_file).
+
+    Keyword arguments:
+    file -- Tuple with the path and the name of the format of the file.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            file, and only scan the whole file if it is not found there.
+    """
+    return parse_file(file[0], use_perf, tail_first, file[1])
+
+def _iter_files(directories, use_perf, workers, use_threads, cache,
+        tail_first, formats=None):
+    """Parses the result files contained in several directories (see
+    iter_dirs), and yields a tuple (index, file, sequence, sequence_id,
+    results) per file, where file is its path. The format sniffed for each
+    directory is stored by path in the optional formats dictionary.
+    """
+    # Entries of the files found so far, which are yielded in order as soon
+    # as their results are available. Each entry is a list with the index of
+    # the directory, the sequence, the identifier, the path and stat of the
+    # file, its results (None while they are pending, or the path of an
+    # archive whose members are parsed when its turn comes) and its format.
+    entries = collections.deque()
+
+    def pending_files():
+        for index, (path, pattern) in enumerate(directories):
+            if hmtools.archive.is_archive(path):
+                entries.append([index, None, None, path, None, ARCHIVE, None])
+                continue
+
+            # The format of the directory is sniffed from its first file.
+            log_format = None
+            for file, sequence, sequence_id in discover(path, pattern):
+                if log_format is None:
+                    log_format = sniff_format(file)
+                    if formats is not None:
+                        formats[path] = log_format
+                stat = None
+                file_result = None
+                if cache is not None:
+                    stat = os.stat(file)
+                    file_result = cache.get(file, stat, use_perf,
+                            format_version(log_format))
+                    if file_result is not None:
+                        hmtools.profile.count('cache hits')
+                entries.append([index, sequence, sequence_id, file, stat,
+                        file_result, log_format])
+                if file_result is None:
+                    yield file, log_format
+
+    def ready_entries():
+        while entries and entries[0][5] is not None:
+            index, sequence, sequence_id, file, _, file_result, _ \
+                    = entries.popleft()
+            if file_result is ARCHIVE:
+                for member in _iter_archive(file, directories[index][1],
+                        use_perf, workers, use_threads, cache, tail_first):
+                    yield (index,) + member
+            else:
+                yield index, file, sequence, sequence_id, file_result
+
+    # The files are parsed while the directories are being discovered. Each
+    # result belongs to the first pending entry, which can be yielded together
+    # with the cached ones that precede it.
+    for file_result in _map_files(functools.partial(_parse_file_format,
+            use_perf=use_perf, tail_first=tail_first), pending_files(),
+            workers, use_threads):
+        yield from ready_entries()
+        entry = entries[0]
+        entry[5] = file_result
+        if cache is not None:
+            cache.put(entry[3], entry[4], use_perf, format_version(entry[6]),
+                    file_result)
+        yield from ready_entries()
+
+    yield from ready_entries()
+
+    if cache is not None:
+        cache.commit()
+
+def iter_dirs(directories, use_perf, workers=1, use_threads=False, cache=None,
+        tail_first=True, paths=False):
+    """Parses the result files contained in several directories, sharing the
+    same pool of workers, and yields a tuple (index, sequence, sequence_id,
+    results) per file, where index is the position of its directory in the
+    list and results is the dictionary returned by parse_file. Files are
+    yielded in the order of the directories, and then of their listing. They
+    are parsed while the directories are still being discovered (see
+    discover). The format of the files of each directory (see FORMATS) is
+    sniffed from the first one, so directories of different encoders (e.g. HM
+    and VTM logs, or x265 CSV files) may be compared.
+
+    Keyword arguments:
+    directories -- List of (path, pattern) tuples, with the path of each
+            directory (or tar or zip archive, see iter_dir) and the pattern
+            of the filename used to determine the sequence name and the
+            identifier.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    workers -- Number of files parsed concurrently. A value of 1 parses them
+            sequentially, and 0 uses as many workers as CPUs are available.
+    use_threads -- Boolean parameter to parse the files in a pool of threads
+            (suitable when reading is I/O-bound, e.g. network file systems)
+            instead of a pool of processes (suitable when it is CPU-bound).
+    cache -- Optional hmtools.cache.ParseCache object. Files with a valid entry
+            in the cache are not parsed, and the rest are stored in it.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            files before scanning them completely (see parse_file).
+    paths -- Boolean parameter to also yield the path of each file (that of
+            its archive followed by the member name for archives), in tuples
+            (index, file, sequence, sequence_id, results).
+    """
+    for index, file, sequence, sequence_id, file_result in _iter_files(
+            directories, use_perf, workers, use_threads, cache, tail_first):
+        if paths:
+            yield index, file, sequence, sequence_id, file_result
+        else:
+            yield index, sequence, sequence_id, file_result
+
+def group_files(directories):
+    """Finds the result files of several directories and returns a dictionary
+    that maps each sequence to a list of (index, file, sequence_id) tuples with
+    its files, where index is the position of their directory in the list, in
+    the order of the directories and then of their listing. Only the paths are
+    kept, so the dictionary is small even for very large directories.
+
+    Keyword arguments:
+    directories -- List of (path, pattern) tuples, with the path of each
+            directory and the pattern of the filename used to determine the
+            sequence name and the identifier (see iter_dirs). Archives are not
+            supported.
+    """
+    groups = dict()
+
+    for index, (path, pattern) in enumerate(directories):
+        if hmtools.archive.is_archive(path):
+            raise ValueError('{} is an archive, whose files can not be '
+                    'grouped'.format(path))
+        for file, sequence, sequence_id in discover(path, pattern):
+            groups.setdefault(sequence, []).append((index, file, sequence_id))
+
+    return groups
+
+def _parse_files(files, use_perf, tail_first):
+    """Parses several result files, given as (path, format) tuples (see
+    parse_file), and returns a list with their results."""
+    return [parse_file(file, use_perf, tail_first, log_format)
+            for file, log_format in files]
+
+class _Deferred:
+    """Result of a call made when it is requested, with the interface of
+    concurrent.futures.Future used by iter_groups."""
+
+    __slots__ = ('function', 'argument')
+
+    def __init__(self, function, argument):
+        self.function = function
+        self.argument = argument
+
+    def result(self):
+        return self.function(self.argument)
+
+def iter_groups(groups, use_perf, workers=1, use_threads=False, cache=None,
+        tail_first=True):
+    """Parses the result files of several groups (see group_files) one group at
+    a time, in the order of the dictionary, and yields a tuple (key, results)
+    per group as soon as all its files are parsed, where results is a list of
+    (index, sequence_id, results) tuples in the order of its files. Only a
+    bounded number of files (GROUP_WINDOW_SIZE per worker) is parsed or read
+    from the cache ahead of the group being yielded, with a task per group,
+    so that memory depends on the size of the largest group rather than on
+    the number of files.
+
+    Keyword arguments:
+    groups -- Dictionary that maps each key (e.g. a sequence) to a list of
+            (index, file, sequence_id) tuples.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    workers -- Number of files parsed concurrently (see iter_dirs).
+    use_threads -- Boolean parameter to parse the files in a pool of threads
+            instead of a pool of processes.
+    cache -- Optional hmtools.cache.ParseCache object.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            files before scanning them completely (see parse_file).
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
+    # The files of each group are parsed by a single call, which reduces the
+    # cost of sending them to worker processes.
+    function = functools.partial(_parse_files, use_perf=use_perf,
+            tail_first=tail_first)
+
+    # Worker processes record their own profile of each call, which is merged
+    # into that of this process (threads record it directly).
+    profile = hmtools.profile.active
+    collect = profile is not None and workers > 1 and not use_threads
+    if collect:
+        function = functools.partial(hmtools.profile.collect, function)
+
+    with contextlib.ExitStack() as stack:
+        if workers == 1:
+            submit = _Deferred
+        elif use_threads:
+            submit = stack.enter_context(
+                    concurrent.futures.ThreadPoolExecutor(workers)).submit
+        else:
+            submit = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(workers)).submit
+
+        # Groups prepared ahead of the one being yielded, as tuples with the
+        # key, the list of entries of its files (the index of the directory,
+        # the identifier, the path and stat of the file, its results, or None
+        # while they are pending, and its format), and the future that
+        # provides the results of the pending files (or None).
+        prepared = collections.deque()
+        prepared_files = 0
+        items = iter(groups.items())
+        window = workers * GROUP_WINDOW_SIZE
+
+        # Format of each directory, sniffed from the first of its files.
+        formats = dict()
+
+        while True:
+            for key, files in items:
+                entries = list()
+                for index, file, sequence_id in files:
+                    log_format = formats.get(index)
+                    if log_format is None:
+                        log_format = formats[index] = sniff_format(file)
+                    stat = None
+                    file_result = None
+                    if cache is not None:
+                        stat = os.stat(file)
+                        file_result = cache.get(file, stat, use_perf,
+                                format_version(log_format))
+                        if file_result is not None:
+                            hmtools.profile.count('cache hits')
+                    entries.append([index, sequence_id, file, stat,
+                            file_result, log_format])
+                pending = [(entry[2], entry[5]) for entry in entries
+                           if entry[4] is None]
+                prepared.append((key, entries, submit(function, pending)
+                                 if pending else None))
+                prepared_files += len(entries)
+                if prepared_files >= window:
+                    break
+
+            if not prepared:
+                break
+
+            key, entries, future = prepared.popleft()
+            prepared_files -= len(entries)
 
-        sequence = match.group('sequence')
-        sequence_id = match.group('sequence_id')
+            if future is not None:
+                parsed_results = future.result()
+                if collect:
+                    parsed_results, data = parsed_results
+                    profile.merge(data)
+                parsed_results = iter(parsed_results)
+                for entry in entries:
+                    if entry[4] is None:
+                        entry[4] = next(parsed_results)
+                        if cache is not None:
+                            cache.put(entry[2], entry[3], use_perf,
+                                    format_version(entry[5]), entry[4])
 
+            yield key, [(index, sequence_id, file_result) for index,
+                        sequence_id, _, _, file_result, _ in entries]
+
+    if cache is not None:
+        cache.commit()
+
+def iter_dir(path, pattern, use_perf, workers=1, use_threads=False,
+        cache=None, tail_first=True):
+    """Parses the result files contained in a directory and yields a tuple
+    (sequence, sequence_id, results) per file, in the order of the listing,
+    where results is the dictionary returned by parse_file. The path may also
+    be that of a tar (optionally compressed) or zip archive, whose members are
+    matched by the last component of their name and parsed without extracting
+    them: tar archives in a single sequential pass, and zip archives using the
+    workers.
+
+    Keyword arguments:
+    path -- Path of the directory, or of a tar or zip archive.
+    pattern -- Pattern of the filename used to determine the sequence name and
+            the identifier. Compressed files are matched by their name without
+            the compression suffix (see hmtools.compression).
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    workers -- Number of files parsed concurrently. A value of 1 parses them
+            sequentially, and 0 uses as many workers as CPUs are available.
+    use_threads -- Boolean parameter to parse the files in a pool of threads
+            (suitable when reading is I/O-bound, e.g. network file systems)
+            instead of a pool of processes (suitable when it is CPU-bound).
+    cache -- Optional hmtools.cache.ParseCache object. Files with a valid entry
+            in the cache are not parsed, and the rest are stored in it.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            files before scanning them completely (see parse_file).
+    """
+    for _, sequence, sequence_id, file_result in iter_dirs([(path, pattern)],
+            use_perf, workers, use_threads, cache, tail_first):
+        yield sequence, sequence_id, file_result
+
+def parse_dir(path, pattern, use_perf, workers=1, use_threads=False,
+        cache=None, tail_first=True, keep_repetitions=False, formats=None):
+    """Parses the result files contained in a directory and returns a dictionary
+    with the values of the summary (encoding time, and bitrate and psnr per
+    slice type).
+
+    Keyword arguments:
+    path -- Path of the directory, or of a tar or zip archive.
+    pattern -- Pattern of the filename used to determine the sequence name and
+            the identifier. Compressed files are matched by their name without
+            the compression suffix (see hmtools.compression).
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    workers -- Number of files parsed concurrently. A value of 1 parses them
+            sequentially, and 0 uses as many workers as CPUs are available.
+    use_threads -- Boolean parameter to parse the files in a pool of threads
+            (suitable when reading is I/O-bound, e.g. network file systems)
+            instead of a pool of processes (suitable when it is CPU-bound).
+    cache -- Optional hmtools.cache.ParseCache object. Files with a valid entry
+            in the cache are not parsed, and the rest are stored in it.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            files before scanning them completely (see parse_file).
+    keep_repetitions -- Boolean parameter to keep the results of all the files
+            that share their sequence and identifier (e.g. repeated runs of
+            the same encoding), in which case each identifier maps to a
+            dictionary of results per file path, in the order of the listing.
+            Otherwise, the last file is kept.
+    formats -- Optional dictionary in which the format of the files of the
+            directory (see FORMATS) is stored by path, to be given to
+            update_dir.
+    """
+    results = dict()
+
+    # The results are collected in the order of the listing, so that files
+    # mapped to the same sequence and identifier overwrite each other in the
+    # same way regardless of the number of workers.
+    for _, file, sequence, sequence_id, file_result in _iter_files(
+            [(path, pattern)], use_perf, workers, use_threads, cache,
+            tail_first, formats):
         if sequence not in results:
             results[sequence] = dict()
 
-        results[sequence][sequence_id] = parse_file(file, use_perf)
+        if keep_repetitions:
+            if sequence_id not in results[sequence]:
+                results[sequence][sequence_id] = dict()
+            results[sequence][sequence_id][file] = file_result
+        else:
+            results[sequence][sequence_id] = file_result
 
     return results
+
+def update_dir(results, path, pattern, filenames, use_perf, cache=None,
+        tail_first=True, keep_repetitions=False, formats=None):
+    """Updates the results of a directory previously returned by parse_dir
+    with the changes of some of its files, which are parsed again (or removed
+    from the results, if they no longer exist). Returns the set of sequences
+    whose results have changed.
+
+    Keyword arguments:
+    results -- Dictionary returned by parse_dir, which is modified in place.
+    path -- Path of the directory.
+    pattern -- Pattern of the filename used to determine the sequence name and
+            the identifier. Compressed files are matched by their name without
+            the compression suffix (see hmtools.compression).
+    filenames -- Names of the files that have changed.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    cache -- Optional hmtools.cache.ParseCache object, which is updated with
+            the results of the files.
+    tail_first -- Boolean parameter to look for the summary at the end of the
+            files before scanning them completely (see parse_file).
+    keep_repetitions -- Boolean parameter that must match the one given to
+            parse_dir, in which case the results are updated per file path.
+    formats -- Optional dictionary with the format of the files of each
+            directory by path, as filled by parse_dir. The format of a
+            directory that is not in it is sniffed from its first changed
+            file, and stored in it.
+    """
+    match_filename = _filename_matcher(pattern)
+
+    sequences = set()
+
+    log_format = formats.get(path) if formats is not None else None
+
+    for filename in filenames:
+        key = match_filename(filename)
+        if key is None:
+            continue
+
+        file = os.path.join(path, filename)
+        sequence, sequence_id = key
+
+        if os.path.isfile(file):
+            stat = os.stat(file)
+            if log_format is None:
+                log_format = sniff_format(file)
+                if formats is not None:
+                    formats[path] = log_format
+            file_result = parse_file(file, use_perf, tail_first, log_format)
+            if cache is not None:
+                cache.put(file, stat, use_perf, format_version(log_format),
+                        file_result)
+            if sequence not in results:
+                results[sequence] = dict()
+            if keep_repetitions:
+                if sequence_id not in results[sequence]:
+                    results[sequence][sequence_id] = dict()
+                results[sequence][sequence_id][file] = file_result
+            else:
+                results[sequence][sequence_id] = file_result
+        elif keep_repetitions and file in results.get(sequence,
+                dict()).get(sequence_id, dict()):
+            del results[sequence][sequence_id][file]
+            if not results[sequence][sequence_id]:
+                del results[sequence][sequence_id]
+            if not results[sequence]:
+                del results[sequence]
+        elif not keep_repetitions and sequence_id in results.get(sequence,
+                dict()):
+            del results[sequence][sequence_id]
+            if not results[sequence]:
+                del results[sequence]
+        else:
+            continue
+
+        sequences.add(sequence)
+
+    if cache is not None:
+        cache.commit()
+
+    return sequences
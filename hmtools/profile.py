@@ -0,0 +1,275 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import contextlib
+import heapq
+import threading
+import time
+
+# Profile being recorded, or None if profiling is disabled. The instrumented
+# code only checks this variable (through the functions of this module), so
+# that the cost of the instrumentation is negligible when it is disabled.
+active = None
+
+# Context manager returned by stage and parsing when profiling is disabled.
+_NULL_CONTEXT = contextlib.nullcontext()
+
+class Profile:
+    """Timers and counters of the stages of a comparison, and the slowest files
+    parsed. It may be updated from several threads.
+    """
+
+    def __init__(self, slowest=10):
+        """Creates an empty profile.
+
+        Keyword arguments:
+        slowest -- Number of slowest files to keep.
+        """
+        self.stages = dict()
+        self.counters = dict()
+        self.slowest = slowest
+        self._files = list()
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.wall_time = None
+
+    def add_time(self, name, seconds, calls=1):
+        """Adds time to a stage.
+
+        Keyword arguments:
+        name -- Name of the stage.
+        seconds -- Time spent, in seconds.
+        calls -- Number of calls to add to the stage.
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, [0.0, 0])
+            stage[0] += seconds
+            stage[1] += calls
+
+    def count(self, name, value=1):
+        """Adds a value to a counter.
+
+        Keyword arguments:
+        name -- Name of the counter.
+        value -- Value to add.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_file(self, file, seconds):
+        """Records the time spent parsing a file, which is kept if it is among
+        the slowest ones.
+
+        Keyword arguments:
+        file -- Path of the file.
+        seconds -- Time spent, in seconds.
+        """
+        with self._lock:
+            if len(self._files) < self.slowest:
+                heapq.heappush(self._files, (seconds, file))
+            elif self._files and seconds > self._files[0][0]:
+                heapq.heapreplace(self._files, (seconds, file))
+
+    def slowest_files(self):
+        """Returns a list of (file, seconds) tuples with the slowest files, in
+        decreasing order of time.
+        """
+        with self._lock:
+            return [(file, seconds) for seconds, file
+                    in sorted(self._files, reverse=True)]
+
+    def stop(self):
+        """Records the wall time elapsed since the profile was created."""
+        self.wall_time = time.perf_counter() - self._start
+
+    def merge(self, data):
+        """Adds the timers, counters and slowest files of another profile (e.g.
+        recorded in a worker process) to this one.
+
+        Keyword arguments:
+        data -- Dictionary returned by to_dict of the other profile.
+        """
+        for name, stage in data['stages'].items():
+            self.add_time(name, stage['seconds'], stage['calls'])
+        for name, value in data['counters'].items():
+            self.count(name, value)
+        for file, seconds in data['slowest_files']:
+            self.add_file(file, seconds)
+
+    def to_dict(self):
+        """Returns the profile as a dictionary that can be serialized to JSON,
+        with the keys 'wall_time', 'stages' (seconds and calls per stage),
+        'counters' and 'slowest_files' (list of (file, seconds) tuples).
+        """
+        with self._lock:
+            stages = {name: {'seconds': seconds, 'calls': calls}
+                      for name, (seconds, calls) in self.stages.items()}
+            counters = dict(self.counters)
+
+        return {'wall_time': self.wall_time, 'stages': stages,
+                'counters': counters, 'slowest_files': self.slowest_files()}
+
+class _Timer:
+    """Context manager that adds the time spent in its block to a stage."""
+
+    __slots__ = ('profile', 'name', 'file', 'start')
+
+    def __init__(self, profile, name, file=None):
+        self.profile = profile
+        self.name = name
+        self.file = file
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exception):
+        seconds = time.perf_counter() - self.start
+        self.profile.add_time(self.name, seconds)
+        if self.file is not None:
+            self.profile.add_file(self.file, seconds)
+
+def start(slowest=10):
+    """Starts recording a new profile and returns it.
+
+    Keyword arguments:
+    slowest -- Number of slowest files to keep.
+    """
+    global active
+    active = Profile(slowest)
+
+    return active
+
+def stop():
+    """Stops recording the active profile and returns it (or None if profiling
+    was not enabled).
+    """
+    global active
+    profile, active = active, None
+    if profile is not None:
+        profile.stop()
+
+    return profile
+
+def stage(name):
+    """Returns a context manager that adds the time spent in its block to a
+    stage of the active profile, or does nothing if profiling is disabled.
+
+    Keyword arguments:
+    name -- Name of the stage.
+    """
+    if active is None:
+        return _NULL_CONTEXT
+
+    return _Timer(active, name)
+
+def parsing(file):
+    """Returns a context manager that records the time spent parsing a file in
+    the 'parse' stage of the active profile, counts it and keeps it if it is
+    among the slowest files, or does nothing if profiling is disabled.
+
+    Keyword arguments:
+    file -- Path of the file.
+    """
+    if active is None:
+        return _NULL_CONTEXT
+
+    active.count('files parsed')
+
+    return _Timer(active, 'parse', file)
+
+def count(name, value=1):
+    """Adds a value to a counter of the active profile, if any.
+
+    Keyword arguments:
+    name -- Name of the counter.
+    value -- Value to add.
+    """
+    if active is not None:
+        active.count(name, value)
+
+def counted(name, iterable):
+    """Returns an iterable that yields the items of another one and counts them
+    in a counter of the active profile, or the iterable itself if profiling is
+    disabled.
+
+    Keyword arguments:
+    name -- Name of the counter.
+    iterable -- Iterable to count.
+    """
+    if active is None:
+        return iterable
+
+    return _counted(active, name, iterable)
+
+def _counted(profile, name, iterable):
+    """Yields the items of an iterable and counts them (see counted)."""
+    items = 0
+    try:
+        for item in iterable:
+            items += 1
+            yield item
+    finally:
+        profile.count(name, items)
+
+def timed(name, iterable):
+    """Returns an iterable that yields the items of another one and adds the
+    time spent producing them to a stage of the active profile (but not the
+    time spent by the consumer between items), or the iterable itself if
+    profiling is disabled.
+
+    Keyword arguments:
+    name -- Name of the stage.
+    iterable -- Iterable to time.
+    """
+    if active is None:
+        return iterable
+
+    return _timed(active, name, iterable)
+
+def _timed(profile, name, iterable):
+    """Yields the items of an iterable and times them (see timed)."""
+    iterator = iter(iterable)
+    seconds = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            finally:
+                seconds += time.perf_counter() - start
+            yield item
+    except StopIteration:
+        return
+    finally:
+        profile.add_time(name, seconds)
+
+def collect(function, *args, **kwargs):
+    """Calls a function with a new active profile and returns a tuple with its
+    return value and the dictionary of the profile (see Profile.to_dict). It
+    is used to gather the profile of the calls made in worker processes,
+    which is then merged into that of the main process.
+
+    Keyword arguments:
+    function -- Function to call.
+    args -- Positional arguments of the function.
+    kwargs -- Keyword arguments of the function.
+    """
+    global active
+    previous = active
+    active = Profile()
+    try:
+        return function(*args, **kwargs), active.to_dict()
+    finally:
+        active = previous
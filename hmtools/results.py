@@ -0,0 +1,429 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import hmtools.stats
+import numpy
+
+# One row per result file. Sequences and identifiers are stored as indices of
+# the lists of names of the container, and missing values as NaN.
+FILE_DTYPE = numpy.dtype([('sequence', 'i4'), ('sequence_id', 'i4'),
+        ('time', 'f8'), ('perf_time', 'f8'), ('perf_frequency', 'f8'),
+        ('perf_runs', 'f8'), ('perf_time_variance', 'f8')])
+
+# One row per slice type of the summary of each result file.
+RD_DTYPE = numpy.dtype([('file', 'i4'), ('slice_type', 'U1'),
+        ('bitrate', 'f8'), ('y_psnr', 'f8'), ('u_psnr', 'f8'),
+        ('v_psnr', 'f8'), ('yuv_psnr', 'f8')])
+
+RD_FIELDS = ('bitrate', 'y_psnr', 'u_psnr', 'v_psnr', 'yuv_psnr')
+
+# One row per perf counter of each result file. Events and units are stored as
+# indices of the lists of names of the container (units as -1 if missing).
+COUNTER_DTYPE = numpy.dtype([('file', 'i4'), ('event', 'i4'),
+        ('value', 'f8'), ('unit', 'i4'), ('variance', 'f8'),
+        ('running', 'f8'), ('metric_value', 'f8'), ('metric_unit', 'i4')])
+
+COUNTER_FIELDS = ('variance', 'running', 'metric_value')
+
+class Results:
+    """Columnar container of the results of a directory, indexed by sequence,
+    sequence identifier and slice type. It holds the same values as the nested
+    dictionaries returned by hmtools.parser.parse_dir, but in NumPy arrays that
+    grow as files are added, so that the memory used per file is small and
+    they can be processed in a vectorized way.
+    """
+
+    __slots__ = ('sequences', 'sequence_ids', 'events', 'units',
+            '_sequence_codes', '_sequence_id_codes', '_event_codes',
+            '_unit_codes', '_files', '_file_count', '_rd', '_rd_count',
+            '_counters', '_counter_count')
+
+    def __init__(self, entries=()):
+        """Creates a container with the results of a set of files.
+
+        Keyword arguments:
+        entries -- Iterable of (sequence, sequence_id, results) tuples, where
+                results is a dictionary returned by hmtools.parser.parse_file
+                (e.g. the values yielded by hmtools.parser.iter_dir).
+        """
+        self.sequences = list()
+        self.sequence_ids = list()
+        self.events = list()
+        self.units = list()
+        self._sequence_codes = dict()
+        self._sequence_id_codes = dict()
+        self._event_codes = dict()
+        self._unit_codes = dict()
+        self._files = numpy.empty(64, dtype=FILE_DTYPE)
+        self._file_count = 0
+        self._rd = numpy.empty(256, dtype=RD_DTYPE)
+        self._rd_count = 0
+        self._counters = numpy.empty(0, dtype=COUNTER_DTYPE)
+        self._counter_count = 0
+
+        for sequence, sequence_id, file_results in entries:
+            self.append(sequence, sequence_id, file_results)
+
+    @classmethod
+    def from_dict(cls, results, repetitions=False):
+        """Creates a container from the dictionary returned by
+        hmtools.parser.parse_dir.
+
+        Keyword arguments:
+        results -- Dictionary of results per sequence and sequence identifier.
+        repetitions -- Boolean parameter stating that the dictionary was
+                returned with keep_repetitions, i.e. that each sequence
+                identifier maps to a dictionary of results per file.
+        """
+        if repetitions:
+            return cls((sequence, sequence_id, file_results)
+                       for sequence, sequence_results in results.items()
+                       for sequence_id, files in sequence_results.items()
+                       for file_results in files.values())
+
+        return cls((sequence, sequence_id, file_results)
+                   for sequence, sequence_results in results.items()
+                   for sequence_id, file_results in sequence_results.items())
+
+    def __len__(self):
+        return self._file_count
+
+    @property
+    def files(self):
+        """Array of type FILE_DTYPE with one row per file."""
+        return self._files[:self._file_count]
+
+    @property
+    def rd(self):
+        """Array of type RD_DTYPE with one row per slice type and file."""
+        return self._rd[:self._rd_count]
+
+    @property
+    def counters(self):
+        """Array of type COUNTER_DTYPE with one row per perf counter and
+        file."""
+        return self._counters[:self._counter_count]
+
+    @staticmethod
+    def _code(name, names, codes):
+        """Returns the index of a name in a list, adding it if needed."""
+        code = codes.get(name)
+        if code is None:
+            code = len(names)
+            codes[name] = code
+            names.append(name)
+
+        return code
+
+    def append(self, sequence, sequence_id, file_results):
+        """Adds the results of a file.
+
+        Keyword arguments:
+        sequence -- Name of the sequence.
+        sequence_id -- Identifier of the file within the sequence.
+        file_results -- Dictionary returned by hmtools.parser.parse_file.
+        """
+        if self._file_count == len(self._files):
+            self._files.resize(2 * len(self._files), refcheck=False)
+
+        perf = file_results.get('perf', dict())
+
+        self._files[self._file_count] = (
+                self._code(sequence, self.sequences, self._sequence_codes),
+                self._code(sequence_id, self.sequence_ids,
+                        self._sequence_id_codes),
+                file_results.get('time', numpy.nan),
+                perf.get('time', numpy.nan),
+                perf.get('frequency', numpy.nan),
+                perf.get('runs', numpy.nan),
+                perf.get('time_variance', numpy.nan))
+
+        for slice_type, values in file_results.get('rd', dict()).items():
+            if self._rd_count == len(self._rd):
+                self._rd.resize(2 * len(self._rd), refcheck=False)
+            self._rd[self._rd_count] = (self._file_count, slice_type) \
+                    + tuple(values[field] for field in RD_FIELDS)
+            self._rd_count += 1
+
+        for event, record in perf.get('counters', dict()).items():
+            if self._counter_count == len(self._counters):
+                self._counters.resize(max(256, 2 * len(self._counters)),
+                        refcheck=False)
+            self._counters[self._counter_count] = (self._file_count,
+                    self._code(event, self.events, self._event_codes),
+                    record['value'],
+                    self._code(record['unit'], self.units, self._unit_codes)
+                    if 'unit' in record else -1) \
+                    + tuple(record.get(field, numpy.nan)
+                            for field in COUNTER_FIELDS) \
+                    + (self._code(record['metric_unit'], self.units,
+                            self._unit_codes)
+                       if 'metric_unit' in record else -1,)
+            self._counter_count += 1
+
+        self._file_count += 1
+
+    def to_dict(self):
+        """Returns the results as the dictionary that hmtools.parser.parse_dir
+        would return, i.e. dict[sequence][sequence_id] with the keys 'rd',
+        'time' and 'perf' when they are available. If several files share
+        their sequence and identifier, the last one is kept.
+        """
+        results = dict()
+        file_results = list()
+
+        for row in self.files.tolist():
+            sequence = self.sequences[row[0]]
+            sequence_id = self.sequence_ids[row[1]]
+
+            entry = dict()
+            if row[2] == row[2]:
+                entry['time'] = row[2]
+            if any(value == value for value in row[3:]):
+                entry['perf'] = dict()
+                if row[5] == row[5]:
+                    entry['perf']['runs'] = int(row[5])
+                if row[4] == row[4]:
+                    entry['perf']['frequency'] = row[4]
+                if row[3] == row[3]:
+                    entry['perf']['time'] = row[3]
+                if row[6] == row[6]:
+                    entry['perf']['time_variance'] = row[6]
+
+            if sequence not in results:
+                results[sequence] = dict()
+            results[sequence][sequence_id] = entry
+            file_results.append(entry)
+
+        for row in self.rd.tolist():
+            entry = file_results[row[0]]
+            if 'rd' not in entry:
+                entry['rd'] = dict()
+            entry['rd'][row[1]] = dict(zip(RD_FIELDS, row[2:]))
+
+        for row in self.counters.tolist():
+            entry = file_results[row[0]]
+            if 'perf' not in entry:
+                entry['perf'] = dict()
+            if 'counters' not in entry['perf']:
+                entry['perf']['counters'] = dict()
+            record = {'value': row[2]}
+            if row[3] >= 0:
+                record['unit'] = self.units[row[3]]
+            for field, value in zip(COUNTER_FIELDS, row[4:7]):
+                if value == value:
+                    record[field] = value
+            if row[7] >= 0:
+                record['metric_unit'] = self.units[row[7]]
+            entry['perf']['counters'][self.events[row[1]]] = record
+
+        return results
+
+    def columns(self):
+        """Returns the values of the files as a dictionary of columns, i.e.
+        arrays with one element per file, in the order in which the files were
+        added: 'sequence' and 'sequence_id', the timing fields of FILE_DTYPE,
+        the RD_FIELDS of the summary row of each slice type, prefixed by the
+        slice type (e.g. 'a_bitrate'), and the value of each perf event. Missing
+        values are NaN.
+        """
+        files = self.files
+
+        columns = dict()
+        columns['sequence'] = numpy.array(self.sequences, dtype=str)[
+                files['sequence']]
+        columns['sequence_id'] = numpy.array(self.sequence_ids, dtype=str)[
+                files['sequence_id']]
+        for field in FILE_DTYPE.names[2:]:
+            columns[field] = files[field].copy()
+
+        for slice_type in sorted(set(self.rd['slice_type'].tolist())):
+            for field in RD_FIELDS:
+                columns['{}_{}'.format(slice_type, field)] = self.rd_values(
+                        field, slice_type)
+
+        for event in self.events:
+            columns[event] = self.counter_values(event)
+
+        return columns
+
+    def sequence_codes(self, sequences):
+        """Returns an array with the index of each of the given sequence names
+        in this container, or -1 for those that it does not contain.
+
+        Keyword arguments:
+        sequences -- List of sequence names.
+        """
+        return numpy.array([self._sequence_codes.get(sequence, -1)
+                            for sequence in sequences], dtype='i4')
+
+    def rd_values(self, field, slice_type='a'):
+        """Returns an array with a value of the summary row of a slice type for
+        each file, or NaN for the files that do not report it.
+
+        Keyword arguments:
+        field -- Name of the field (see RD_FIELDS).
+        slice_type -- Slice type of the summary rows to use.
+        """
+        rd = self.rd[self.rd['slice_type'] == slice_type]
+
+        values = numpy.full(self._file_count, numpy.nan)
+        values[rd['file']] = rd[field]
+
+        return values
+
+    def rd_curves(self, sequences, slice_type='a', psnr='yuv_psnr',
+            average_repetitions=True):
+        """Returns a list with the rate-distortion curve of each of the given
+        sequences, as an array of shape (n_points, 2) of the distinct
+        (bitrate, psnr) points of all its files, in increasing order.
+
+        Keyword arguments:
+        sequences -- List of sequence names.
+        slice_type -- Slice type of the summary rows to use.
+        psnr -- Name of the psnr field to use.
+        average_repetitions -- Boolean parameter to average the points of the
+                files that share their sequence identifier (repetitions).
+                Otherwise, each file is a point of the curve (e.g. several
+                presets per QP, whose convex hull is then taken).
+        """
+        if not average_repetitions:
+            bitrates = self.rd_values('bitrate', slice_type)
+            psnrs = self.rd_values(psnr, slice_type)
+            valid = ~(numpy.isnan(bitrates) | numpy.isnan(psnrs))
+
+            return curves_from_points(self.sequence_codes(sequences),
+                    self.files['sequence'][valid], bitrates[valid],
+                    psnrs[valid])
+
+        point_sequences, _, bitrates = self.grouped_values(
+                self.rd_values('bitrate', slice_type))
+        _, _, psnrs = self.grouped_values(self.rd_values(psnr, slice_type))
+
+        return curves_from_points(self.sequence_codes(sequences),
+                point_sequences, hmtools.stats.aggregate(bitrates),
+                hmtools.stats.aggregate(psnrs))
+
+    def counter_values(self, events):
+        """Returns an array with the value of a perf counter for each file, or
+        NaN for the files that do not report it.
+
+        Keyword arguments:
+        events -- Name of the event, or tuple of alternative names (e.g.
+                ('cycles', 'cpu-cycles')), in order of preference.
+        """
+        if isinstance(events, str):
+            events = (events,)
+
+        values = numpy.full(self._file_count, numpy.nan)
+        counters = self.counters
+
+        for event in reversed(events):
+            code = self._event_codes.get(event)
+            if code is not None:
+                rows = counters[counters['event'] == code]
+                values[rows['file']] = rows['value']
+
+        return values
+
+    def grouped_values(self, values):
+        """Groups the values of the files that share their sequence and
+        identifier (i.e. repetitions), and returns three arrays with the
+        sequence index and the sequence identifier of each group, and a matrix
+        with one row per group containing its values in the order of the
+        files, padded with NaN. Files without a value (NaN) are ignored.
+
+        Keyword arguments:
+        values -- Array with a value per file (NaN if missing).
+        """
+        files = self.files
+        valid = ~numpy.isnan(values)
+        width = max(1, len(self.sequence_ids))
+
+        keys, matrix = hmtools.stats.group_matrix(
+                files['sequence'][valid].astype('i8') * width
+                + files['sequence_id'][valid], values[valid])
+
+        return (keys // width).astype('i4'), (keys % width).astype('i4'), \
+               matrix
+
+    def aggregated_values(self, values, statistic='mean',
+            outlier_threshold=None):
+        """Combines the values of the files that share their sequence and
+        identifier (i.e. repetitions), and returns three arrays with the
+        sequence index, the sequence identifier and the combined value of each
+        group. Files without a value (NaN) are ignored.
+
+        Keyword arguments:
+        values -- Array with a value per file (NaN if missing).
+        statistic -- Name of the statistic used to combine the values (see
+                hmtools.stats.aggregate).
+        outlier_threshold -- Optional threshold to discard outliers before
+                combining the values (see hmtools.stats.reject_outliers).
+        """
+        sequence_codes, sequence_id_codes, matrix = self.grouped_values(values)
+        if outlier_threshold is not None:
+            matrix = hmtools.stats.reject_outliers(matrix, outlier_threshold)
+
+        return sequence_codes, sequence_id_codes, \
+               hmtools.stats.aggregate(matrix, statistic)
+
+def curves_from_points(codes, point_sequences, bitrates, psnrs):
+    """Returns a list with the rate-distortion curve of each of a list of
+    sequences, as an array of shape (n_points, 2) of their distinct
+    (bitrate, psnr) points, in increasing order. If the bitrates and psnrs are
+    matrices with a row per resample of the points, the curves of all the
+    resamples are built at once and returned in a single list, ordered by
+    resample and then by sequence.
+
+    Keyword arguments:
+    codes -- Array with the index of each sequence, or -1 for the sequences
+            without points (see Results.sequence_codes).
+    point_sequences -- Array with the index of the sequence of each point.
+    bitrates -- Array with the bitrate of each point (or matrix with a row per
+            resample).
+    psnrs -- Array with the psnr of each point (or matrix with a row per
+            resample).
+    """
+    codes = numpy.asarray(codes)
+    point_sequences = numpy.asarray(point_sequences, dtype=numpy.int64)
+    bitrates = numpy.atleast_2d(numpy.asarray(bitrates, dtype=float))
+    psnrs = numpy.asarray(psnrs, dtype=float).reshape(bitrates.shape)
+
+    # The points of each resample are told apart by offsetting their sequence
+    # indices, so that all the resamples are grouped together.
+    stride = max(numpy.max(codes, initial=-1), numpy.max(point_sequences, initial=-1)) + 1
+    offsets = numpy.arange(len(bitrates), dtype=numpy.int64)[:, None] * stride
+
+    points = numpy.empty(bitrates.size, dtype=[('sequence', 'i8'),
+            ('bitrate', 'f8'), ('psnr', 'f8')])
+    points['sequence'] = (offsets + point_sequences).ravel()
+    points['bitrate'] = bitrates.ravel()
+    points['psnr'] = psnrs.ravel()
+
+    # Sorting the points by sequence, bitrate and psnr and removing the
+    # duplicated ones groups the points of each sequence together.
+    points = numpy.unique(points)
+
+    keys = (offsets + codes).ravel()
+    starts = numpy.searchsorted(points['sequence'], keys, side='left')
+    ends = numpy.searchsorted(points['sequence'], keys, side='right')
+    missing = numpy.tile(codes < 0, len(bitrates))
+    starts[missing] = 0
+    ends[missing] = 0
+
+    coordinates = numpy.column_stack((points['bitrate'], points['psnr']))
+
+    return [coordinates[start:end] for start, end in zip(starts, ends)]
@@ -0,0 +1,393 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import collections
+import hmtools.bd
+import http.client
+import http.server
+import json
+import math
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+# Maximum number of parsed files kept in memory by default.
+DEFAULT_MAX_ENTRIES = 100000
+
+# Hosts on which the server may listen, since it reads any file it is asked
+# for.
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+class ServerError(Exception):
+    """Error reported by the server in response to a request."""
+
+class MemoryCache:
+    """In-memory cache of parsed result files, with the same interface as
+    hmtools.cache.ParseCache, which keeps the most recently used entries.
+
+    Entries are identified by the path of the file and whether perf values were
+    parsed, and they are only valid while the size and modification time of the
+    file, and the version of the parser, are the same as when they were stored.
+    The cached results are shared, so they must not be modified. It may be used
+    from several threads.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        """Creates an empty cache.
+
+        Keyword arguments:
+        max_entries -- Maximum number of entries, after which the least
+                recently used ones are evicted.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, filename, stat, use_perf, version):
+        """Returns the stored results of a file, or None if there is no valid
+        entry for it.
+
+        Keyword arguments:
+        filename -- Path of the file.
+        stat -- Result of os.stat() on the file.
+        use_perf -- Boolean parameter stating whether perf values are parsed.
+        version -- Version of the parser.
+        """
+        key = (os.path.abspath(filename), bool(use_perf))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != (stat.st_size,
+                    stat.st_mtime_ns, version):
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+    def put(self, filename, stat, use_perf, version, results):
+        """Stores the results of a file.
+
+        Keyword arguments:
+        filename -- Path of the file.
+        stat -- Result of os.stat() on the file before it was parsed.
+        use_perf -- Boolean parameter stating whether perf values are parsed.
+        version -- Version of the parser.
+        results -- Dictionary returned by the parser.
+        """
+        key = (os.path.abspath(filename), bool(use_perf))
+
+        with self._lock:
+            self._entries[key] = ((stat.st_size, stat.st_mtime_ns, version),
+                                  results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def prune(self):
+        """Removes the entries of files that no longer exist."""
+        with self._lock:
+            for key in [key for key in self._entries
+                        if not os.path.exists(key[0])]:
+                del self._entries[key]
+
+    def clear(self):
+        """Removes every entry of the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def commit(self):
+        """Does nothing, since the entries are not persistent."""
+
+    def close(self):
+        """Does nothing, since the entries are not persistent."""
+
+def parse_address(address):
+    """Returns a tuple (family, address) with the socket family and address of
+    the server: a localhost 'host:port' address (TCP), or the path of a Unix
+    socket.
+
+    Keyword arguments:
+    address -- Address of the server.
+    """
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit() and os.sep not in host:
+        host = host.strip('[]')
+        if host not in LOCAL_HOSTS:
+            raise ValueError('the server only listens on local addresses ({})'
+                    .format(', '.join(LOCAL_HOSTS)))
+        return socket.AF_INET6 if ':' in host else socket.AF_INET, \
+               (host, int(port))
+
+    return socket.AF_UNIX, address
+
+def to_json(value):
+    """Returns a copy of a value in which tuples are replaced by lists and
+    non-finite floats by None, so that it can be serialized as strict JSON.
+
+    Keyword arguments:
+    value -- Value to convert (dictionaries, lists, tuples and scalars).
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+
+    return value
+
+def from_json(value):
+    """Returns a copy of a value decoded from JSON in which None is replaced by
+    NaN, reverting the conversion of non-finite floats made by to_json.
+
+    Keyword arguments:
+    value -- Value to convert (dictionaries, lists and scalars).
+    """
+    if value is None:
+        return float('nan')
+    if isinstance(value, dict):
+        return {key: from_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_json(item) for item in value]
+
+    return value
+
+def bdrate_route(payload):
+    """Calculates the BD-rate between two rate-distortion curves, as bd.py
+    does. The payload contains the 'base' and 'test' lists of (bitrate, psnr)
+    points, and optionally 'use_old_bdrate' and 'use_hull' (see
+    hmtools.bd.hull_curves).
+
+    Keyword arguments:
+    payload -- Dictionary with the request.
+    """
+    base = sorted(set(tuple(point) for point in payload['base']))
+    test = sorted(set(tuple(point) for point in payload['test']))
+
+    if payload.get('use_hull', False):
+        base, test = hmtools.bd.hull_curves([base, test])
+
+    if payload.get('use_old_bdrate', False):
+        return {'bdrate': hmtools.bd.bdrate_old(base, test)}
+
+    return {'bdrate': hmtools.bd.bdrate(base, test)}
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Handler of the requests of the server: GET /health returns the status
+    of the server, and POST /<route> calls the function of a route with the
+    decoded JSON body and returns its result as JSON.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # Clients of Unix sockets have no address.
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'local'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _respond(self, status, value):
+        body = json.dumps(to_json(value), allow_nan=False).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._respond(404, {'error': 'unknown path: {}'.format(self.path)})
+            return
+
+        cache = self.server.cache
+        self._respond(200, {'status': 'ok', 'routes': sorted(self.server.routes),
+                            'entries': len(cache), 'hits': cache.hits,
+                            'misses': cache.misses})
+
+    def do_POST(self):
+        route = self.server.routes.get(self.path.strip('/'))
+        if route is None:
+            self._respond(404, {'error': 'unknown path: {}'.format(self.path)})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as error:
+            self._respond(400, {'error': 'invalid request: {}'.format(error)})
+            return
+
+        try:
+            self._respond(200, route(payload))
+        except (KeyError, TypeError, ValueError, OSError) as error:
+            self._respond(400, {'error': '{}: {}'.format(type(error).__name__,
+                    error)})
+        except Exception as error:
+            self._respond(500, {'error': '{}: {}'.format(type(error).__name__,
+                    error)})
+
+class _TCPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+class _TCP6Server(_TCPServer):
+    address_family = socket.AF_INET6
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def create_server(address, routes, cache, verbose=False):
+    """Creates a server that answers requests with JSON on a local address (see
+    parse_address), and returns it. Requests are handled in threads, and
+    routes should use the shared cache to avoid parsing the same files again.
+    The server is started with serve_forever() and stopped with shutdown().
+
+    Keyword arguments:
+    address -- Address of the server.
+    routes -- Dictionary with the function that handles each route, which
+            receives the decoded JSON payload and returns a value that can be
+            serialized to JSON. Errors caused by the request should be raised
+            as KeyError, TypeError, ValueError or OSError.
+    cache -- MemoryCache object shared by the routes, reported by /health.
+    verbose -- Boolean parameter to log every request to the standard error.
+    """
+    family, address = parse_address(address)
+
+    if family == socket.AF_UNIX:
+        # A socket left by a previous server that was not stopped cleanly is
+        # replaced, but not a server that is still listening.
+        if os.path.exists(address):
+            probe = socket.socket(socket.AF_UNIX)
+            try:
+                probe.connect(address)
+            except OSError:
+                os.unlink(address)
+            else:
+                raise OSError('a server is already listening on {}'.format(
+                        address))
+            finally:
+                probe.close()
+
+        # Only the user may connect to the socket.
+        umask = os.umask(0o077)
+        try:
+            server = _UnixServer(address, _Handler)
+        finally:
+            os.umask(umask)
+    elif family == socket.AF_INET6:
+        server = _TCP6Server(address, _Handler)
+    else:
+        server = _TCPServer(address, _Handler)
+
+    server.routes = dict(routes)
+    server.routes.setdefault('bdrate', bdrate_route)
+    server.cache = cache
+    server.verbose = verbose
+
+    return server
+
+def serve(address, routes, cache, verbose=False):
+    """Runs a server (see create_server) until it is interrupted, and removes
+    its Unix socket, if any, afterwards.
+
+    Keyword arguments:
+    address -- Address of the server.
+    routes -- Dictionary with the function that handles each route.
+    cache -- MemoryCache object shared by the routes.
+    verbose -- Boolean parameter to log every request to the standard error.
+    """
+    server = create_server(address, routes, cache, verbose)
+    print('listening on {}'.format(address), file=sys.stderr)
+    sys.stderr.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.address_family == socket.AF_UNIX:
+            try:
+                os.unlink(server.server_address)
+            except OSError:
+                pass
+
+class _UnixConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix socket."""
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+def request(address, route, payload=None, timeout=None):
+    """Sends a request to a server and returns its decoded JSON response, in
+    which non-finite floats are None. Raises ServerError if the server reports
+    an error.
+
+    Keyword arguments:
+    address -- Address of the server (see parse_address).
+    route -- Name of the route (e.g. 'compare'), or 'health' to query the
+            status of the server.
+    payload -- Value sent as the JSON body of the request.
+    timeout -- Optional timeout of the connection, in seconds.
+    """
+    family, address = parse_address(address)
+
+    if family == socket.AF_UNIX:
+        connection = _UnixConnection(address, timeout)
+    else:
+        connection = http.client.HTTPConnection(address[0], address[1],
+                timeout=timeout)
+
+    try:
+        if route == 'health':
+            connection.request('GET', '/health')
+        else:
+            connection.request('POST', '/' + route, json.dumps(to_json(payload),
+                    allow_nan=False), {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        value = json.loads(response.read())
+    finally:
+        connection.close()
+
+    if response.status != 200:
+        raise ServerError(value.get('error', 'error {}'.format(
+                response.status)))
+
+    return value
@@ -0,0 +1,180 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import numpy
+import warnings
+
+# Statistics that may be used to combine the values of repeated runs.
+STATISTICS = ('mean', 'gmean', 'median', 'min')
+
+# Factor that makes the median absolute deviation a consistent estimator of
+# the standard deviation of normally distributed values.
+MAD_SCALE = 1.4826
+
+# Maximum number of values drawn at once by bootstrap, to bound its memory
+# usage.
+BOOTSTRAP_BLOCK_SIZE = 4 * 1024 * 1024
+
+def group_matrix(keys, values):
+    """Groups values by key, and returns the sorted array of distinct keys and a
+    matrix with one row per key containing its values (in their original
+    order), padded with NaN up to the largest number of values of a key.
+
+    Keyword arguments:
+    keys -- Array of integer keys.
+    values -- Array of values, one per key.
+    """
+    order = numpy.argsort(keys, kind='stable')
+    unique_keys, starts, counts = numpy.unique(keys[order], return_index=True,
+            return_counts=True)
+
+    matrix = numpy.full((len(unique_keys), counts.max() if len(counts) else 0),
+            numpy.nan)
+    rows = numpy.repeat(numpy.arange(len(unique_keys)), counts)
+    columns = numpy.arange(len(keys)) - numpy.repeat(starts, counts)
+    matrix[rows, columns] = values[order]
+
+    return unique_keys, matrix
+
+def reject_outliers(matrix, threshold=3.0):
+    """Returns a copy of a matrix in which the values of each row that are
+    farther from the median of the row than a number of times its scaled median
+    absolute deviation are replaced by NaN. Rows with less than three values,
+    or whose values are mostly equal, are not changed.
+
+    Keyword arguments:
+    matrix -- Matrix with one row per group of values, padded with NaN.
+    threshold -- Maximum distance to the median, in scaled median absolute
+            deviations.
+    """
+    if matrix.size == 0:
+        return matrix.copy()
+
+    median = aggregate(matrix, 'median', axis=1)[:, None]
+    deviation = numpy.abs(matrix - median)
+    mad = MAD_SCALE * aggregate(deviation, 'median', axis=1)[:, None]
+    counts = numpy.sum(~numpy.isnan(matrix), axis=1, keepdims=True)
+
+    outliers = (deviation > threshold * mad) & (mad > 0) & (counts >= 3)
+
+    return numpy.where(outliers, numpy.nan, matrix)
+
+def aggregate(values, statistic='mean', axis=-1):
+    """Combines values along an axis, ignoring NaN values.
+
+    Keyword arguments:
+    values -- Array of values.
+    statistic -- Name of the statistic (see STATISTICS): arithmetic mean,
+            geometric mean, median or minimum.
+    axis -- Axis along which the values are combined.
+    """
+    # Groups without values result in NaN, without warnings.
+    with numpy.errstate(divide='ignore', invalid='ignore'), \
+            warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if statistic == 'mean':
+            return numpy.nanmean(values, axis=axis)
+        elif statistic == 'gmean':
+            return numpy.exp(numpy.nanmean(numpy.log(values), axis=axis))
+        elif statistic == 'median':
+            return numpy.nanmedian(values, axis=axis)
+        elif statistic == 'min':
+            return numpy.nanmin(values, axis=axis)
+
+    raise ValueError('unknown statistic: {}'.format(statistic))
+
+def group_means(values, groups, count, geometric=False):
+    """Returns the (arithmetic or geometric) mean of the values of each group
+    along the last axis, ignoring non-finite values, or NaN for the groups
+    without values.
+
+    Keyword arguments:
+    values -- Array of values, whose last axis is that of the groups.
+    groups -- Array with the index of the group of each value.
+    count -- Number of groups.
+    geometric -- Boolean parameter to calculate geometric means.
+    """
+    values = numpy.asarray(values, dtype=float)
+    groups = numpy.asarray(groups, dtype=numpy.intp)
+    shape = values.shape[:-1]
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        if geometric:
+            values = numpy.log(values)
+        finite = numpy.isfinite(values)
+
+        # The values of every row are grouped at once, by offsetting the
+        # groups of each row.
+        rows = int(numpy.prod(shape))
+        indices = (numpy.arange(rows)[:, None] * count + groups).ravel()
+        sums = numpy.bincount(indices, numpy.where(finite, values, 0).ravel(),
+                              rows * count)
+        counts = numpy.bincount(indices, finite.ravel(), rows * count)
+        means = (sums / counts).reshape(shape + (count,))
+
+        return numpy.exp(means) if geometric else means
+
+def bootstrap(matrices, statistic, resamples, random):
+    """Draws bootstrap resamples of the values of each row of some matrices and
+    returns, for each matrix, an array of shape (resamples, rows) with the
+    statistic of every resample of every row. The values of each row are drawn
+    with replacement from the row itself (ignoring NaN values), and the same
+    draws are used for all the matrices, whose values are thus resampled
+    jointly (e.g. the bitrate and PSNR of the same runs).
+
+    Keyword arguments:
+    matrices -- List of matrices with the same shape, with one row per group
+            of values, padded with NaN.
+    statistic -- Name of the statistic (see aggregate).
+    resamples -- Number of resamples.
+    random -- numpy.random.Generator object.
+    """
+    rows, columns = matrices[0].shape
+    counts = numpy.sum(~numpy.isnan(matrices[0]), axis=1)
+
+    # NaN values are moved to the end of each row, so that the values can be
+    # drawn by index.
+    order = numpy.argsort(numpy.isnan(matrices[0]), axis=1, kind='stable')
+    compact = [numpy.take_along_axis(matrix, order, axis=1)
+               for matrix in matrices]
+    padding = numpy.arange(columns) >= counts[:, None]
+
+    samples = [numpy.empty((resamples, rows)) for _ in matrices]
+    block = max(1, BOOTSTRAP_BLOCK_SIZE // max(1, rows * columns))
+
+    for start in range(0, resamples, block):
+        size = min(block, resamples - start)
+        indices = (random.random((size, rows, columns))
+                   * counts[:, None]).astype(numpy.intp)
+        for matrix, matrix_samples in zip(compact, samples):
+            values = numpy.take_along_axis(matrix[None], indices, axis=2)
+            values[:, padding] = numpy.nan
+            matrix_samples[start:start + size] = aggregate(values, statistic)
+
+    return samples
+
+def interval(samples, confidence=0.95):
+    """Returns the lower and upper bounds of the percentile confidence interval
+    of bootstrap resamples along their first axis, ignoring NaN values.
+
+    Keyword arguments:
+    samples -- Array whose first axis is that of the resamples.
+    confidence -- Confidence level of the interval.
+    """
+    tail = 100 * (1 - confidence) / 2
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return numpy.nanpercentile(samples, [tail, 100 - tail], axis=0)
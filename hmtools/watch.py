@@ -0,0 +1,192 @@
+#
+#   Copyright 2017 Gabriel Cebrian
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import ctypes
+import ctypes.util
+import os
+import os.path
+import select
+import struct
+import time
+
+# Flags of inotify (see inotify(7)).
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+IN_EVENT = struct.Struct('iIII')
+
+def _inotify_library():
+    """Returns the C library if it provides inotify, or None otherwise."""
+    name = ctypes.util.find_library('c')
+    if name is None:
+        return None
+
+    try:
+        library = ctypes.CDLL(name, use_errno=True)
+        library.inotify_init1
+        library.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+
+    return library
+
+class Watcher:
+    """Watches a set of directories and reports which of their files are
+    created, modified or removed. It uses inotify when it is available, and
+    polls the directories otherwise (note that inotify does not report changes
+    made by other hosts on network file systems, in which case polling must be
+    used).
+    """
+
+    def __init__(self, paths, interval=1.0, use_polling=False):
+        """Starts watching the directories.
+
+        Keyword arguments:
+        paths -- List of paths of the directories.
+        interval -- Seconds between polls, and seconds without new changes
+                after which wait() returns.
+        use_polling -- Boolean parameter to poll the directories even if
+                inotify is available.
+        """
+        self.paths = list(paths)
+        self.interval = interval
+        self.descriptor = None
+
+        library = None if use_polling else _inotify_library()
+        if library is not None:
+            descriptor = library.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if descriptor >= 0:
+                self.descriptor = descriptor
+                self.watches = dict()
+                for path in self.paths:
+                    watch = library.inotify_add_watch(descriptor,
+                            os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_FROM
+                            | IN_MOVED_TO | IN_DELETE)
+                    if watch < 0:
+                        os.close(descriptor)
+                        self.descriptor = None
+                        break
+                    self.watches.setdefault(watch, list()).append(path)
+
+        if self.descriptor is None:
+            self.snapshots = {path: self._snapshot(path)
+                              for path in self.paths}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def use_polling(self):
+        """Boolean value stating whether the directories are polled."""
+        return self.descriptor is None
+
+    def close(self):
+        """Stops watching the directories."""
+        if self.descriptor is not None:
+            os.close(self.descriptor)
+            self.descriptor = None
+
+    @staticmethod
+    def _snapshot(path):
+        """Returns a dictionary with the size and modification time of each
+        file of a directory.
+
+        Keyword arguments:
+        path -- Path of the directory.
+        """
+        snapshot = dict()
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_size,
+                                stat.st_mtime_ns)
+                except OSError:
+                    pass
+
+        return snapshot
+
+    def _poll(self):
+        """Returns the set of (directory, filename) tuples of the files that
+        have changed since the previous poll.
+        """
+        changes = set()
+
+        for path in self.paths:
+            snapshot = self._snapshot(path)
+            previous = self.snapshots[path]
+            for filename in snapshot.keys() | previous.keys():
+                if snapshot.get(filename) != previous.get(filename):
+                    changes.add((path, filename))
+            self.snapshots[path] = snapshot
+
+        return changes
+
+    def _read_events(self, timeout):
+        """Returns the set of (directory, filename) tuples of the files
+        reported by inotify within a timeout.
+
+        Keyword arguments:
+        timeout -- Maximum number of seconds to wait for an event, or None to
+                wait indefinitely.
+        """
+        changes = set()
+
+        readable, _, _ = select.select([self.descriptor], [], [], timeout)
+        if not readable:
+            return changes
+
+        data = os.read(self.descriptor, 64 * 1024)
+        offset = 0
+        while offset + IN_EVENT.size <= len(data):
+            watch, mask, cookie, length = IN_EVENT.unpack_from(data, offset)
+            offset += IN_EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if watch in self.watches and name:
+                for path in self.watches[watch]:
+                    changes.add((path, os.fsdecode(name)))
+
+        return changes
+
+    def wait(self):
+        """Blocks until some files change, and returns the set of
+        (directory, filename) tuples of the files that have changed. Changes
+        are gathered until no new ones happen during one interval, so that a
+        burst of them is reported at once.
+        """
+        changes = set()
+
+        while True:
+            if self.descriptor is None:
+                time.sleep(self.interval)
+                new_changes = self._poll()
+            else:
+                new_changes = self._read_events(None if not changes
+                                                else self.interval)
+
+            if not new_changes and changes:
+                return changes
+
+            changes |= new_changes
@@ -16,11 +16,50 @@
 
 import argparse
 import collections
+import contextlib
+import json
+import hmtools.archive
 import hmtools.bd
+import hmtools.cache
+import hmtools.export
 import hmtools.parser
+import hmtools.profile
+import hmtools.results
+import hmtools.server
+import hmtools.stats
+import hmtools.watch
+import math
+import numpy
 import os.path
-import scipy.stats.mstats
+import sqlite3
 import sys
+import time
+
+# Names of the perf events used for the counter results, in order of
+# preference.
+CYCLES_EVENTS = ('cycles', 'cpu-cycles', 'cycles:u', 'cpu-cycles:u')
+INSTRUCTIONS_EVENTS = ('instructions', 'instructions:u')
+
+# Keys of the counter results.
+COUNTER_KEYS = ('speedup', 'cycles_reduction', 'instructions_reduction', 'base_ipc', 'test_ipc')
+
+# Keys of the coding efficiency and timing results.
+RESULT_KEYS = ('bdrate', 'speedup', 'time_reduction')
+
+OUTPUT_FORMATS = ('table', 'jsonl', 'csv', 'npz', 'parquet')
+
+# Output formats that are written as text, and may be printed to the standard
+# output.
+TEXT_FORMATS = ('table', 'jsonl', 'csv')
+
+# Columns of the coding efficiency and timing results exported as a table.
+RESULT_COLUMNS = ('type', 'configuration', 'category', 'sequence') + RESULT_KEYS
+
+# Maximum number of sequences, and of seconds since the first of them was
+# parsed, that stream_comparison gathers before calculating and printing their
+# results together, which is much faster than doing it one by one.
+STREAM_BATCH_SIZE = 64
+STREAM_BATCH_SECONDS = 0.5
 
 def parse_arguments(argv):
     """Parses the command line arguments and checks that they meet the
@@ -44,7 +83,21 @@ def parse_arguments(argv):
             'of the rate-distortion curves of the BD-rate metric, regardless '
             'of their /p tag. However, only those files with the same /n and '
             '/p tags in both directories will be used for the timing results, '
-            'and an average will be shown per sequence.')
+            'and an average will be shown per sequence. Files compressed with '
+            'gzip, xz, bzip2 or zstd are read directly, and patterns are '
+            'matched against their names without the compression suffix (e.g. '
+            '\'RA_QP32_RaceHorses.out.gz\' also matches the pattern above). '
+            'Patterns may also contain path separators to match files in '
+            'subdirectories, and the ** wildcard to match any number of them '
+            '(e.g. \'/n/RA_QP/p.out\' for \'RaceHorses/RA_QP32.out\', or '
+            '\'**/RA_QP/p_/n.out\' for files at any depth). Files that share '
+            'their /n and /p tags are considered repetitions of the same '
+            'encoding: their rate-distortion points are averaged, and their '
+            'encoding times are combined with the chosen time statistic. The '
+            'format of the result files of each directory (HM or VTM logs, or '
+            'summary CSV files written by x265 with --csv) is recognized from '
+            'the start of one of them, so encoders may be compared with each '
+            'other. Other files are parsed as HM logs.')
 
     argument_parser.add_argument('-o', '--old', action='store_true',
             default=False, required=False, help='use the old cubic polynomial '
@@ -54,35 +107,252 @@ def parse_arguments(argv):
             default=False, required=False, help='use the output of the \'perf '
             'stat\' command to calculate the timing values instead of the time '
             'provided by the encoder itself.', dest='use_perf')
+    argument_parser.add_argument('-c', '--counters', action='store_true',
+            default=False, required=False, help='show a second table with '
+            'the cycles and instructions reductions and the instructions per '
+            'cycle (IPC) of both encodings, per sequence and class, from the '
+            'counters reported by \'perf stat\'.', dest='show_counters')
+    argument_parser.add_argument('--hull', action='store_true',
+            default=False, required=False, help='calculate the BD-rate over '
+            'the convex hull of the rate-distortion points of each sequence, '
+            'which may come from any number of operating points, instead of '
+            'over the curve through all of them. Every file is an operating '
+            'point, so several presets per QP may be kept in subdirectories '
+            '(e.g. with the pattern \'*/RA_QP/p_/n.out\'), and their times '
+            'are combined as repetitions. Hulls need at least two points '
+            '(four with --old).', dest='use_hull')
+    argument_parser.add_argument('--pareto', action='store_true',
+            default=False, required=False, help='show a second table with the '
+            'tested configurations on the rate-time Pareto front of each '
+            'sequence and of the average: those that no other configuration '
+            'beats in both BD-rate and speed-up. It requires several test '
+            'directories (e.g. one per preset).', dest='show_pareto')
+    argument_parser.add_argument('--time-statistic', type=str,
+            choices=hmtools.stats.STATISTICS, default='mean', required=False,
+            help='statistic used to combine the encoding times of repeated '
+            'runs of the same encoding (mean by default). The minimum is '
+            'usually the most robust estimate on noisy machines.',
+            dest='time_statistic')
+    argument_parser.add_argument('--reject-outliers', nargs='?', type=float,
+            const=3.0, default=None, required=False, help='discard the '
+            'encoding times of repeated runs that are farther from their '
+            'median than the given number of scaled median absolute '
+            'deviations (3 by default) before combining them. Encodings with '
+            'less than three runs are not affected.', metavar='threshold',
+            dest='outlier_threshold')
+    argument_parser.add_argument('--gmean', action='store_true',
+            default=False, required=False, help='average the speed-ups of '
+            'each sequence and of all the sequences with the geometric mean '
+            'instead of the arithmetic mean.', dest='use_gmean')
+    argument_parser.add_argument('--bootstrap', nargs='?', type=int,
+            const=2000, default=None, required=False, help='show a second '
+            'table with bootstrap confidence intervals of the BD-rate and the '
+            'speed-up of each sequence and of their average, obtained by '
+            'resampling the repeated runs of each encoding the given number '
+            'of times (2000 by default).', metavar='resamples',
+            dest='bootstrap')
+    argument_parser.add_argument('--confidence', type=float, default=0.95,
+            required=False, help='confidence level of the bootstrap '
+            'intervals (0.95 by default).', dest='confidence')
+    argument_parser.add_argument('--seed', type=int, default=None,
+            required=False, help='seed of the random number generator used '
+            'for the bootstrap intervals, to make them reproducible.',
+            dest='seed')
+    argument_parser.add_argument('-j', '--jobs', type=int, default=1,
+            required=False, help='number of result files parsed in parallel. '
+            'Use 0 to run one job per available CPU.', dest='jobs')
+    argument_parser.add_argument('--threads', action='store_true',
+            default=False, required=False, help='parse the result files in '
+            'parallel threads instead of processes, which is usually faster '
+            'when reading them is I/O-bound (e.g. on network file systems).',
+            dest='use_threads')
+    argument_parser.add_argument('--full-scan', action='store_false',
+            default=True, required=False, help='scan the result files from '
+            'the beginning instead of looking for their summary at the end '
+            'first.', dest='tail_first')
+    argument_parser.add_argument('--cache', nargs='?', type=str,
+            const=hmtools.cache.default_path(), default=None, required=False,
+            help='keep the parsed result files in a cache, so that only the '
+            'new or modified ones are parsed in the following runs. Entries '
+            'of deleted files of the compared directories are removed. The '
+            'cache is stored in the given path, or in the user cache '
+            'directory.', metavar='path', dest='cache_path')
+    argument_parser.add_argument('--no-cache', action='store_true',
+            default=False, required=False, help='parse every result file '
+            'without reading or updating the cache, even if --cache is '
+            'given.', dest='no_cache')
+    argument_parser.add_argument('--rebuild-cache', action='store_true',
+            default=False, required=False, help='parse every result file '
+            'again and replace their entries in the cache (in the default '
+            'path, unless --cache is given).', dest='rebuild_cache')
+    argument_parser.add_argument('-w', '--watch', nargs='?', type=float,
+            const=1.0, default=None, required=False, help='keep watching the '
+            'directories and refresh the results whenever their files change, '
+            'parsing only the changed files again. Changes are gathered until '
+            'none happens for the given number of seconds (1 by default).',
+            metavar='seconds', dest='watch')
+    argument_parser.add_argument('--poll', action='store_true',
+            default=False, required=False, help='poll the directories in watch '
+            'mode instead of relying on inotify, which does not report changes '
+            'made by other hosts on network file systems.', dest='use_polling')
+    argument_parser.add_argument('--profile', nargs='?', type=str,
+            const='-', default=None, required=False, help='measure the time '
+            'spent in each stage (discovery, parse, and within it read and '
+            'match, calculate, bdrate, output) together with counters such as '
+            'the files parsed, bytes read and lines scanned, and the slowest '
+            'files. The report is printed to the standard error, or written as '
+            'JSON to the given path. Times of files parsed in parallel are '
+            'added up.', metavar='path', dest='profile_path')
+    argument_parser.add_argument('--stream', action='store_true',
+            default=False, required=False, help='parse and compare the '
+            'result files one sequence at a time, printing the results of '
+            'each sequence shortly after its files are parsed, so that memory '
+            'depends on a small batch of sequences instead of on the whole '
+            'comparison. The columns of the table are as wide as their '
+            'headers, since the values are not known in advance.',
+            dest='stream')
+    argument_parser.add_argument('--format', type=str,
+            choices=OUTPUT_FORMATS, default='table', required=False,
+            help='output format: tables (default), JSON lines with one '
+            'object per sequence and configuration, and per average, or a '
+            'table with one row per sequence and configuration, and per '
+            'average, as CSV, NumPy .npz (one array per column) or Parquet '
+            '(which requires pyarrow). Counters, bootstrap intervals and the '
+            'Pareto front are only shown as tables and JSON lines.',
+            dest='output_format')
+    argument_parser.add_argument('--files', action='store_true',
+            default=False, required=False, help='export the values parsed '
+            'from each result file of every directory (directory, path of the '
+            'file relative to the directory, sequence, identifier, times, '
+            'perf values, the rate-distortion values of each slice type and '
+            'the perf counters) in the output format, which must be jsonl, '
+            'csv, npz or parquet, instead of comparing the encodings.',
+            dest='export_files')
+    argument_parser.add_argument('--output', type=str, default=None,
+            required=False, help='path of the file where the results are '
+            'written (- for the standard output, the default). It is required '
+            'by the npz and parquet formats.', metavar='path',
+            dest='output_path')
+    argument_parser.add_argument('--serve', type=str, default=None,
+            required=False, help='run as a daemon that answers comparison '
+            'requests on the given address (a Unix socket path, or '
+            'localhost:port for HTTP) and keeps the parsed result files in '
+            'memory, so that repeated comparisons only parse the files that '
+            'changed. The other arguments are given by each request.',
+            metavar='address', dest='serve_address')
+    argument_parser.add_argument('--connect', type=str, default=None,
+            required=False, help='send the comparison to a daemon started '
+            'with --serve on the given address instead of parsing the '
+            'result files in this process.', metavar='address',
+            dest='connect_address')
     argument_parser.add_argument('-s', '--scale', nargs=1, type=int,
             default=4, required=False, help='number of digits shown to the '
             'right of the decimal point.', dest='scale')
     argument_parser.add_argument('-b', '--base', nargs=1, type=str,
-            required=True, help='path of the directory containing the results '
-            'of the baseline encoding.', dest='base_path')
+            required=False, help='path of the directory (or tar or zip archive) '
+            'containing the results of the baseline encoding.',
+            dest='base_path')
     argument_parser.add_argument('-bp', '--base_pattern', nargs=1, type=str,
-            required=True, help='pattern matching the filenames of the results '
+            required=False, help='pattern matching the filenames of the results '
             'of the baseline encoding. It must be a valid Python regular '
             'expression (see note below).', dest='base_pattern')
-    argument_parser.add_argument('-t', '--test', nargs=1, type=str,
-            required=True, help='path of the directory containing the results '
-            'of the encoding to be tested.', dest='test_path')
-    argument_parser.add_argument('-tp', '--test_pattern', nargs=1, type=str,
-            required=True, help='pattern matching the filenames of the results '
+    argument_parser.add_argument('-t', '--test', nargs='+', type=str,
+            required=False, help='path of the directory (or tar or zip archive) '
+            'containing the results of the encoding to be tested. Several '
+            'directories may be given to compare several configurations '
+            'against the same baseline, in which case the results of each one '
+            'are shown side by side.', dest='test_path')
+    argument_parser.add_argument('-tp', '--test_pattern', nargs='+', type=str,
+            required=False, help='pattern matching the filenames of the results '
             'of the encoding to be tested. It must be a valid Python regular '
-            'expression (see note below).', dest='test_pattern')
+            'expression (see note below). Either one pattern for all the test '
+            'directories, or one per directory, may be given.',
+            dest='test_pattern')
 
     arguments = argument_parser.parse_args(argv)
 
     #TODO: expanduser
     #TODO: check why sometimes arguments are lists, and others integers
 
-    if not os.path.isdir(arguments.base_path[0]):
+    if arguments.serve_address is not None:
+        if arguments.connect_address is not None:
+            argument_parser.error('--serve and --connect are mutually '
+                    'exclusive.')
+        return arguments
+
+    missing = [flags for flags, value in (('-b/--base', arguments.base_path), ('-bp/--base_pattern', arguments.base_pattern), ('-t/--test', arguments.test_path), ('-tp/--test_pattern', arguments.test_pattern)) if value is None]
+    if missing:
+        argument_parser.error('the following arguments are required: {}'.format(', '.join(missing)))
+
+    if not os.path.isdir(arguments.base_path[0]) \
+            and not hmtools.archive.is_archive(arguments.base_path[0]):
         argument_parser.error('path of the baseline encoding is not a '
-                'directory')
-    if not os.path.isdir(arguments.test_path[0]):
-        argument_parser.error('path of the encoding being tested is not a '
-                'directory')
+                'directory or an archive')
+    for test_path in arguments.test_path:
+        if not os.path.isdir(test_path) \
+                and not hmtools.archive.is_archive(test_path):
+            argument_parser.error('path of the encoding being tested is not a '
+                    'directory or an archive')
+    if len(arguments.test_pattern) == 1:
+        arguments.test_pattern = arguments.test_pattern * len(arguments.test_path)
+    if len(arguments.test_pattern) != len(arguments.test_path):
+        argument_parser.error('the number of test patterns must be either one '
+                'or the number of test directories.')
+    if arguments.watch is not None and len(arguments.test_path) > 1:
+        argument_parser.error('watch mode only supports one test directory.')
+    if arguments.watch is not None and arguments.show_counters:
+        argument_parser.error('watch mode does not support --counters.')
+    if arguments.watch is not None and not all(os.path.isdir(path) for path
+            in arguments.base_path + arguments.test_path):
+        argument_parser.error('watch mode does not support archives.')
+    if arguments.watch is not None and any('/' in pattern.replace('/n', '')
+            .replace('/p', '') or '**' in pattern for pattern
+            in arguments.base_pattern + arguments.test_pattern):
+        argument_parser.error('watch mode does not support patterns with '
+                'subdirectories.')
+    if arguments.watch is not None and arguments.bootstrap is not None:
+        argument_parser.error('watch mode does not support --bootstrap.')
+    if arguments.stream and arguments.watch is not None:
+        argument_parser.error('--stream does not support watch mode.')
+    if arguments.stream and arguments.connect_address is not None:
+        argument_parser.error('--stream does not support --connect.')
+    if arguments.stream and (arguments.show_counters or arguments.bootstrap is not None or arguments.show_pareto):
+        argument_parser.error('--stream does not support --counters, --bootstrap or --pareto.')
+    if arguments.show_pareto and len(arguments.test_path) < 2:
+        argument_parser.error('--pareto requires several test directories.')
+    if arguments.stream and not all(os.path.isdir(path) for path in arguments.base_path + arguments.test_path):
+        argument_parser.error('--stream does not support archives.')
+    if arguments.watch is not None and arguments.output_format != 'table':
+        argument_parser.error('watch mode only supports the table format.')
+    if arguments.output_format in ('csv', 'npz', 'parquet') and (arguments.show_counters or arguments.bootstrap is not None or arguments.show_pareto):
+        argument_parser.error('the {} format does not support --counters, --bootstrap or --pareto.'.format(arguments.output_format))
+    if arguments.output_format not in TEXT_FORMATS and arguments.output_path in (None, '-'):
+        argument_parser.error('the {} format requires an output file (--output).'.format(arguments.output_format))
+    if arguments.stream and arguments.output_format not in TEXT_FORMATS:
+        argument_parser.error('--stream only supports the table, jsonl and csv formats.')
+    if arguments.export_files and arguments.output_format == 'table':
+        argument_parser.error('--files requires the jsonl, csv, npz or parquet format.')
+    if arguments.export_files and (arguments.stream or arguments.connect_address is not None or arguments.watch is not None):
+        argument_parser.error('--files does not support --stream, --connect or watch mode.')
+    if arguments.watch is not None and arguments.output_path not in (None, '-'):
+        argument_parser.error('watch mode does not support --output.')
+    if arguments.connect_address is not None and arguments.watch is not None:
+        argument_parser.error('--connect does not support watch mode.')
+    if arguments.connect_address is not None and arguments.profile_path is not None:
+        argument_parser.error('--connect does not support --profile.')
+    if arguments.outlier_threshold is not None and arguments.outlier_threshold <= 0:
+        argument_parser.error('outlier threshold must be a positive value.')
+    if arguments.bootstrap is not None and arguments.bootstrap <= 0:
+        argument_parser.error('number of bootstrap resamples must be a positive value.')
+    if not 0 < arguments.confidence < 1:
+        argument_parser.error('confidence level must be between 0 and 1.')
+    if arguments.no_cache and arguments.rebuild_cache:
+        argument_parser.error('--no-cache and --rebuild-cache are mutually '
+                'exclusive.')
+    if arguments.watch is not None and arguments.watch <= 0:
+        argument_parser.error('watch interval must be a positive value.')
+    if arguments.jobs < 0:
+        argument_parser.error('number of jobs must be a positive value.')
     if arguments.scale[0] < 0:
         argument_parser.error('scale must be a positive value.')
 
@@ -120,97 +390,415 @@ def sort_sequences(sequences):
 
     return sorted_sequences
 
-def calculate_results(sequences, base_results, test_results, use_old_bdrate, use_perf):
+def join_keyed(names, base_results, test_results, base_keyed, test_keyed):
+    """Matches the values of both encodings that share their sequence and
+    identifier, and returns three arrays with the index of their sequence in a
+    list of names, and their baseline and test values.
+
+    Keyword arguments:
+    names -- List of sequence names.
+    base_results -- Results of the baseline encoding (Results object).
+    test_results -- Results of the encoding being tested (Results object).
+    base_keyed -- Tuple (sequence codes, sequence identifier codes, values)
+            of the baseline encoding, with one value (or row of values) per
+            distinct sequence and identifier, as returned by
+            Results.aggregated_values or Results.grouped_values.
+    test_keyed -- Tuple (sequence codes, sequence identifier codes, values)
+            of the encoding being tested.
+    """
+    name_indices = {name: index for index, name in enumerate(names)}
+    sequence_ids = dict()
+    for sequence_id in base_results.sequence_ids + test_results.sequence_ids:
+        sequence_ids.setdefault(sequence_id, len(sequence_ids))
+
+    def keys(results, keyed):
+        sequence_codes, sequence_id_codes, values = keyed
+        sequence_map = numpy.array([name_indices.get(sequence, -1) for sequence in results.sequences] + [-1])
+        sequence_id_map = numpy.array([sequence_ids[sequence_id] for sequence_id in results.sequence_ids] + [0])
+        indices = sequence_map[sequence_codes]
+        valid = indices >= 0
+        return indices[valid] * len(sequence_ids) + sequence_id_map[sequence_id_codes[valid]], values[valid]
+
+    base_keys, base_values = keys(base_results, base_keyed)
+    test_keys, test_values = keys(test_results, test_keyed)
+
+    common_keys, base_indices, test_indices = numpy.intersect1d(base_keys, test_keys, assume_unique=True, return_indices=True)
+
+    return common_keys // max(1, len(sequence_ids)), base_values[base_indices], test_values[test_indices]
+
+def join_values(names, base_results, test_results, base_values, test_values, statistic='mean', outlier_threshold=None):
+    """Matches the files of both encodings that share their sequence and
+    identifier and have a value, and returns three arrays with the index of
+    their sequence in a list of names, and their baseline and test values. The
+    values of the repetitions of each sequence and identifier are combined.
+
+    Keyword arguments:
+    names -- List of sequence names.
+    base_results -- Results of the baseline encoding (Results object).
+    test_results -- Results of the encoding being tested (Results object).
+    base_values -- Array with a value per file of the baseline encoding (NaN
+            if missing).
+    test_values -- Array with a value per file of the encoding being tested
+            (NaN if missing).
+    statistic -- Name of the statistic used to combine repetitions (see
+            hmtools.stats.aggregate).
+    outlier_threshold -- Optional threshold to discard outliers among the
+            repetitions (see hmtools.stats.reject_outliers).
+    """
+    return join_keyed(names, base_results, test_results, base_results.aggregated_values(base_values, statistic, outlier_threshold), test_results.aggregated_values(test_values, statistic, outlier_threshold))
+
+def join_times(names, base_results, test_results, use_perf, statistic='mean', outlier_threshold=None):
+    """Matches the files of both encodings that share their sequence and
+    identifier, and returns three arrays with the index of their sequence in a
+    list of names, and their baseline and test encoding times.
+
+    Keyword arguments:
+    names -- List of sequence names.
+    base_results -- Results of the baseline encoding (Results object).
+    test_results -- Results of the encoding being tested (Results object).
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    statistic -- Name of the statistic used to combine the times of repeated
+            runs (see hmtools.stats.aggregate).
+    outlier_threshold -- Optional threshold to discard outliers among the times
+            of repeated runs (see hmtools.stats.reject_outliers).
+    """
+    field = 'perf_time' if use_perf else 'time'
+
+    return join_values(names, base_results, test_results, base_results.files[field], test_results.files[field], statistic, outlier_threshold)
+
+def minimum_curve_points(use_old_bdrate, use_hull):
+    """Returns the minimum number of points of the rate-distortion curves whose
+    BD-rate is calculated: four, as required by the cubic polynomial fit and
+    usual for four QPs, or two when the curves are convex hulls and the
+    piecewise cubic interpolation is used, since hulls may discard some of
+    the points.
+
+    Keyword arguments:
+    use_old_bdrate -- Boolean parameter to use old BD-rate measure.
+    use_hull -- Boolean parameter to use the convex hulls of the curves.
+    """
+    return 2 if use_hull and not use_old_bdrate else 4
+
+def rd_curves(results, names, use_hull=False):
+    """Returns the rate-distortion curves of several sequences (see
+    hmtools.results.Results.rd_curves), or their convex hulls.
+
+    Keyword arguments:
+    results -- Results object.
+    names -- List of sequence names.
+    use_hull -- Boolean parameter to return the convex hulls of the points of
+            all the files of each sequence (see hmtools.bd.hull_curves), so
+            that files that share their sequence and identifier (e.g. several
+            presets per QP) are distinct operating points instead of
+            repetitions.
+    """
+    if use_hull:
+        return hmtools.bd.hull_curves(results.rd_curves(names, average_repetitions=False))
+
+    return results.rd_curves(names)
+
+def calculate_results(sequences, base_results, test_results, use_old_bdrate, use_perf, statistic='mean', outlier_threshold=None, use_gmean=False, use_hull=False):
     """Processes the results to calculate the coding efficiency and timing
     results of the tested encoding with respect to the baseline. Return both
     individual results and average values.
 
     Keyword arguments:
     sequences -- Dictionary of sequence classes, and sequences to analyze.
-    base_results -- Results of the baseline encoding.
-    test_results -- Results of the encoding being tested.
+    base_results -- Results of the baseline encoding (Results object, or the
+            dictionary returned by hmtools.parser.parse_dir).
+    test_results -- Results of the encoding being tested (Results object, or
+            the dictionary returned by hmtools.parser.parse_dir).
     use_old_bdrate -- Boolean parameter to use old BD-rate measure.
     use_perf -- Boolean parameter to use perf timing values instead of the ones
             reported in the result files.
+    statistic -- Name of the statistic used to combine the times of repeated
+            runs (see hmtools.stats.aggregate).
+    outlier_threshold -- Optional threshold to discard outliers among the times
+            of repeated runs (see hmtools.stats.reject_outliers).
+    use_gmean -- Boolean parameter to average speed-ups geometrically.
+    use_hull -- Boolean parameter to calculate the BD-rate over the convex
+            hulls of the rate-distortion points (see hmtools.bd.hull_curves).
     """
-    results = dict()
+    return calculate_matrix_results(sequences, base_results, [test_results], use_old_bdrate, use_perf, statistic, outlier_threshold, use_gmean, use_hull)[0]
 
-    all_bdrates = list()
-    all_speedups = list()
-    all_time_reductions = list()
+def calculate_matrix_results(sequences, base_results, tests_results, use_old_bdrate, use_perf, statistic='mean', outlier_threshold=None, use_gmean=False, use_hull=False):
+    """Processes the results to calculate the coding efficiency and timing
+    results of several tested encodings with respect to the same baseline.
+    Returns a list with a tuple of individual results and average values per
+    tested encoding.
 
-    for category, category_sequences in sequences.items():
-        for sequence in category_sequences:
-            base_rd = set()
-            test_rd = set()
-            speedups = list()
-            time_reductions = list()
-
-            for sequence_id in base_results[sequence].keys():
-                if 'rd' in base_results[sequence][sequence_id]:
-                    base_rd.add((base_results[sequence][sequence_id]['rd']['a']['bitrate'], base_results[sequence][sequence_id]['rd']['a']['yuv_psnr']))
-
-            for sequence_id in test_results[sequence].keys():
-                if 'rd' in test_results[sequence][sequence_id]:
-                    test_rd.add((test_results[sequence][sequence_id]['rd']['a']['bitrate'], test_results[sequence][sequence_id]['rd']['a']['yuv_psnr']))
-
-            sequence_ids = set(base_results[sequence].keys() & test_results[sequence].keys())
-            for sequence_id in sequence_ids:
-                if use_perf:
-                    if 'perf' in base_results[sequence][sequence_id] and 'time' in base_results[sequence][sequence_id]['perf'] \
-                            and 'perf' in test_results[sequence][sequence_id] and 'time' in test_results[sequence][sequence_id]['perf']:
-                        base_time = base_results[sequence][sequence_id]['perf']['time']
-                        test_time = test_results[sequence][sequence_id]['perf']['time']
-
-                        speedups.append(base_time / test_time)
-                        time_reductions.append((base_time - test_time) / base_time)
-                else:
-                    if 'time' in base_results[sequence][sequence_id] and 'time' in test_results[sequence][sequence_id]:
-                        base_time = base_results[sequence][sequence_id]['time']
-                        test_time = test_results[sequence][sequence_id]['time']
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to analyze.
+    base_results -- Results of the baseline encoding (Results object, or the
+            dictionary returned by hmtools.parser.parse_dir).
+    tests_results -- List of results of the encodings being tested (Results
+            objects, or dictionaries returned by hmtools.parser.parse_dir).
+    use_old_bdrate -- Boolean parameter to use old BD-rate measure.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    statistic -- Name of the statistic used to combine the times of repeated
+            runs (see hmtools.stats.aggregate).
+    outlier_threshold -- Optional threshold to discard outliers among the times
+            of repeated runs (see hmtools.stats.reject_outliers).
+    use_gmean -- Boolean parameter to average speed-ups geometrically.
+    use_hull -- Boolean parameter to calculate the BD-rate over the convex
+            hulls of the rate-distortion points (see hmtools.bd.hull_curves).
+    """
+    if isinstance(base_results, dict):
+        base_results = hmtools.results.Results.from_dict(base_results)
+    tests_results = [hmtools.results.Results.from_dict(test_results) if isinstance(test_results, dict) else test_results for test_results in tests_results]
 
-                        speedups.append(base_time / test_time)
-                        time_reductions.append((base_time - test_time) / base_time)
+    names = [sequence for category_sequences in sequences.values() for sequence in category_sequences]
 
+    all_results = list()
+    for test_results in tests_results:
+        results = dict()
+        for sequence in names:
             results[sequence] = dict()
             results[sequence]['bdrate'] = float('nan')
             results[sequence]['speedup'] = float('nan')
             results[sequence]['time_reduction'] = float('nan')
+        all_results.append(results)
 
-            if len(base_rd) >= 4 and len(test_rd) >= 4:
-                base_rd = sorted(base_rd)
-                test_rd = sorted(test_rd)
-                if use_old_bdrate:
-                    bdrate = hmtools.bd.bdrate_old(base_rd, test_rd)
-                else:
-                    bdrate = hmtools.bd.bdrate(base_rd, test_rd)
+    # The BD-rates of all the sequences of all the tested encodings are
+    # calculated at once, which is much faster than calculating them one by
+    # one.
+    base_curves = rd_curves(base_results, names, use_hull)
+    minimum_points = minimum_curve_points(use_old_bdrate, use_hull)
+    bdrate_cells = list()
+    bdrate_base_curves = list()
+    bdrate_test_curves = list()
+
+    for test_index, test_results in enumerate(tests_results):
+        test_curves = rd_curves(test_results, names, use_hull)
+        for index in range(len(names)):
+            if len(base_curves[index]) >= minimum_points and len(test_curves[index]) >= minimum_points:
+                bdrate_cells.append((test_index, names[index]))
+                bdrate_base_curves.append(base_curves[index])
+                bdrate_test_curves.append(test_curves[index])
+
+    bdrates = hmtools.bd.bdrate_curves(bdrate_base_curves, bdrate_test_curves, use_old_bdrate)
+    for (test_index, sequence), bdrate in zip(bdrate_cells, bdrates):
+        all_results[test_index][sequence]['bdrate'] = bdrate
+
+    # Speed-ups and time reductions are averaged per sequence over the files
+    # that both encodings share.
+    for test_results, results in zip(tests_results, all_results):
+        indices, base_times, test_times = join_times(names, base_results, test_results, use_perf, statistic, outlier_threshold)
+
+        counts = numpy.bincount(indices, minlength=len(names))
+        speedups = hmtools.stats.group_means(base_times / test_times, indices, len(names), use_gmean)
+        time_reductions = numpy.bincount(indices, (base_times - test_times) / base_times, minlength=len(names))
 
-                results[sequence]['bdrate'] = bdrate
-                all_bdrates.append(bdrate)
-            if len(speedups) > 0:
-                speedup = sum(speedups) / len(speedups) #scipy.stats.mstats.gmean(speedups)
+        for index in numpy.flatnonzero(counts):
+            results[names[index]]['speedup'] = float(speedups[index])
+            results[names[index]]['time_reduction'] = float(time_reductions[index] / counts[index])
 
-                results[sequence]['speedup'] = speedup
-                all_speedups.append(speedup)
-            if len(time_reductions) > 0:
-                time_reduction = sum(time_reductions) / len(time_reductions)
+    return [(results, calculate_average(sequences, results, use_gmean=use_gmean)) for results in all_results]
 
-                results[sequence]['time_reduction'] = time_reduction
-                all_time_reductions.append(time_reduction)
+def calculate_counter_results(sequences, base_results, test_results, results, use_gmean=False):
+    """Processes the perf counters to calculate the cycles and instructions
+    reductions and the instructions per cycle of both encodings. Returns the
+    results per sequence (together with the speed-up of the timing results),
+    the average results per class and the overall average.
 
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to analyze.
+    base_results -- Results of the baseline encoding (Results object).
+    test_results -- Results of the encoding being tested (Results object).
+    results -- Coding efficiency and timing results per sequence.
+    use_gmean -- Boolean parameter to average speed-ups geometrically.
+    """
+    names = [sequence for category_sequences in sequences.values() for sequence in category_sequences]
+
+    counter_results = dict()
+    for sequence in names:
+        counter_results[sequence] = dict()
+        counter_results[sequence]['speedup'] = results[sequence]['speedup']
+
+    base_cycles = base_results.counter_values(CYCLES_EVENTS)
+    test_cycles = test_results.counter_values(CYCLES_EVENTS)
+    base_instructions = base_results.counter_values(INSTRUCTIONS_EVENTS)
+    test_instructions = test_results.counter_values(INSTRUCTIONS_EVENTS)
+
+    for key, (base_values, test_values) in (('cycles_reduction', (base_cycles, test_cycles)),
+                                            ('instructions_reduction', (base_instructions, test_instructions)),
+                                            ('ipc', (base_instructions / base_cycles, test_instructions / test_cycles))):
+        indices, base_values, test_values = join_values(names, base_results, test_results, base_values, test_values)
+
+        counts = numpy.bincount(indices, minlength=len(names))
+        if key == 'ipc':
+            base_sums = numpy.bincount(indices, base_values, minlength=len(names))
+            test_sums = numpy.bincount(indices, test_values, minlength=len(names))
+        else:
+            reductions = numpy.bincount(indices, (base_values - test_values) / base_values, minlength=len(names))
+
+        for index, sequence in enumerate(names):
+            if key == 'ipc':
+                counter_results[sequence]['base_ipc'] = float(base_sums[index] / counts[index]) if counts[index] else float('nan')
+                counter_results[sequence]['test_ipc'] = float(test_sums[index] / counts[index]) if counts[index] else float('nan')
+            else:
+                counter_results[sequence][key] = float(reductions[index] / counts[index]) if counts[index] else float('nan')
+
+    class_averages = {category: calculate_average({category: category_sequences}, counter_results, COUNTER_KEYS, use_gmean) for category, category_sequences in sequences.items()}
+
+    return counter_results, class_averages, calculate_average(sequences, counter_results, COUNTER_KEYS, use_gmean)
+
+def calculate_average(sequences, results, keys=RESULT_KEYS, use_gmean=False):
+    """Returns the average coding efficiency and timing results of a set of
+    sequences. Sequences without a value (NaN) are not taken into account.
+
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to average.
+    results -- Coding efficiency and timing results per sequence.
+    keys -- Keys of the results to average.
+    use_gmean -- Boolean parameter to average speed-ups geometrically.
+    """
     average = dict()
-    average['bdrate'] = float('nan')
-    average['speedup'] = float('nan')
-    average['time_reduction'] = float('nan')
 
-    if len(all_bdrates) > 0:
-        average['bdrate'] = sum(all_bdrates) / len(all_bdrates)
-    if len(all_speedups) > 0:
-        average['speedup'] = sum(all_speedups) / len(all_speedups)
-    if len(all_time_reductions) > 0:
-        average['time_reduction'] = sum(all_time_reductions) / len(all_time_reductions)
+    for key in keys:
+        values = [results[sequence][key]
+                  for category_sequences in sequences.values()
+                  for sequence in category_sequences
+                  if not math.isnan(results[sequence][key])]
+
+        average[key] = float('nan')
+        if len(values) > 0 and key == 'speedup' and use_gmean:
+            average[key] = math.exp(sum(math.log(value) for value in values) / len(values))
+        elif len(values) > 0:
+            average[key] = sum(values) / len(values)
+
+    return average
 
-    return results, average
+def calculate_pareto(sequences, names, all_results):
+    """Returns the tested configurations on the rate-time Pareto front of each
+    sequence and of the average: those for which no other configuration has
+    both a lower or equal BD-rate and a higher or equal speed-up (and one of
+    them strictly). Configurations without both values are not considered,
+    and only one of several configurations with the same values is kept.
+    Returns a dictionary with the list of names of the configurations on the
+    front of each sequence, and the list of those on the front of the
+    average, in the order of the configurations.
+
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to analyze.
+    names -- Names of the tested configurations.
+    all_results -- List of (results, average) tuples, one per configuration.
+    """
+    rows = [sequence for category_sequences in sequences.values() for sequence in category_sequences]
+
+    # The fronts of all the sequences and of the average are found at once,
+    # with a group of points per row.
+    groups = numpy.repeat(numpy.arange(len(rows) + 1), len(names))
+    configurations = numpy.tile(numpy.arange(len(names)), len(rows) + 1)
+    bdrates = numpy.array([values['bdrate'] for row in rows + [None] for values in (results[row] if row is not None else average for results, average in all_results)])
+    speedups = numpy.array([values['speedup'] for row in rows + [None] for values in (results[row] if row is not None else average for results, average in all_results)])
+
+    valid = numpy.flatnonzero(numpy.isfinite(bdrates) & numpy.isfinite(speedups))
+    front = valid[hmtools.bd.pareto_front(groups[valid], -speedups[valid], -bdrates[valid])]
+
+    fronts = [list() for _ in range(len(rows) + 1)]
+    for group, configuration in zip(groups[front], configurations[front]):
+        fronts[group].append(names[configuration])
+
+    return {'sequences': dict(zip(rows, fronts)), 'average': fronts[-1]}
+
+def calculate_intervals(sequences, base_results, test_results, use_old_bdrate, use_perf, statistic, outlier_threshold, use_gmean, resamples, confidence, random, use_hull=False):
+    """Calculates bootstrap confidence intervals of the BD-rate and speed-up of
+    each sequence and of their average, by resampling the repeated runs of each
+    sequence and identifier of both encodings. Returns the intervals per
+    sequence and the intervals of the average, as dictionaries of (low, high)
+    tuples per key.
+
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to analyze.
+    base_results -- Results of the baseline encoding (Results object).
+    test_results -- Results of the encoding being tested (Results object).
+    use_old_bdrate -- Boolean parameter to use old BD-rate measure.
+    use_perf -- Boolean parameter to use perf timing values instead of the ones
+            reported in the result files.
+    statistic -- Name of the statistic used to combine the times of repeated
+            runs (see hmtools.stats.aggregate).
+    outlier_threshold -- Optional threshold to discard outliers among the times
+            of repeated runs (see hmtools.stats.reject_outliers).
+    use_gmean -- Boolean parameter to average speed-ups geometrically.
+    resamples -- Number of bootstrap resamples.
+    confidence -- Confidence level of the intervals.
+    random -- numpy.random.Generator object.
+    use_hull -- Boolean parameter to calculate the BD-rate over the convex
+            hulls of the rate-distortion points (see hmtools.bd.hull_curves).
+    """
+    minimum_points = minimum_curve_points(use_old_bdrate, use_hull)
+
+    names = [sequence for category_sequences in sequences.values() for sequence in category_sequences]
+
+    samples = dict()
+    samples['bdrate'] = numpy.full((resamples, len(names)), numpy.nan)
+    samples['speedup'] = numpy.full((resamples, len(names)), numpy.nan)
+
+    # The times of the repeated runs of both encodings are resampled
+    # independently, and each resample goes through the same calculation as
+    # the speed-ups themselves.
+    field = 'perf_time' if use_perf else 'time'
+
+    def time_matrix(results):
+        sequence_codes, sequence_id_codes, matrix = results.grouped_values(results.files[field])
+        if outlier_threshold is not None:
+            matrix = hmtools.stats.reject_outliers(matrix, outlier_threshold)
+        return sequence_codes, sequence_id_codes, matrix
+
+    indices, base_times, test_times = join_keyed(names, base_results, test_results, time_matrix(base_results), time_matrix(test_results))
+    if len(indices) > 0:
+        base_samples, = hmtools.stats.bootstrap([base_times], statistic, resamples, random)
+        test_samples, = hmtools.stats.bootstrap([test_times], statistic, resamples, random)
+        samples['speedup'] = hmtools.stats.group_means(base_samples / test_samples, indices, len(names), use_gmean)
+
+    # The bitrate and psnr of each run are resampled jointly, and the
+    # BD-rates of all the resamples of all the sequences are calculated at
+    # once. Deterministic encoders produce the same points in every run, so
+    # their BD-rates do not need to be resampled, and neither do those of
+    # convex hulls, whose files are distinct operating points.
+    rd_matrices = list()
+    for results in (base_results, test_results):
+        point_sequences, _, bitrates = results.grouped_values(results.rd_values('bitrate'))
+        _, _, psnrs = results.grouped_values(results.rd_values('yuv_psnr'))
+        rd_matrices.append((results.sequence_codes(names), point_sequences, bitrates, psnrs))
+
+    if use_hull or all(numpy.all(numpy.isnan(matrix) | (matrix == matrix[:, :1])) for _, _, bitrates, psnrs in rd_matrices for matrix in (bitrates, psnrs)):
+        (base_codes, base_sequences, base_bitrates, base_psnrs), (test_codes, test_sequences, test_bitrates, test_psnrs) = rd_matrices
+        if use_hull:
+            base_curves = rd_curves(base_results, names, use_hull)
+            test_curves = rd_curves(test_results, names, use_hull)
+        else:
+            base_curves = hmtools.results.curves_from_points(base_codes, base_sequences, base_bitrates[:, 0], base_psnrs[:, 0])
+            test_curves = hmtools.results.curves_from_points(test_codes, test_sequences, test_bitrates[:, 0], test_psnrs[:, 0])
+        cells = [index for index in range(len(names)) if len(base_curves[index]) >= minimum_points and len(test_curves[index]) >= minimum_points]
+        bdrates = hmtools.bd.bdrate_curves([base_curves[index] for index in cells], [test_curves[index] for index in cells], use_old_bdrate)
+        samples['bdrate'][:, cells] = bdrates
+    else:
+        # The curves of all the resamples of all the sequences are built in a
+        # single grouped pass, ordered by resample and then by sequence.
+        base_curves, test_curves = [hmtools.results.curves_from_points(codes, point_sequences, *hmtools.stats.bootstrap([bitrates, psnrs], 'mean', resamples, random)) for codes, point_sequences, bitrates, psnrs in rd_matrices]
+
+        cells = numpy.flatnonzero((numpy.array([len(curve) for curve in base_curves]) >= minimum_points) & (numpy.array([len(curve) for curve in test_curves]) >= minimum_points))
+        if len(cells) > 0:
+            samples['bdrate'].reshape(-1)[cells] = hmtools.bd.bdrate_curves([base_curves[cell] for cell in cells], [test_curves[cell] for cell in cells], use_old_bdrate)
+
+    intervals = {sequence: dict() for sequence in names}
+    average_intervals = dict()
+    for key, key_samples in samples.items():
+        bounds = hmtools.stats.interval(key_samples, confidence)
+        for index, sequence in enumerate(names):
+            intervals[sequence][key] = (float(bounds[0][index]), float(bounds[1][index]))
+
+        # The set of sequences is fixed, so the average of each resample is
+        # the average of the resampled values of all the sequences.
+        average_samples = hmtools.stats.aggregate(key_samples, 'gmean' if key == 'speedup' and use_gmean else 'mean', axis=1)
+        low, high = hmtools.stats.interval(average_samples, confidence)
+        average_intervals[key] = (float(low), float(high))
+
+    return intervals, average_intervals
 
 def print_results(sequences, results, average, scale):
     """Prints the results in table format.
@@ -222,41 +810,807 @@ def print_results(sequences, results, average, scale):
     scale -- Number of digits shown to the right of the decimal point.
     """
     HEADER = ['Sequence', 'BD-Rate (%)', 'Speed-Up', 'Time Reduction (%)']
+    FACTORS = [1, 1, 100]
+
+    # Each value is formatted once, and the widths of the columns are those of
+    # the longest formatted values.
+    def format_values(label, values):
+        return [label] + ['{:.{scale}f}'.format(values[key] * factor, scale = scale) for key, factor in zip(RESULT_KEYS, FACTORS)]
+
+    rows = dict()
+    for category, category_sequences in sequences.items():
+        for sequence in category_sequences:
+            rows[sequence] = format_values(sequence, results[sequence])
+    average_row = format_values('Average', average)
+
+    widths = [max(len(row[column]) for row in [HEADER, average_row] + list(rows.values())) for column in range(len(HEADER))]
+    line_width = sum(widths) + 2 * (len(widths) - 1)
+
+    def format_row(row):
+        return '  '.join([row[0].ljust(widths[0])] + [value.rjust(width) for value, width in zip(row[1:], widths[1:])])
+
+    lines = [format_row(HEADER), '{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width)]
+    for category, category_sequences in sequences.items():
+        lines.append('{line_content:-<{line_width}}'.format(line_content = '-- {} --'.format(category), line_width = line_width))
+        lines.extend(format_row(rows[sequence]) for sequence in category_sequences)
+    lines.append('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+    lines.append(format_row(average_row))
+
+    print('\n'.join(lines))
+
+def print_counter_results(sequences, counter_results, class_averages, average, scale):
+    """Prints the results of the perf counters in table format, with the
+    average of each class after its sequences.
+
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to print.
+    counter_results -- Counter results per sequence.
+    class_averages -- Average counter results per class.
+    average -- Average counter results.
+    scale -- Number of digits shown to the right of the decimal point.
+    """
+    HEADER = ['Sequence', 'Speed-Up', 'Cycles Red. (%)', 'Instr. Red. (%)', 'Base IPC', 'Test IPC']
+    FACTORS = [1, 100, 100, 1, 1]
+
+    def format_values(label, values):
+        return [label] + ['{:.{scale}f}'.format(values[key] * factor, scale = scale) for key, factor in zip(COUNTER_KEYS, FACTORS)]
+
+    rows = list()
+    for category, category_sequences in sequences.items():
+        rows.append(None)
+        rows.extend(format_values(sequence, counter_results[sequence]) for sequence in category_sequences)
+        rows.append(format_values('{} average'.format(category), class_averages[category]))
+    average_row = format_values('Average', average)
+
+    widths = [max(len(row[column]) for row in [HEADER, average_row] + [row for row in rows if row is not None]) for column in range(len(HEADER))]
+    line_width = sum(widths) + 2 * (len(widths) - 1)
+
+    def format_row(row):
+        return '  '.join([row[0].ljust(widths[0])] + [value.rjust(width) for value, width in zip(row[1:], widths[1:])])
+
+    print(format_row(HEADER))
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+
+    categories = iter(sequences.keys())
+    for row in rows:
+        if row is None:
+            print('{line_content:-<{line_width}}'.format(line_content = '-- {} --'.format(next(categories)), line_width = line_width))
+        else:
+            print(format_row(row))
+
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+    print(format_row(average_row))
+
+def print_intervals(sequences, intervals, average_intervals, confidence, scale):
+    """Prints the bootstrap confidence intervals in table format.
+
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to print.
+    intervals -- Intervals of the BD-rate and speed-up per sequence.
+    average_intervals -- Intervals of the average BD-rate and speed-up.
+    confidence -- Confidence level of the intervals.
+    scale -- Number of digits shown to the right of the decimal point.
+    """
+    HEADER = ['Sequence', 'BD-Rate {:g}% CI (%)'.format(confidence * 100), 'Speed-Up {:g}% CI'.format(confidence * 100)]
+    KEYS = ['bdrate', 'speedup']
+
+    def format_values(label, values):
+        return [label] + ['[{:.{scale}f}, {:.{scale}f}]'.format(*values[key], scale = scale) for key in KEYS]
+
+    rows = [format_values(sequence, intervals[sequence]) for category_sequences in sequences.values() for sequence in category_sequences]
+    average_row = format_values('Average', average_intervals)
+
+    widths = [max(len(row[column]) for row in rows + [HEADER, average_row]) for column in range(len(HEADER))]
+    line_width = sum(widths) + 2 * (len(widths) - 1)
+
+    def format_row(row):
+        return '  '.join([row[0].ljust(widths[0])] + [value.rjust(width) for value, width in zip(row[1:], widths[1:])])
+
+    print(format_row(HEADER))
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+
+    row_index = 0
+    for category, category_sequences in sequences.items():
+        print('{line_content:-<{line_width}}'.format(line_content = '-- {} --'.format(category), line_width = line_width))
+        for sequence in category_sequences:
+            print(format_row(rows[row_index]))
+            row_index += 1
+
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+    print(format_row(average_row))
+
+def print_pareto(sequences, pareto):
+    """Prints the configurations on the rate-time Pareto front of each sequence
+    and of the average in table format.
+
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to print.
+    pareto -- Dictionary returned by calculate_pareto.
+    """
+    HEADER = ['Sequence', 'Rate-Time Pareto Front']
+
+    rows = [[sequence, ', '.join(pareto['sequences'][sequence])] for category_sequences in sequences.values() for sequence in category_sequences]
+    average_row = ['Average', ', '.join(pareto['average'])]
+
+    width = max(len(row[0]) for row in rows + [HEADER, average_row])
+    line_width = width + 2 + max(len(row[1]) for row in rows + [HEADER, average_row])
+
+    def format_row(row):
+        return '{}  {}'.format(row[0].ljust(width), row[1]).rstrip()
+
+    print(format_row(HEADER))
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+
+    row_index = 0
+    for category, category_sequences in sequences.items():
+        print('{line_content:-<{line_width}}'.format(line_content = '-- {} --'.format(category), line_width = line_width))
+        for sequence in category_sequences:
+            print(format_row(rows[row_index]))
+            row_index += 1
+
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+    print(format_row(average_row))
 
-    widths = dict()
-    widths['sequence'] = len(HEADER[0])
-    widths['bdrate'] = len(HEADER[1])
-    widths['speedup'] = len(HEADER[2])
-    widths['time_reduction'] = len(HEADER[3])
+def configuration_names(paths, patterns):
+    """Returns a short name for each tested configuration: the name of its
+    directory, followed by its pattern if several configurations share the
+    same directory name.
 
+    Keyword arguments:
+    paths -- List of paths of the directories of the configurations.
+    patterns -- List of patterns of the configurations.
+    """
+    names = [os.path.basename(os.path.normpath(path)) for path in paths]
+
+    return [name if names.count(name) == 1 else '{}:{}'.format(name, pattern) for name, pattern in zip(names, patterns)]
+
+def print_matrix_results(sequences, names, all_results, scale):
+    """Prints the results of several tested configurations in a wide table,
+    with a group of columns per configuration.
+
+    Keyword arguments:
+    sequences -- Dictionary of sequence classes, and sequences to print.
+    names -- Names of the tested configurations.
+    all_results -- List of (results, average) tuples, one per configuration.
+    scale -- Number of digits shown to the right of the decimal point.
+    """
+    HEADER = ['Sequence', 'BD-Rate (%)', 'Speed-Up', 'Time Reduction (%)']
+    KEYS = ['bdrate', 'speedup', 'time_reduction']
+    FACTORS = [1, 1, 100]
+
+    rows = list()
     for category, category_sequences in sequences.items():
         for sequence in category_sequences:
-            widths['sequence'] = max(widths['sequence'], len(sequence))
-            widths['bdrate'] = max(widths['bdrate'], len('{bdrate:>.{scale}f}'.format(bdrate = results[sequence]['bdrate'], scale = scale)))
-            widths['speedup'] = max(widths['speedup'], len('{speedup:>.{scale}f}'.format(speedup = results[sequence]['speedup'], scale = scale)))
-            widths['time_reduction'] = max(widths['time_reduction'], len('{time_reduction:>.{scale}f}'.format(time_reduction = results[sequence]['time_reduction'] * 100, scale = scale)))
+            rows.append([sequence] + ['{:.{scale}f}'.format(results[sequence][key] * factor, scale = scale) for results, _ in all_results for key, factor in zip(KEYS, FACTORS)])
+    average_row = ['Average'] + ['{:.{scale}f}'.format(average[key] * factor, scale = scale) for _, average in all_results for key, factor in zip(KEYS, FACTORS)]
+
+    headers = [HEADER[0]] + HEADER[1:] * len(all_results)
+    widths = [max(len(row[column]) for row in rows + [average_row, headers]) for column in range(len(headers))]
+
+    # Each configuration name is shown above its group of columns, which are
+    # widened if the name does not fit.
+    for index, name in enumerate(names):
+        group = widths[1 + 3 * index:4 + 3 * index]
+        missing = len(name) - (sum(group) + 2 * (len(group) - 1))
+        if missing > 0:
+            widths[3 + 3 * index] += missing
+
+    line_width = sum(widths) + 2 * (len(widths) - 1)
+
+    def format_row(row):
+        return '  '.join([row[0].ljust(widths[0])] + [value.rjust(width) for value, width in zip(row[1:], widths[1:])])
 
-    print('{sequence:<{sequence_width}}  {bdrate:>{bdrate_width}}  {speedup:>{speedup_width}}  {time_reduction:>{time_reduction_width}}'.format(sequence = HEADER[0], bdrate = HEADER[1], speedup = HEADER[2], time_reduction = HEADER[3], sequence_width = widths['sequence'], bdrate_width = widths['bdrate'], speedup_width = widths['speedup'], time_reduction_width = widths['time_reduction']))
-    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = sum(widths.values()) + 2 * (len(widths.values()) - 1)))
+    group_names = [' ' * widths[0]] + ['{:<{width}}'.format(name, width = sum(widths[1 + 3 * index:4 + 3 * index]) + 4) for index, name in enumerate(names)]
+    print('  '.join(group_names).rstrip())
+    print(format_row(headers))
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
 
+    row_index = 0
     for category, category_sequences in sequences.items():
-        print('{line_content:-<{line_width}}'.format(line_content = '-- {} --'.format(category), line_width = sum(widths.values()) + 2 * (len(widths.values()) - 1)))
+        print('{line_content:-<{line_width}}'.format(line_content = '-- {} --'.format(category), line_width = line_width))
         for sequence in category_sequences:
-            print('{sequence:{sequence_width}}  {bdrate:>{bdrate_width}.{scale}f}  {speedup:>{speedup_width}.{scale}f}  {time_reduction:>{time_reduction_width}.{scale}f}'.format(sequence = sequence, bdrate = results[sequence]['bdrate'], speedup = results[sequence]['speedup'], time_reduction = results[sequence]['time_reduction'] * 100, sequence_width = widths['sequence'], bdrate_width = widths['bdrate'], speedup_width = widths['speedup'], time_reduction_width = widths['time_reduction'], scale = scale))
+            print(format_row(rows[row_index]))
+            row_index += 1
+
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+    print(format_row(average_row))
+
+def print_profile(profile, file):
+    """Prints the time spent in each stage, the counters and the slowest files
+    of a profile.
+
+    Keyword arguments:
+    profile -- hmtools.profile.Profile object.
+    file -- File object where the report is printed.
+    """
+    data = profile.to_dict()
+
+    rows = [[name, '{:.3f}'.format(stage['seconds'] * 1000), str(stage['calls']), '{:.1f}'.format(100 * stage['seconds'] / data['wall_time']) if data['wall_time'] else '-'] for name, stage in data['stages'].items()]
+    HEADER = ['Stage', 'Time (ms)', 'Calls', 'Wall (%)']
+    total_row = ['Total (wall)', '{:.3f}'.format(data['wall_time'] * 1000), '', '100.0']
+
+    widths = [max(len(row[column]) for row in rows + [HEADER, total_row]) for column in range(len(HEADER))]
+    line_width = sum(widths) + 2 * (len(widths) - 1)
+
+    def format_row(row):
+        return '  '.join([row[0].ljust(widths[0])] + [value.rjust(width) for value, width in zip(row[1:], widths[1:])])
+
+    print(format_row(HEADER), file=file)
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width), file=file)
+    for row in rows:
+        print(format_row(row), file=file)
+    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width), file=file)
+    print(format_row(total_row), file=file)
+
+    if data['counters']:
+        print(file=file)
+        width = max(len(name) for name in data['counters'])
+        for name, value in data['counters'].items():
+            print('{:<{width}}  {:>14,}'.format(name, value, width = width), file=file)
+
+    if data['slowest_files']:
+        print(file=file)
+        print('Slowest files:', file=file)
+        for path, seconds in data['slowest_files']:
+            print('{:>10.3f} ms  {}'.format(seconds * 1000, path), file=file)
+
+def comparison_options(arguments, absolute=False):
+    """Returns a dictionary with the options of the comparison requested by
+    the arguments, which can be serialized to JSON (see compare).
+
+    Keyword arguments:
+    arguments -- Namespace object whose attributes are the arguments.
+    absolute -- Boolean parameter to make the paths absolute, so that they can
+            be resolved by a server running in another directory.
+    """
+    def path(value):
+        return os.path.abspath(value) if absolute else value
+
+    return {'base_path': path(arguments.base_path[0]), 'base_pattern': arguments.base_pattern[0], 'test_paths': [path(test_path) for test_path in arguments.test_path], 'test_patterns': arguments.test_pattern,
+            'use_perf': arguments.use_perf, 'use_old_bdrate': arguments.use_old_bdrate, 'show_counters': arguments.show_counters, 'time_statistic': arguments.time_statistic, 'outlier_threshold': arguments.outlier_threshold, 'use_gmean': arguments.use_gmean, 'use_hull': arguments.use_hull, 'show_pareto': arguments.show_pareto,
+            'bootstrap': arguments.bootstrap, 'confidence': arguments.confidence, 'seed': arguments.seed, 'jobs': arguments.jobs, 'use_threads': arguments.use_threads, 'tail_first': arguments.tail_first}
+
+def parse_results(options, cache, file_paths=None):
+    """Parses the result files of the baseline and the tested encodings, and
+    returns a list with the Results object of each directory, starting with
+    the baseline.
+
+    Keyword arguments:
+    options -- Dictionary with the options of the comparison (see
+            comparison_options).
+    cache -- Cache of parsed result files, or None.
+    file_paths -- Optional list to which a list per directory is added with
+            the path of each of its files relative to the directory (or
+            archive), in the order of the files of its Results object.
+    """
+    directories = [(options['base_path'], options['base_pattern'])] + list(zip(options['test_paths'], options['test_patterns']))
+
+    for path, _ in directories:
+        if not os.path.isdir(path) and not hmtools.archive.is_archive(path):
+            raise ValueError('{} is not a directory or an archive'.format(path))
+    if len(options['test_paths']) != len(options['test_patterns']):
+        raise ValueError('the number of test patterns must be the number of test directories')
+
+    # The output of perf is parsed to show the counters even if the timing
+    # results use the time reported by the encoder. The baseline is parsed only
+    # once, and the files of all the directories are parsed in the same pool of
+    # workers.
+    use_perf = options['use_perf'] or options['show_counters']
+    all_results = [hmtools.results.Results() for _ in directories]
+    if file_paths is None:
+        for index, sequence, sequence_id, file_results in hmtools.parser.iter_dirs(directories, use_perf, options['jobs'], options['use_threads'], cache, options['tail_first']):
+            all_results[index].append(sequence, sequence_id, file_results)
+    else:
+        file_paths.extend(list() for _ in directories)
+        for index, file, sequence, sequence_id, file_results in hmtools.parser.iter_dirs(directories, use_perf, options['jobs'], options['use_threads'], cache, options['tail_first'], paths=True):
+            all_results[index].append(sequence, sequence_id, file_results)
+            file_paths[index].append(os.path.relpath(file, directories[index][0]))
+
+    return all_results
+
+def compare(options, cache, all_results=None):
+    """Parses the result files of the baseline and the tested encodings and
+    calculates all the results requested by the options. Returns a dictionary
+    with the keys 'sequences' (dictionary of sequence classes and sequences),
+    'names' (names of the tested configurations), 'results' (list of (results,
+    average) tuples, one per configuration), 'counters' (list of
+    (counter_results, class_averages, average) tuples, empty unless requested),
+    'intervals' (list of (intervals, average_intervals) tuples, empty unless
+    requested), 'pareto' (dictionary returned by calculate_pareto, empty
+    unless requested) and 'confidence'.
+
+    Keyword arguments:
+    options -- Dictionary with the options of the comparison (see
+            comparison_options).
+    cache -- Cache of parsed result files, or None.
+    all_results -- Optional list with the Results objects of the baseline and
+            each tested encoding, if they have already been parsed.
+    """
+    if all_results is None:
+        all_results = parse_results(options, cache)
+    base_results = all_results[0]
+    tests_results = all_results[1:]
+
+    test_sequences = set()
+    for test_results in tests_results:
+        test_sequences |= set(test_results.sequences)
+    sequences = sort_sequences(set(base_results.sequences) & test_sequences)
+
+    report = {'sequences': sequences, 'names': configuration_names(options['test_paths'], options['test_patterns']), 'counters': [], 'intervals': [], 'pareto': {}, 'confidence': options['confidence']}
+
+    with hmtools.profile.stage('calculate'):
+        report['results'] = calculate_matrix_results(sequences, base_results, tests_results, options['use_old_bdrate'], options['use_perf'], options['time_statistic'], options['outlier_threshold'], options['use_gmean'], options['use_hull'])
+
+        if options['show_counters']:
+            report['counters'] = [calculate_counter_results(sequences, base_results, test_results, results, options['use_gmean']) for test_results, (results, _) in zip(tests_results, report['results'])]
+
+        if options['show_pareto']:
+            report['pareto'] = calculate_pareto(sequences, report['names'], report['results'])
+
+    if options['bootstrap'] is not None:
+        random = numpy.random.default_rng(options['seed'])
+        with hmtools.profile.stage('bootstrap'):
+            report['intervals'] = [calculate_intervals(sequences, base_results, test_results, options['use_old_bdrate'], options['use_perf'], options['time_statistic'], options['outlier_threshold'], options['use_gmean'], options['bootstrap'], options['confidence'], random, options['use_hull']) for test_results in tests_results]
+
+    return report
+
+def print_json_line(values, **fields):
+    """Prints a JSON object in a single line, with some fields followed by a
+    dictionary of values. Non-finite values are printed as null.
+
+    Keyword arguments:
+    values -- Dictionary of values.
+    fields -- Fields printed before the values (e.g. type and sequence).
+    """
+    fields.update(values)
+    print(json.dumps(hmtools.server.to_json(fields), allow_nan=False))
+
+def print_report_lines(report):
+    """Prints the results of a comparison as JSON lines: an object per sequence
+    and configuration with its results (of type 'sequence', and of type
+    'counters' and 'intervals' if they were requested), and an object per
+    average (of type 'average', 'counters_class_average', 'counters_average'
+    and 'intervals_average'), and an object per sequence and for the average
+    with the configurations on the rate-time Pareto front (of type 'pareto'
+    and 'pareto_average') if it was requested. The objects of type 'sequence'
+    and 'average' have the columns of report_columns, and are written in bulk.
+
+    Keyword arguments:
+    report -- Dictionary returned by compare.
+    """
+    sequences = report['sequences']
+    names = report['names']
+
+    export_columns(report_columns(report), 'jsonl')
+
+    for name, (counter_results, class_averages, average) in zip(names, report['counters']):
+        for category, category_sequences in sequences.items():
+            for sequence in category_sequences:
+                print_json_line(counter_results[sequence], type='counters', configuration=name, category=category, sequence=sequence)
+            print_json_line(class_averages[category], type='counters_class_average', configuration=name, category=category)
+        print_json_line(average, type='counters_average', configuration=name)
+
+    for name, (intervals, average_intervals) in zip(names, report['intervals']):
+        for category, category_sequences in sequences.items():
+            for sequence in category_sequences:
+                print_json_line(intervals[sequence], type='intervals', configuration=name, category=category, sequence=sequence, confidence=report['confidence'])
+        print_json_line(average_intervals, type='intervals_average', configuration=name, confidence=report['confidence'])
+
+    if report['pareto']:
+        for category, category_sequences in sequences.items():
+            for sequence in category_sequences:
+                print_json_line({'configurations': report['pareto']['sequences'][sequence]}, type='pareto', category=category, sequence=sequence)
+        print_json_line({'configurations': report['pareto']['average']}, type='pareto_average')
+
+def result_columns(rows):
+    """Returns rows of coding efficiency and timing results as a dictionary of
+    columns, whose names are RESULT_COLUMNS.
+
+    Keyword arguments:
+    rows -- List of tuples with a value per column.
+    """
+    values = list(zip(*rows)) if rows else [()] * len(RESULT_COLUMNS)
+
+    return {name: numpy.array(column, dtype=float if name in RESULT_KEYS else str) for name, column in zip(RESULT_COLUMNS, values)}
+
+def report_columns(report):
+    """Returns the coding efficiency and timing results of a comparison as a
+    dictionary of columns (see result_columns), with a row per sequence and
+    configuration (of type 'sequence') followed by the average of the
+    configuration (of type 'average', without category nor sequence).
+
+    Keyword arguments:
+    report -- Dictionary returned by compare.
+    """
+    rows = list()
+    for name, (results, average) in zip(report['names'], report['results']):
+        for category, category_sequences in report['sequences'].items():
+            rows.extend(('sequence', name, category, sequence) + tuple(results[sequence][key] for key in RESULT_KEYS) for sequence in category_sequences)
+        rows.append(('average', name, '', '') + tuple(average[key] for key in RESULT_KEYS))
+
+    return result_columns(rows)
+
+def file_columns(options, all_results, file_paths):
+    """Returns the values parsed from the result files of every directory as a
+    dictionary of columns (see hmtools.results.Results.columns), preceded by
+    the path of the directory of each file and the path of the file relative
+    to it, which tells apart the repetitions of the same encoding.
+
+    Keyword arguments:
+    options -- Dictionary with the options of the comparison (see
+            comparison_options).
+    all_results -- List with the Results objects of the baseline and each
+            tested encoding.
+    file_paths -- List with the relative paths of the files of each
+            directory (see parse_results).
+    """
+    tables = list()
+    for path, results, paths in zip([options['base_path']] + options['test_paths'], all_results, file_paths):
+        table = {'directory': numpy.full(len(results), path), 'path': numpy.array(paths, dtype=str)}
+        table.update(results.columns())
+        tables.append(table)
 
-    print('{line_content:=<{line_width}}'.format(line_content = '', line_width = sum(widths.values()) + 2 * (len(widths.values()) - 1)))
-    print('{sequence:{sequence_width}}  {bdrate:>{bdrate_width}.{scale}f}  {speedup:>{speedup_width}.{scale}f}  {time_reduction:>{time_reduction_width}.{scale}f}'.format(sequence = 'Average', bdrate = average['bdrate'], speedup = average['speedup'], time_reduction = average['time_reduction'] * 100, sequence_width = widths['sequence'], bdrate_width = widths['bdrate'], speedup_width = widths['speedup'], time_reduction_width = widths['time_reduction'], scale = scale))
+    return hmtools.export.concatenate(tables)
+
+def export_columns(columns, output_format, output_path=None):
+    """Writes a dictionary of columns in an export format (see
+    hmtools.export.EXPORT_FORMATS). Text formats are written to the standard
+    output, which is redirected to the output file, if any, by
+    redirect_output.
+
+    Keyword arguments:
+    columns -- Dictionary of columns (arrays of the same length).
+    output_format -- Output format.
+    output_path -- Path of the output file of binary formats.
+    """
+    hmtools.export.write_columns(columns, output_format, None if output_format in TEXT_FORMATS else output_path)
+
+@contextlib.contextmanager
+def redirect_output(output_path, output_format):
+    """Returns a context manager that redirects the standard output to a
+    buffered output file while it is active, if the output format is written
+    as text and a path other than - is given.
+
+    Keyword arguments:
+    output_path -- Path of the output file, or None.
+    output_format -- Output format (see OUTPUT_FORMATS).
+    """
+    if output_path in (None, '-') or output_format not in TEXT_FORMATS:
+        yield
+        return
+
+    with open(output_path, 'w', newline='', buffering=hmtools.export.BUFFER_SIZE) as output_file, contextlib.redirect_stdout(output_file):
+        yield
+
+def print_report(report, scale, output_format='table', output_path=None):
+    """Prints the results of a comparison, or writes them to a file in binary
+    formats.
+
+    Keyword arguments:
+    report -- Dictionary returned by compare.
+    scale -- Number of digits shown to the right of the decimal point.
+    output_format -- Output format (see OUTPUT_FORMATS). Counters, bootstrap
+            intervals and the Pareto front are only printed in the table and
+            jsonl formats.
+    output_path -- Path of the output file of binary formats.
+    """
+    if output_format == 'jsonl':
+        print_report_lines(report)
+        return
+
+    if output_format != 'table':
+        export_columns(report_columns(report), output_format, output_path)
+        return
+
+    sequences = report['sequences']
+    names = report['names']
+
+    if len(report['results']) == 1:
+        results, average = report['results'][0]
+        print_results(sequences, results, average, scale)
+    else:
+        print_matrix_results(sequences, names, report['results'], scale)
+
+    for name, counter_results in zip(names, report['counters']):
+        print()
+        if len(names) > 1:
+            print(name)
+        print_counter_results(sequences, *counter_results, scale)
+
+    for name, intervals in zip(names, report['intervals']):
+        print()
+        if len(names) > 1:
+            print(name)
+        print_intervals(sequences, *intervals, report['confidence'], scale)
+
+    if report['pareto']:
+        print()
+        print_pareto(sequences, report['pareto'])
+
+def stream_comparison(options, cache, scale, output_format='table'):
+    """Compares the encodings while their result files are parsed one sequence
+    at a time, and prints the results of each sequence shortly after its files
+    are parsed (in batches of up to STREAM_BATCH_SIZE sequences), so that
+    memory depends on the size of a batch instead of on the whole comparison.
+    Averages are updated incrementally, and printed at the end. Table columns
+    are as wide as their headers and the sequence names, since the values are
+    not known in advance.
+
+    Keyword arguments:
+    options -- Dictionary with the options of the comparison (see
+            comparison_options). Counters and bootstrap intervals are not
+            supported.
+    cache -- Cache of parsed result files, or None.
+    scale -- Number of digits shown to the right of the decimal point.
+    output_format -- Output format: table, jsonl or csv.
+    """
+    HEADER = ['Sequence', 'BD-Rate (%)', 'Speed-Up', 'Time Reduction (%)']
+    FACTORS = [1, 1, 100]
+
+    directories = [(options['base_path'], options['base_pattern'])] + list(zip(options['test_paths'], options['test_patterns']))
+    names = configuration_names(options['test_paths'], options['test_patterns'])
+
+    # Only the paths of the files are kept for the whole comparison.
+    groups = hmtools.parser.group_files(directories)
+    sequences = sort_sequences([sequence for sequence, files in groups.items() if any(index == 0 for index, _, _ in files) and any(index > 0 for index, _, _ in files)])
+    categories = {sequence: category for category, category_sequences in sequences.items() for sequence in category_sequences}
+    groups = {sequence: groups[sequence] for category_sequences in sequences.values() for sequence in category_sequences}
+
+    # Sum and number of the values of each key of each configuration (sum of
+    # logarithms for geometric means), added in the same order as
+    # calculate_average.
+    totals = [{key: [0.0, 0] for key in RESULT_KEYS} for _ in names]
+    geometric = {key: key == 'speedup' and options['use_gmean'] for key in RESULT_KEYS}
+
+    headers = [HEADER[0]] + HEADER[1:] * len(names)
+    widths = [max([len(header) for header in (HEADER[0], 'Average')] + [len(sequence) for sequence in categories])] + [len(header) for header in headers[1:]]
+    if len(names) > 1:
+        for index, name in enumerate(names):
+            group = widths[1 + 3 * index:4 + 3 * index]
+            missing = len(name) - (sum(group) + 2 * (len(group) - 1))
+            if missing > 0:
+                widths[3 + 3 * index] += missing
+    line_width = sum(widths) + 2 * (len(widths) - 1)
+
+    def format_row(label, values):
+        row = [label] + ['{:.{scale}f}'.format(value[key] * factor, scale = scale) for value in values for key, factor in zip(RESULT_KEYS, FACTORS)]
+        return '  '.join([row[0].ljust(widths[0])] + [value.rjust(width) for value, width in zip(row[1:], widths[1:])])
+
+    if output_format == 'table':
+        if len(names) > 1:
+            group_names = [' ' * widths[0]] + ['{:<{width}}'.format(name, width = sum(widths[1 + 3 * index:4 + 3 * index]) + 4) for index, name in enumerate(names)]
+            print('  '.join(group_names).rstrip())
+        print('  '.join([headers[0].ljust(widths[0])] + [header.rjust(width) for header, width in zip(headers[1:], widths[1:])]))
+        print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+    elif output_format == 'csv':
+        hmtools.export.write_csv(result_columns([]), sys.stdout)
+
+    previous_category = None
+
+    def print_batch(batch):
+        nonlocal previous_category
+
+        with hmtools.profile.stage('calculate'):
+            all_results = [hmtools.results.Results() for _ in directories]
+            for sequence, files in batch:
+                for index, sequence_id, file_results in files:
+                    all_results[index].append(sequence, sequence_id, file_results)
+            batch_sequences = [sequence for sequence, _ in batch]
+            matrix_results = calculate_matrix_results({'': batch_sequences}, all_results[0], all_results[1:], options['use_old_bdrate'], options['use_perf'], options['time_statistic'], options['outlier_threshold'], options['use_gmean'], options['use_hull'])
+
+        with hmtools.profile.stage('output'):
+            rows = list()
+            for sequence in batch_sequences:
+                category = categories[sequence]
+                sequence_results = [results[sequence] for results, _ in matrix_results]
+
+                for configuration_totals, values in zip(totals, sequence_results):
+                    for key, total in configuration_totals.items():
+                        if not math.isnan(values[key]):
+                            total[0] += math.log(values[key]) if geometric[key] else values[key]
+                            total[1] += 1
+
+                if output_format in ('jsonl', 'csv'):
+                    rows.extend(('sequence', name, category, sequence) + tuple(values[key] for key in RESULT_KEYS) for name, values in zip(names, sequence_results))
+                else:
+                    if category != previous_category:
+                        print('{line_content:-<{line_width}}'.format(line_content = '-- {} --'.format(category), line_width = line_width))
+                        previous_category = category
+                    print(format_row(sequence, sequence_results))
+            if rows and output_format == 'jsonl':
+                hmtools.export.write_jsonl(result_columns(rows), sys.stdout)
+            elif rows:
+                hmtools.export.write_csv(result_columns(rows), sys.stdout, header=False)
+            sys.stdout.flush()
+
+    # The sequences whose files have been parsed are gathered in batches, so
+    # that the rows are still printed shortly after they are available.
+    batch = list()
+    for sequence, files in hmtools.parser.iter_groups(groups, options['use_perf'], options['jobs'], options['use_threads'], cache, options['tail_first']):
+        if not batch:
+            batch_start = time.perf_counter()
+        batch.append((sequence, files))
+        if len(batch) >= STREAM_BATCH_SIZE or time.perf_counter() - batch_start >= STREAM_BATCH_SECONDS:
+            print_batch(batch)
+            batch = list()
+    if batch:
+        print_batch(batch)
+
+    averages = list()
+    for configuration_totals in totals:
+        average = dict()
+        for key, (total, count) in configuration_totals.items():
+            average[key] = float('nan')
+            if count > 0:
+                average[key] = math.exp(total / count) if geometric[key] else total / count
+        averages.append(average)
+
+    average_rows = [('average', name, '', '') + tuple(average[key] for key in RESULT_KEYS) for name, average in zip(names, averages)]
+    if output_format == 'jsonl':
+        hmtools.export.write_jsonl(result_columns(average_rows), sys.stdout)
+    elif output_format == 'csv':
+        hmtools.export.write_csv(result_columns(average_rows), sys.stdout, header=False)
+    else:
+        print('{line_content:=<{line_width}}'.format(line_content = '', line_width = line_width))
+        print(format_row('Average', averages))
+
+def serve(address):
+    """Answers comparison requests on an address until interrupted, keeping
+    the parsed result files in memory between requests (see
+    hmtools.server).
+
+    Keyword arguments:
+    address -- Address of the server (a Unix socket path, or localhost:port).
+    """
+    cache = hmtools.server.MemoryCache()
+    routes = {'compare': lambda options: compare(options, cache)}
+
+    hmtools.server.serve(address, routes, cache)
+
+def watch_results(arguments, base_results, test_results, results, cache, formats=None):
+    """Watches the directories of both encodings and, whenever their files
+    change, parses the changed files again, recalculates the results of the
+    affected sequences and prints the table again, until interrupted.
+
+    Keyword arguments:
+    arguments -- Namespace object whose attributes are the arguments.
+    base_results -- Results of the baseline encoding, as returned by
+            hmtools.parser.parse_dir with keep_repetitions, updated in place.
+    test_results -- Results of the encoding being tested, as returned by
+            hmtools.parser.parse_dir with keep_repetitions, updated in place.
+    results -- Coding efficiency and timing results per sequence, updated in
+            place.
+    cache -- Cache of parsed result files, or None.
+    formats -- Dictionary with the format of the files of each directory, as
+            filled by hmtools.parser.parse_dir, or None to sniff them again.
+    """
+    directories = [(arguments.base_path[0], arguments.base_pattern[0], base_results),
+                   (arguments.test_path[0], arguments.test_pattern[0], test_results)]
+
+    watcher = hmtools.watch.Watcher([directory[0] for directory in directories], arguments.watch, arguments.use_polling)
+
+    with watcher:
+        try:
+            while True:
+                changes = watcher.wait()
+
+                changed_sequences = set()
+                for path, pattern, directory_results in directories:
+                    filenames = [filename for changed_path, filename in changes if changed_path == path]
+                    changed_sequences |= hmtools.parser.update_dir(directory_results, path, pattern, filenames, arguments.use_perf, cache, arguments.tail_first, keep_repetitions=True, formats=formats)
+
+                sequences = sort_sequences(set(base_results.keys() & test_results.keys()))
+
+                changed = [sequence for category_sequences in sequences.values() for sequence in category_sequences if sequence in changed_sequences or sequence not in results]
+                if changed:
+                    # Only the results of the changed sequences are converted
+                    # to the columnar format, to keep each update cheap.
+                    changed_base_results = hmtools.results.Results.from_dict({sequence: base_results[sequence] for sequence in changed}, repetitions=True)
+                    changed_test_results = hmtools.results.Results.from_dict({sequence: test_results[sequence] for sequence in changed}, repetitions=True)
+                    changed_results, _ = calculate_results({'': changed}, changed_base_results, changed_test_results, arguments.use_old_bdrate, arguments.use_perf, arguments.time_statistic, arguments.outlier_threshold, arguments.use_gmean, arguments.use_hull)
+                    results.update(changed_results)
+
+                average = calculate_average(sequences, results, use_gmean=arguments.use_gmean)
+
+                if sys.stdout.isatty():
+                    print('\x1b[H\x1b[2J', end='')
+                print_results(sequences, results, average, arguments.scale[0])
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+
+def compare_encodings(arguments):
+    """Compares the encodings as requested by the arguments (in this process,
+    or in a daemon with --connect) and prints the results, or exports the
+    values of the result files with --files, and then watches the directories
+    in watch mode.
+
+    Keyword arguments:
+    arguments -- Namespace object whose attributes are the arguments.
+    """
+    if arguments.connect_address is not None:
+        try:
+            report = hmtools.server.request(arguments.connect_address, 'compare', comparison_options(arguments, absolute=True))
+        except (OSError, ValueError, hmtools.server.ServerError) as error:
+            sys.exit('error: {}'.format(error))
+        # Values that could not be calculated are sent as null.
+        try:
+            print_report(hmtools.server.from_json(report), arguments.scale[0], arguments.output_format, arguments.output_path)
+        except ImportError as error:
+            sys.exit('error: {}'.format(error))
+        return
+
+    if arguments.profile_path is not None:
+        hmtools.profile.start()
+
+    cache = None
+    if (arguments.cache_path is not None or arguments.rebuild_cache) and not arguments.no_cache:
+        try:
+            cache = hmtools.cache.ParseCache(arguments.cache_path, arguments.rebuild_cache)
+        except (OSError, sqlite3.Error) as error:
+            print('warning: cache disabled ({})'.format(error), file=sys.stderr)
+
+    options = comparison_options(arguments)
+
+    all_results = None
+    if arguments.watch is not None:
+        # Watch mode updates the results per file, so they are kept in the
+        # dictionaries returned by parse_dir.
+        use_perf = arguments.use_perf or arguments.show_counters
+        directories = [(arguments.base_path[0], arguments.base_pattern[0])] + list(zip(arguments.test_path, arguments.test_pattern))
+        # The format sniffed for each directory is kept for the updates.
+        formats = dict()
+        watch_dicts = [hmtools.parser.parse_dir(path, pattern, use_perf, arguments.jobs, arguments.use_threads, cache, arguments.tail_first, keep_repetitions=True, formats=formats) for path, pattern in directories]
+        all_results = [hmtools.results.Results.from_dict(directory_results, repetitions=True) for directory_results in watch_dicts]
+
+    try:
+        if arguments.export_files:
+            file_paths = list()
+            all_results = parse_results(options, cache, file_paths)
+
+            with hmtools.profile.stage('output'):
+                export_columns(file_columns(options, all_results, file_paths), arguments.output_format, arguments.output_path)
+        elif arguments.stream:
+            stream_comparison(options, cache, arguments.scale[0], arguments.output_format)
+        else:
+            report = compare(options, cache, all_results)
+
+            with hmtools.profile.stage('output'):
+                print_report(report, arguments.scale[0], arguments.output_format, arguments.output_path)
+    except ImportError as error:
+        sys.exit('error: {}'.format(error))
+
+    profile = hmtools.profile.stop()
+    if profile is not None:
+        sys.stdout.flush()
+        if arguments.profile_path == '-':
+            print_profile(profile, sys.stderr)
+        else:
+            with open(arguments.profile_path, 'w') as profile_file:
+                json.dump(profile.to_dict(), profile_file, indent=2)
+
+    if cache is not None:
+        cache.prune([options['base_path']] + options['test_paths'])
+
+    if arguments.watch is not None:
+        sys.stdout.flush()
+        watch_results(arguments, watch_dicts[0], watch_dicts[1], report['results'][0][0], cache, formats)
+
+    if cache is not None:
+        cache.close()
 
 def main(argv):
     arguments = parse_arguments(argv[1:])
 
-    base_results = hmtools.parser.parse_dir(arguments.base_path[0], arguments.base_pattern[0], arguments.use_perf)
-    test_results = hmtools.parser.parse_dir(arguments.test_path[0], arguments.test_pattern[0], arguments.use_perf)
-    sequences = sort_sequences(set(base_results.keys() & test_results.keys()))
-
-    results, average = calculate_results(sequences, base_results, test_results, arguments.use_old_bdrate, arguments.use_perf)
+    if arguments.serve_address is not None:
+        try:
+            serve(arguments.serve_address)
+        except (OSError, ValueError) as error:
+            sys.exit('error: {}'.format(error))
+        return
 
-    print_results(sequences, results, average, arguments.scale[0])
+    with redirect_output(arguments.output_path, arguments.output_format):
+        compare_encodings(arguments)
 
 if __name__ == "__main__":
     main(sys.argv)